@@ -0,0 +1,263 @@
+"""Benchmark suite over synthetic app trees.
+
+Generates source trees of several sizes, flat and nested one level deep
+(like KDE/), and times discovery, trampoline syncing (including the time
+to the first trampoline, repointing every trampoline after a rebuild of
+the apps and the manifest check of an unchanged tree) and Dock syncing
+against a stub dockutil with configurable latency. CLI startup is timed
+in fresh interpreters against fixed budgets. Results are written as JSON
+so runs can be compared between releases.
+
+Usage:
+    python -m benchmarks.run --sizes 10,1000,10000 --output bench_output.json
+    python -m benchmarks.run --sizes 10 --check-budgets
+"""
+
+import argparse
+import io
+import json
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from collections.abc import Callable
+from contextlib import redirect_stdout
+from pathlib import Path
+from typing import cast
+from unittest.mock import patch
+
+from nix_spotlight import __version__
+from nix_spotlight.__main__ import main as cli_main
+from nix_spotlight.dock import sync_dock
+from nix_spotlight.trampoline import gather_apps, rebuild_trampolines, sync_trampolines
+
+# Apps per subdirectory in the nested layout
+NESTED_GROUP_SIZE = 100
+
+# Dock items pointing into /nix/store listed by the stub dockutil
+PINNED_APPS = 20
+
+# Apps in the tree synced by the startup cases
+STARTUP_TREE_SIZE = 10
+
+# Wall-time budgets in seconds for CLI startup, enforced by --check-budgets
+STARTUP_BUDGETS = {"startup_version": 0.2, "startup_sync_noop": 0.3}
+
+# Trailing dockutil -L fields after the label and URL
+_LISTING_SUFFIX = "persistentApps\t/Users/bench/Library/Preferences/com.apple.dock.plist"
+
+_STUB_DOCKUTIL = """\
+#!{python}
+import sys, time
+time.sleep({latency})
+if "-L" in sys.argv:
+    sys.stdout.write({listing!r})
+"""
+
+
+def make_tree(root: Path, size: int, *, nested: bool) -> Path:
+    """Create a source directory with size valid .app bundles."""
+    source = root / "source"
+    for i in range(size):
+        parent = source / f"Group{i // NESTED_GROUP_SIZE}" if nested else source
+        contents = parent / f"App{i:05}.app" / "Contents"
+        contents.mkdir(parents=True)
+        (contents / "Info.plist").touch()
+    source.mkdir(exist_ok=True)
+    return source
+
+
+def make_dockutil(root: Path, size: int, latency: float) -> Path:
+    """Create a stub dockutil that sleeps for latency seconds per call."""
+    listing = "".join(
+        f"App{i:05}\tfile:///nix/store/{i:032}-app/Applications/App{i:05}.app/\t{_LISTING_SUFFIX}\n"
+        for i in range(min(size, PINNED_APPS))
+    )
+    stub = root / "dockutil"
+    _ = stub.write_text(
+        _STUB_DOCKUTIL.format(python=sys.executable, latency=latency, listing=listing)
+    )
+    stub.chmod(0o755)
+    return stub
+
+
+def cli_sync(source: Path, target: Path) -> int:
+    """Run `nix-spotlight sync --no-dock` in this interpreter, discarding its output."""
+    argv = ["nix-spotlight", "sync", "--no-dock", str(source), str(target)]
+    with patch.object(sys, "argv", argv), redirect_stdout(io.StringIO()):
+        return cli_main()
+
+
+def measure(
+    func: Callable[[], object], repeat: int, setup: Callable[[], object] | None = None
+) -> float:
+    """Return the best wall time of func over repeat runs."""
+    best = float("inf")
+    for _ in range(repeat):
+        if setup is not None:
+            _ = setup()
+        start = time.perf_counter()
+        _ = func()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def measure_first(
+    func: Callable[[Callable[[object], None]], object],
+    repeat: int,
+    setup: Callable[[], object],
+) -> float:
+    """Return the best time until func first calls the callback it is given."""
+    best = float("inf")
+    first: list[float] = []
+    for _ in range(repeat):
+        _ = setup()
+        first.clear()
+        start = time.perf_counter()
+        _ = func(lambda _event: first.append(time.perf_counter()))
+        best = min(best, (first[0] if first else time.perf_counter()) - start)
+    return best
+
+
+def bench_tree(size: int, *, nested: bool, latency: float, repeat: int) -> dict[str, float]:
+    """Time every case against one generated tree."""
+    with tempfile.TemporaryDirectory(prefix="nix-spotlight-bench-") as tmp:
+        root = Path(tmp)
+        source = make_tree(root, size, nested=nested)
+        # Same app names in other bundles, like a rebuild of every app
+        rebuilt = make_tree(root / "rebuilt", size, nested=nested)
+        target = root / "target"
+        dockutil = make_dockutil(root, size, latency)
+
+        def clear() -> None:
+            shutil.rmtree(target, ignore_errors=True)
+
+        timings = {
+            "gather_apps": measure(lambda: gather_apps(source), repeat),
+            "sync_cold": measure(lambda: sync_trampolines(source, target), repeat, clear),
+            "sync_first": measure_first(
+                lambda on_event: sync_trampolines(source, target, on_event=on_event),
+                repeat,
+                clear,
+            ),
+            "sync_warm": measure(
+                lambda: sync_trampolines(source, target),
+                repeat,
+                lambda: sync_trampolines(rebuilt, target),
+            ),
+            "sync_rebuild": measure(lambda: rebuild_trampolines(source, target), repeat),
+        }
+        # The first run writes the manifest every timed run then finds current
+        _ = cli_sync(source, target)
+        timings["sync_noop"] = measure(lambda: cli_sync(source, target), repeat)
+
+        trampolines = sync_trampolines(source, target)
+        with patch("nix_spotlight.dock._RESTART_DOCK", (str(dockutil), "restart")):
+            timings["sync_dock"] = measure(lambda: sync_dock(trampolines, str(dockutil)), repeat)
+        return timings
+
+
+def bench_startup(repeat: int) -> dict[str, float]:
+    """Time `--version` and an up-to-date sync in fresh interpreters."""
+    with tempfile.TemporaryDirectory(prefix="nix-spotlight-bench-") as tmp:
+        root = Path(tmp)
+        source = make_tree(root, STARTUP_TREE_SIZE, nested=False)
+        target = root / "target"
+
+        def cli(*args: str) -> None:
+            _ = subprocess.run(
+                [sys.executable, "-m", "nix_spotlight", *args],
+                check=True,
+                stdout=subprocess.DEVNULL,
+            )
+
+        sync = ("sync", "--no-dock", str(source), str(target))
+        cli(*sync)
+        return {
+            "startup_version": measure(lambda: cli("--version"), repeat),
+            "startup_sync_noop": measure(lambda: cli(*sync), repeat),
+        }
+
+
+def run(sizes: list[int], latency: float, repeat: int) -> dict[str, object]:
+    """Run the suite and return machine-readable results."""
+    results: list[dict[str, object]] = []
+    for size in sizes:
+        for nested in (False, True):
+            timings = bench_tree(size, nested=nested, latency=latency, repeat=repeat)
+            layout = "nested" if nested else "flat"
+            results.extend(
+                {"size": size, "layout": layout, "case": case, "seconds": seconds}
+                for case, seconds in timings.items()
+            )
+    startup = bench_startup(repeat)
+    results.extend(
+        {
+            "size": STARTUP_TREE_SIZE,
+            "layout": "flat",
+            "case": case,
+            "seconds": seconds,
+            "budget": STARTUP_BUDGETS[case],
+        }
+        for case, seconds in startup.items()
+    )
+    return {
+        "version": __version__,
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "dockutil_latency": latency,
+        "repeat": repeat,
+        "results": results,
+        "over_budget": sorted(
+            case for case, seconds in startup.items() if seconds > STARTUP_BUDGETS[case]
+        ),
+    }
+
+
+def main(argv: list[str] | None = None) -> int:
+    """Run the benchmark suite from the command line."""
+    parser = argparse.ArgumentParser(description="Benchmark nix-spotlight")
+    _ = parser.add_argument(
+        "--sizes",
+        default="10,1000,10000",
+        help="Comma-separated app counts (default: 10,1000,10000)",
+    )
+    _ = parser.add_argument(
+        "--latency",
+        type=float,
+        default=0.05,
+        help="Seconds the stub dockutil sleeps per call (default: 0.05)",
+    )
+    _ = parser.add_argument("--repeat", type=int, default=3, help="Runs per case (default: 3)")
+    _ = parser.add_argument(
+        "--output",
+        type=Path,
+        default=Path("bench_output.json"),
+        help="JSON results file (default: bench_output.json)",
+    )
+    _ = parser.add_argument(
+        "--check-budgets",
+        action="store_true",
+        help="Exit with status 1 if CLI startup exceeds its time budget",
+    )
+    args = parser.parse_args(argv)
+
+    sizes = [int(size) for size in cast("str", args.sizes).split(",")]
+    report = run(sizes, cast("float", args.latency), cast("int", args.repeat))
+
+    output = cast("Path", args.output)
+    _ = output.write_text(json.dumps(report, indent=2) + "\n")
+    for row in cast("list[dict[str, object]]", report["results"]):
+        print(f"{row['size']:>6} {row['layout']:<6} {row['case']:<12} {row['seconds']:.4f}s")
+    print(f"Wrote {output}")
+
+    over_budget = cast("list[str]", report["over_budget"])
+    for case in over_budget:
+        print(f"over budget: {case} (budget {STARTUP_BUDGETS[case]}s)", file=sys.stderr)
+    return 1 if over_budget and cast("bool", args.check_budgets) else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
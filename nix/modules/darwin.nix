@@ -16,6 +16,13 @@ in
   };
 
   config = lib.mkIf cfg.enable {
+    services.nix-spotlight.appManifest = lib.mkDefault (
+      shared.mkAppManifest {
+        inherit pkgs self;
+        apps = "${config.system.build.applications}/Applications";
+      }
+    );
+
     system.activationScripts.postActivation.text = ''
       echo "nix-spotlight: syncing trampolines..." >&2
       ${shared.mkSyncCommand { inherit pkgs self cfg; }}
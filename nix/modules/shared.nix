@@ -14,23 +14,128 @@
         default = defaultTargetDir;
         description = "Target directory for trampolines";
       };
+      extraPairs = lib.mkOption {
+        type = lib.types.listOf (
+          lib.types.submodule {
+            options = {
+              sourceDir = lib.mkOption {
+                type = lib.types.str;
+                description = "Source directory containing .app bundles";
+              };
+              targetDir = lib.mkOption {
+                type = lib.types.str;
+                description = "Target directory for trampolines";
+              };
+            };
+          }
+        );
+        default = [ ];
+        description = "Additional source and target directories synced in the same run";
+      };
+      appManifest = lib.mkOption {
+        type = lib.types.nullOr lib.types.path;
+        default = null;
+        description = ''
+          App manifest of the source directory built with mkAppManifest. Activation
+          takes the apps from it instead of scanning, and scans if it is stale.
+        '';
+      };
+      socket = lib.mkOption {
+        type = lib.types.nullOr lib.types.str;
+        default = null;
+        example = "$HOME/.cache/nix-spotlight/serve.sock";
+        description = ''
+          Socket of a running `nix-spotlight serve` that activation sends the sync
+          to with socat, without starting Python. Activation syncs by itself when
+          nothing answers.
+        '';
+      };
       syncDock = lib.mkOption {
         type = lib.types.bool;
         default = true;
         description = "Whether to sync dock items";
       };
+      timeout = lib.mkOption {
+        type = lib.types.nullOr lib.types.ints.positive;
+        default = 60;
+        description = ''
+          Seconds activation may spend syncing. Dock updates that do not finish in
+          time are completed by a background run. Null waits for as long as it takes.
+        '';
+      };
+      pruneDock = lib.mkOption {
+        type = lib.types.bool;
+        default = false;
+        description = "Whether to remove Dock items whose /nix/store app was garbage collected or left the source";
+      };
     };
 
+  mkAppManifest =
+    {
+      pkgs,
+      self,
+      apps,
+    }:
+    pkgs.runCommand "nix-spotlight-apps.json" { } ''
+      ${self.packages.${pkgs.stdenv.hostPlatform.system}.default}/bin/nix-spotlight manifest \
+        "${apps}" --output $out
+    '';
+
   mkSyncCommand =
     {
       pkgs,
       self,
       cfg,
     }:
-    ''
-      ${self.packages.${pkgs.stdenv.hostPlatform.system}.default}/bin/nix-spotlight sync \
-        ${lib.optionalString (!cfg.syncDock) "--no-dock"} \
-        "${cfg.sourceDir}" \
-        "${cfg.targetDir}"
-    '';
+    let
+      pairs = [ { inherit (cfg) sourceDir targetDir; } ] ++ cfg.extraPairs;
+      config = pkgs.writeText "nix-spotlight.json" (
+        builtins.toJSON {
+          pairs = map (pair: {
+            source = pair.sourceDir;
+            target = pair.targetDir;
+          }) pairs;
+        }
+      );
+      args =
+        lib.optional (!cfg.syncDock) "--no-dock"
+        ++ lib.optional cfg.pruneDock "--prune-dock"
+        ++ lib.optionals (cfg.timeout != null) [
+          "--deadline"
+          (toString cfg.timeout)
+        ]
+        ++ lib.optionals (cfg.appManifest != null) [
+          "--manifest"
+          "${cfg.appManifest}"
+        ]
+        ++ [
+          "--config"
+          "${config}"
+        ];
+      nix-spotlight = "${self.packages.${pkgs.stdenv.hostPlatform.system}.default}/bin/nix-spotlight";
+      sync = "${nix-spotlight} sync ${lib.escapeShellArgs args}";
+      # What sync --socket would send, waiting for the reply until the deadline or two minutes
+      request = builtins.toJSON {
+        argv = args;
+        cwd = "/";
+      };
+      wait = toString (if cfg.timeout != null then cfg.timeout else 120);
+      jq = "${pkgs.jq}/bin/jq";
+    in
+    if cfg.socket == null then
+      sync
+    else
+      # Talk to the server without starting Python, and sync in-process if it does not answer
+      ''
+        if reply=$(printf '%s\n' ${lib.escapeShellArg request} \
+            | ${pkgs.socat}/bin/socat -t ${wait} -T ${wait} - UNIX-CONNECT:"${cfg.socket}" 2>/dev/null) \
+          && code=$(printf '%s' "$reply" | ${jq} -e '.code | numbers' 2>/dev/null) \
+          && printf '%s' "$reply" | ${jq} -e '(.out | strings) and (.err | strings)' >/dev/null 2>&1; then
+          printf '%s' "$reply" | ${jq} -j .out
+          printf '%s' "$reply" | ${jq} -j .err >&2
+          (exit "$code")
+        else
+          ${sync}
+        fi
+      '';
 }
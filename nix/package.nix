@@ -13,6 +13,11 @@ py.buildPythonApplication {
   pyproject = true;
   src = self;
 
+  # Bake the version in so the CLI never queries importlib.metadata at startup
+  postPatch = ''
+    echo '__version__ = "${pyproject.project.version}"' > src/nix_spotlight/_version.py
+  '';
+
   build-system = [ py.setuptools ];
   nativeCheckInputs = [
     pkgs.basedpyright
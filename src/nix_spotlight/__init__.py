@@ -1,18 +1,144 @@
 """nix-spotlight - macOS Spotlight integration for Nix apps."""
 
-from importlib.metadata import version
+from importlib import import_module
+from typing import TYPE_CHECKING, cast
 
-from .dock import sync_dock
-from .trampoline import create_trampoline, sync_trampolines
-from .types import App, DockSyncResult
+from ._version import __version__
+
+if TYPE_CHECKING:
+    from .catalog import dump_catalog, load_catalog
+    from .dock import plan_dock, sync_dock, sync_dock_plist, update_dock
+    from .lock import target_lock
+    from .manifest import mark_dock_synced, read_manifest, source_digest, write_manifest
+    from .metadata import MetadataCache, read_metadata
+    from .plan import apply, plan
+    from .profiling import trace_calls
+    from .serve import request_sync, serve
+    from .timings import Timings, collect
+    from .trampoline import (
+        create_trampoline,
+        iter_apps,
+        rebuild_trampolines,
+        reconcile_trampolines,
+        rollback_trampolines,
+        swap_trampolines,
+        sync_trampolines,
+    )
+    from .types import (
+        Action,
+        App,
+        AppMetadata,
+        Catalog,
+        DockSyncResult,
+        Manifest,
+        Plan,
+        SyncEvent,
+        SyncReply,
+        TracedCall,
+        TrampolineSyncResult,
+    )
+    from .watch import watch
+
+# Submodule defining each public name. They are imported on first access so
+# that the CLI, which runs in every activation script, only loads what it uses.
+_EXPORTS = {
+    "Action": "types",
+    "App": "types",
+    "AppMetadata": "types",
+    "Catalog": "types",
+    "DockSyncResult": "types",
+    "Manifest": "types",
+    "MetadataCache": "metadata",
+    "Plan": "types",
+    "SyncEvent": "types",
+    "SyncReply": "types",
+    "Timings": "timings",
+    "TracedCall": "types",
+    "TrampolineSyncResult": "types",
+    "apply": "plan",
+    "collect": "timings",
+    "create_trampoline": "trampoline",
+    "dump_catalog": "catalog",
+    "iter_apps": "trampoline",
+    "load_catalog": "catalog",
+    "mark_dock_synced": "manifest",
+    "plan": "plan",
+    "plan_dock": "dock",
+    "read_manifest": "manifest",
+    "read_metadata": "metadata",
+    "rebuild_trampolines": "trampoline",
+    "reconcile_trampolines": "trampoline",
+    "request_sync": "serve",
+    "rollback_trampolines": "trampoline",
+    "serve": "serve",
+    "source_digest": "manifest",
+    "swap_trampolines": "trampoline",
+    "sync_dock": "dock",
+    "sync_dock_plist": "dock",
+    "sync_trampolines": "trampoline",
+    "target_lock": "lock",
+    "trace_calls": "profiling",
+    "update_dock": "dock",
+    "watch": "watch",
+    "write_manifest": "manifest",
+}
+
+
+def __getattr__(name: str) -> object:
+    """Import a public name from its submodule on first access."""
+    module = _EXPORTS.get(name)
+    if module is None:
+        msg = f"module {__name__!r} has no attribute {name!r}"
+        raise AttributeError(msg)
+    value = cast("object", getattr(import_module(f".{module}", __name__), name))
+    globals()[name] = value
+    return value
+
+
+def __dir__() -> list[str]:
+    """List public names, including those not imported yet."""
+    return sorted({*globals(), *_EXPORTS})
 
-__version__ = version("nix-spotlight")
 
 __all__ = [
+    "Action",
     "App",
+    "AppMetadata",
+    "Catalog",
     "DockSyncResult",
+    "Manifest",
+    "MetadataCache",
+    "Plan",
+    "SyncEvent",
+    "SyncReply",
+    "Timings",
+    "TracedCall",
+    "TrampolineSyncResult",
     "__version__",
+    "apply",
+    "collect",
     "create_trampoline",
+    "dump_catalog",
+    "iter_apps",
+    "load_catalog",
+    "mark_dock_synced",
+    "plan",
+    "plan_dock",
+    "read_manifest",
+    "read_metadata",
+    "rebuild_trampolines",
+    "reconcile_trampolines",
+    "request_sync",
+    "rollback_trampolines",
+    "serve",
+    "source_digest",
+    "swap_trampolines",
     "sync_dock",
+    "sync_dock_plist",
     "sync_trampolines",
+    "target_lock",
+    "trace_calls",
+    "update_dock",
+    "watch",
+    "write_manifest",
 ]
@@ -1,17 +1,41 @@
 """CLI entry point for nix-spotlight."""
 
 import argparse
+import contextvars
+import io
+import os
 import sys
+from contextlib import nullcontext, redirect_stderr, redirect_stdout, suppress
+from dataclasses import dataclass, field, replace
 from pathlib import Path
-from typing import cast
+from typing import TYPE_CHECKING, cast
 
-from . import __version__
-from .dock import sync_dock
-from .trampoline import sync_trampolines
+from ._version import __version__
+from .deadline import deadline
+from .manifest import (
+    DEFAULT_MAX_DEPTH,
+    mark_dock_synced,
+    read_manifest,
+    source_digest,
+    write_manifest,
+)
+from .profiling import PROFILE_ENV, TRACE_ENV
+from .timings import collect, phase
+from .types import Action, Catalog, DockSyncResult, SyncReply, TrampolineSyncResult
 
+if TYPE_CHECKING:
+    from .metadata import MetadataCache
 
-def main() -> int:
-    """Run the nix-spotlight CLI."""
+# Seconds the background run finishing a timed-out Dock sync may take
+FOLLOW_UP_DEADLINE = 300.0
+
+# Commands import the modules they need when they run, so --version and a
+# sync that finds the manifest up to date never load dock, trampoline,
+# subprocess or concurrent.futures.
+
+
+def _build_parser() -> argparse.ArgumentParser:
+    """Build the argument parser for all subcommands."""
     parser = argparse.ArgumentParser(
         prog="nix-spotlight",
         description="macOS Spotlight integration for Nix apps",
@@ -29,42 +53,768 @@ def main() -> int:
         help="Sync trampolines from source to target directory",
     )
     _ = sync_parser.add_argument(
+        "dirs",
+        type=Path,
+        nargs="*",
+        metavar="FROM TO",
+        help="Source directory of .app bundles and target for trampolines (repeatable)",
+    )
+    _ = sync_parser.add_argument(
+        "--config",
+        type=Path,
+        default=None,
+        metavar="FILE",
+        help="TOML or JSON file with a 'pairs' array of {source, target} tables",
+    )
+    _ = sync_parser.add_argument(
+        "--no-dock",
+        action="store_true",
+        help="Skip dock syncing",
+    )
+    _ = sync_parser.add_argument(
+        "--dock-backend",
+        choices=("dockutil", "plist"),
+        default="dockutil",
+        help="Update the Dock via dockutil or by rewriting its preferences (default: dockutil)",
+    )
+    _ = sync_parser.add_argument(
+        "--prune-dock",
+        action="store_true",
+        help="Remove Dock items whose store app was garbage collected or left the source",
+    )
+    _ = sync_parser.add_argument(
+        "--timings",
+        action="store_const",
+        const="text",
+        help="Report per-phase wall time and counters on stderr",
+    )
+    _ = sync_parser.add_argument(
+        "--timings-json",
+        dest="timings",
+        action="store_const",
+        const="json",
+        help="Like --timings, but as a single JSON line",
+    )
+    _ = sync_parser.add_argument(
+        "--force",
+        action="store_true",
+        help="Sync even if the source matches the manifest of the last sync",
+    )
+    _ = sync_parser.add_argument(
+        "--jobs",
+        "-j",
+        type=int,
+        default=None,
+        metavar="N",
+        help="Create trampolines on N threads (default: serial)",
+    )
+    _ = sync_parser.add_argument(
+        "--max-depth",
+        type=int,
+        default=None,
+        metavar="N",
+        help="Search N directory levels below each source for apps (default: 1)",
+    )
+    _ = sync_parser.add_argument(
+        "--manifest",
+        dest="manifests",
+        type=Path,
+        action="append",
+        default=[],
+        metavar="FILE",
+        help="App manifest listing a source's apps, used instead of scanning it (repeatable)",
+    )
+    _ = sync_parser.add_argument(
+        "--deadline",
+        type=float,
+        default=None,
+        metavar="SECONDS",
+        help="Time budget in seconds; Dock work that does not fit is finished in the background",
+    )
+    # Marks the background run started for Dock work, so it never starts another
+    _ = sync_parser.add_argument("--follow-up", action="store_true", help=argparse.SUPPRESS)
+    _ = sync_parser.add_argument(
+        "--socket",
+        type=Path,
+        default=None,
+        metavar="PATH",
+        help="Ask the serve process on PATH to sync, syncing here if it does not answer in time",
+    )
+    _ = sync_parser.add_argument(
+        "--dry-run",
+        action="store_true",
+        help="Print the changes a sync would make without writing anything",
+    )
+    mode_group = sync_parser.add_mutually_exclusive_group()
+    _ = mode_group.add_argument(
+        "--reconcile",
+        action="store_true",
+        help="Update only the trampolines that changed (the default)",
+    )
+    _ = mode_group.add_argument(
+        "--rebuild",
+        action="store_true",
+        help="Remove and recreate every trampoline, making Spotlight reindex them all",
+    )
+    _ = mode_group.add_argument(
+        "--atomic",
+        action="store_true",
+        help="Build trampolines in a staging directory and swap it into place",
+    )
+
+    manifest_parser = subparsers.add_parser(
+        "manifest",
+        help="Write the app manifest of a source directory for sync --manifest",
+    )
+    _ = manifest_parser.add_argument(
         "from_dir",
         type=Path,
         help="Source directory containing .app bundles",
     )
-    _ = sync_parser.add_argument(
+    _ = manifest_parser.add_argument(
+        "--output",
+        "-o",
+        type=Path,
+        default=None,
+        metavar="FILE",
+        help="Write the manifest to FILE instead of stdout",
+    )
+    _ = manifest_parser.add_argument(
+        "--max-depth",
+        type=int,
+        default=None,
+        metavar="N",
+        help="Search N directory levels below the source for apps (default: 1)",
+    )
+
+    serve_parser = subparsers.add_parser(
+        "serve",
+        help="Stay resident and answer sync --socket requests",
+    )
+    _ = serve_parser.add_argument(
+        "--socket",
+        type=Path,
+        default=None,
+        metavar="PATH",
+        help="Socket to listen on (default: serve.sock under $XDG_RUNTIME_DIR or ~/.cache)",
+    )
+    _ = serve_parser.add_argument(
+        "--window",
+        type=float,
+        default=None,
+        metavar="SECONDS",
+        help="Once two requests arrive together, wait this long for more (default: 0.05)",
+    )
+
+    rollback_parser = subparsers.add_parser(
+        "rollback",
+        help="Restore the trampolines generation replaced by sync --atomic",
+    )
+    _ = rollback_parser.add_argument(
         "to_dir",
         type=Path,
         help="Target directory for trampolines",
     )
-    _ = sync_parser.add_argument(
+
+    watch_parser = subparsers.add_parser(
+        "watch",
+        help="Keep trampolines in sync while the source directory changes",
+    )
+    _ = watch_parser.add_argument(
+        "from_dir",
+        type=Path,
+        help="Source directory containing .app bundles",
+    )
+    _ = watch_parser.add_argument(
+        "to_dir",
+        type=Path,
+        help="Target directory for trampolines",
+    )
+    _ = watch_parser.add_argument(
         "--no-dock",
         action="store_true",
         help="Skip dock syncing",
     )
+    _ = watch_parser.add_argument(
+        "--debounce",
+        type=float,
+        default=None,
+        metavar="SECONDS",
+        help="Quiet period before syncing a burst of changes (default: 0.5)",
+    )
+    _ = watch_parser.add_argument(
+        "--interval",
+        type=float,
+        default=None,
+        metavar="SECONDS",
+        help="Polling interval where events are unavailable (default: 1.0)",
+    )
+
+    return parser
+
+
+def _watch(args: argparse.Namespace) -> int:
+    """Run the watch subcommand until interrupted."""
+    from .dock import sync_dock
+    from .lock import dock_lock
+    from .metadata import MetadataCache
+    from .watch import DEFAULT_DEBOUNCE, DEFAULT_INTERVAL, make_watcher, watch
 
-    args = parser.parse_args()
     from_dir = cast("Path", args.from_dir)
     to_dir = cast("Path", args.to_dir)
     no_dock = cast("bool", args.no_dock)
+    debounce = cast("float | None", args.debounce)
+    interval = cast("float | None", args.interval)
 
     if not from_dir.exists():
         print(f"error: source directory does not exist: {from_dir}", file=sys.stderr)
         return 1
 
-    trampolines = sync_trampolines(from_dir, to_dir)
+    metadata = MetadataCache()
 
-    if not no_dock:
-        dock_result = sync_dock(trampolines)
-        if dock_result.errors:
+    def report(result: TrampolineSyncResult) -> None:
+        for error in result.errors:
+            print(f"warning: {error}", file=sys.stderr)
+        if result.trampolines and not no_dock:
+            with dock_lock():
+                dock_result = sync_dock(list(result.trampolines), metadata=metadata)
             for error in dock_result.errors:
                 print(f"warning: {error}", file=sys.stderr)
+            _save_metadata(metadata)
+        counts = f"created {result.created}, repointed {result.repointed}"
+        print(f"Synced {to_dir} ({counts}, removed {result.removed})", flush=True)
+
+    print(f"Watching {from_dir}", flush=True)
+    with suppress(KeyboardInterrupt):
+        watch(
+            from_dir,
+            to_dir,
+            on_batch=report,
+            debounce=DEFAULT_DEBOUNCE if debounce is None else debounce,
+            watcher=make_watcher(from_dir, DEFAULT_INTERVAL if interval is None else interval),
+        )
+    return 0
+
+
+def _manifest(args: argparse.Namespace) -> int:
+    """Run the manifest subcommand."""
+    from .catalog import dump_catalog
+
+    from_dir = cast("Path", args.from_dir)
+    output = cast("Path | None", args.output)
+    max_depth = cast("int | None", args.max_depth)
+
+    if not from_dir.exists():
+        print(f"error: source directory does not exist: {from_dir}", file=sys.stderr)
+        return 1
+
+    text = dump_catalog(from_dir, max_depth=DEFAULT_MAX_DEPTH if max_depth is None else max_depth)
+    if output is None:
+        print(text, end="")
+    else:
+        _ = output.write_text(text)
+    return 0
+
+
+def _find_catalog(manifests: list[Path], from_dir: Path, max_depth: int | None) -> Catalog | None:
+    """Return the apps of from_dir from the first current app manifest, if any."""
+    if not manifests:
+        return None
+
+    from .catalog import load_catalog
 
-    print(f"Synced {len(trampolines)} apps to {to_dir}")
+    depth = DEFAULT_MAX_DEPTH if max_depth is None else max_depth
+    for path in manifests:
+        if (catalog := load_catalog(path, from_dir, max_depth=depth)) is not None:
+            return catalog
+    return None
 
+
+def _serve(args: argparse.Namespace) -> int:
+    """Run the serve subcommand until interrupted."""
+    from .serve import DEFAULT_WINDOW, default_socket_path, serve
+
+    socket_path = cast("Path | None", args.socket) or default_socket_path()
+    window = cast("float | None", args.window)
+
+    print(f"Serving on {socket_path}", flush=True)
+    with suppress(KeyboardInterrupt):
+        serve(
+            socket_path,
+            _serve_sync,
+            window=DEFAULT_WINDOW if window is None else window,
+        )
+    return 0
+
+
+def _serve_sync(argv: list[str], cwd: str) -> SyncReply:
+    """Run the sync arguments of a serve request, capturing what it prints."""
+    parser = _build_parser()
+    out = io.StringIO()
+    err = io.StringIO()
+    with redirect_stdout(out), redirect_stderr(err):
+        try:
+            os.chdir(cwd)
+            args = parser.parse_args(["sync", *argv])
+            # The request already reached a server; it must not be forwarded
+            args.socket = None
+            code = _sync(parser, args, ["sync", *argv])
+        except SystemExit as e:
+            code = e.code if isinstance(e.code, int) else 1
+        except Exception as e:  # noqa: BLE001 - one failed request must not stop the server
+            print(f"error: {e}", file=sys.stderr)
+            code = 1
+    return SyncReply(code=code, out=out.getvalue(), err=err.getvalue())
+
+
+def _rollback(args: argparse.Namespace) -> int:
+    """Run the rollback subcommand."""
+    from .lock import target_lock
+    from .trampoline import rollback_trampolines
+
+    to_dir = cast("Path", args.to_dir)
+    with target_lock(to_dir):
+        restored = rollback_trampolines(to_dir)
+    if not restored:
+        print(f"error: no previous generation for {to_dir}", file=sys.stderr)
+        return 1
+    print(f"Rolled back {to_dir}")
     return 0
 
 
+def _sync_dock(
+    trampolines: list[Path],
+    backend: str,
+    *,
+    dry_run: bool,
+    prune: bool,
+    retired: list[str],
+) -> DockSyncResult:
+    """Update Dock items with the selected backend, or print the planned updates.
+
+    Bundle identifiers read to match Dock items are kept in the metadata
+    cache, so later syncs do not parse the same store Info.plist again.
+    """
+    from .dock import plan_dock, sync_dock, sync_dock_plist
+    from .metadata import MetadataCache
+
+    metadata = MetadataCache()
+    if dry_run:
+        for name, target in plan_dock(trampolines, metadata=metadata):
+            print(Action("dock", name, Path(target)).describe())
+        # A dry run writes nothing, the metadata cache included
+        return DockSyncResult()
+    if backend == "plist":
+        result = sync_dock_plist(trampolines, prune=prune, retired=retired, metadata=metadata)
+    else:
+        result = sync_dock(trampolines, prune=prune, retired=retired, metadata=metadata)
+    _save_metadata(metadata)
+    return result
+
+
+def _save_metadata(metadata: "MetadataCache") -> None:
+    """Drop cached metadata of garbage-collected store paths and save the rest."""
+    _ = metadata.evict()
+    # The cache only saves work; failing to write it must not fail the sync
+    with suppress(OSError):
+        metadata.save()
+
+
+@dataclass(slots=True)
+class _PairReport:
+    """Output of syncing one pair, printed once all pairs are done."""
+
+    code: int = 0
+    out: list[str] = field(default_factory=list)
+    err: list[str] = field(default_factory=list)
+    # Trampolines in the target, whether synced now or already up to date
+    trampolines: list[Path] = field(default_factory=list)
+    # Whether the Dock still has to be updated for the trampolines
+    dock_pending: bool = False
+    # Digest of the manifest to mark once the Dock is updated for trampolines
+    digest: str | None = None
+    # Resolved bundle paths of apps that left the source in this sync
+    retired: list[str] = field(default_factory=list)
+
+
+def _pairs(parser: argparse.ArgumentParser, args: argparse.Namespace) -> list[tuple[Path, Path]]:
+    """Collect source and target pairs from positional arguments and --config."""
+    dirs = cast("list[Path]", args.dirs)
+    config = cast("Path | None", args.config)
+
+    if len(dirs) % 2:
+        parser.error("sync: directories must be given as FROM TO pairs")
+    pairs = list(zip(dirs[::2], dirs[1::2], strict=True))
+    if config is not None:
+        from .config import ConfigError, load_pairs
+
+        try:
+            pairs.extend(load_pairs(config))
+        except ConfigError as e:
+            parser.error(str(e))
+    if not pairs:
+        parser.error("sync: no FROM TO pairs or --config given")
+    return pairs
+
+
+def _sync(parser: argparse.ArgumentParser, args: argparse.Namespace, argv: list[str]) -> int:
+    """Run the sync subcommand, reporting timings if requested.
+
+    argv holds the command line after the program name, which is handed
+    to the serve process or to a background run finishing the Dock. The
+    deadline covers waiting for the server as well as the in-process
+    sync run when it does not answer in time.
+    """
+    socket_path = cast("Path | None", args.socket)
+    timings_format = cast("str | None", args.timings)
+    with deadline(cast("float | None", args.deadline)):
+        if socket_path is not None:
+            code = _request_server(socket_path, argv)
+            if code is not None:
+                return code
+
+        pairs = _pairs(parser, args)
+        if timings_format is None:
+            return _sync_all(pairs, args, argv)
+        with collect() as timings:
+            code = _sync_all(pairs, args, argv)
+    print(timings.to_json() if timings_format == "json" else timings.format(), file=sys.stderr)
+    return code
+
+
+def _request_server(socket_path: Path, argv: list[str]) -> int | None:
+    """Run the sync in a serve process, returning None if none answered in time."""
+    from .serve import request_sync
+
+    reply = request_sync(socket_path, argv[1:], str(Path.cwd()))
+    if reply is None:
+        return None
+    print(reply.out, end="")
+    print(reply.err, end="", file=sys.stderr)
+    return reply.code
+
+
+def _sync_all(pairs: list[tuple[Path, Path]], args: argparse.Namespace, argv: list[str]) -> int:
+    """Sync every pair concurrently, then the Dock once for all of them."""
+    no_dock = cast("bool", args.no_dock)
+
+    if len(pairs) == 1:
+        reports = [_sync_pair(*pairs[0], args)]
+    else:
+        from concurrent.futures import ThreadPoolExecutor
+
+        # Each pair runs in a copy of this context so timings reach the collector
+        with ThreadPoolExecutor(max_workers=len(pairs)) as executor:
+            futures = [
+                executor.submit(contextvars.copy_context().run, _sync_pair, from_dir, to_dir, args)
+                for from_dir, to_dir in pairs
+            ]
+            reports = [future.result() for future in futures]
+
+    for report in reports:
+        for line in report.err:
+            print(line, file=sys.stderr)
+        for line in report.out:
+            print(line)
+
+    if any(report.dock_pending for report in reports) and not no_dock:
+        _update_dock(pairs, reports, args, argv)
+
+    return max(report.code for report in reports)
+
+
+def _update_dock(
+    pairs: list[tuple[Path, Path]],
+    reports: list[_PairReport],
+    args: argparse.Namespace,
+    argv: list[str],
+) -> None:
+    """Update the Dock once for all synced pairs, one run at a time.
+
+    The Dock lock is held until the manifests record the update, so a run
+    that waited for it skips an update the run before it already made. A
+    run whose deadline runs out while waiting leaves the update to a
+    background run.
+    """
+    from .lock import dock_lock
+
+    dry_run = cast("bool", args.dry_run)
+    try:
+        with nullcontext(enter_result=False) if dry_run else dock_lock() as waited:
+            if not (waited and _dock_current(pairs, reports)):
+                _update_dock_locked(pairs, reports, args, argv)
+    except TimeoutError as e:
+        print(f"warning: {e}", file=sys.stderr)
+        _defer_dock(argv, follow_up=cast("bool", args.follow_up))
+
+
+def _update_dock_locked(
+    pairs: list[tuple[Path, Path]],
+    reports: list[_PairReport],
+    args: argparse.Namespace,
+    argv: list[str],
+) -> None:
+    """Update the Dock while holding its lock and record the outcome."""
+    dry_run = cast("bool", args.dry_run)
+    # Every pair's trampolines are indexed, up-to-date ones included, so a
+    # Dock item is never taken for stale just because its pair had no changes
+    trampolines = [trampoline for report in reports for trampoline in report.trampolines]
+    retired = [path for report in reports for path in report.retired]
+
+    dock_result = _sync_dock(
+        trampolines,
+        cast("str", args.dock_backend),
+        dry_run=dry_run,
+        prune=cast("bool", args.prune_dock),
+        retired=retired,
+    )
+    if not dry_run:
+        dock_result = _restart_if_pending(dock_result)
+    for error in dock_result.errors:
+        print(f"warning: {error}", file=sys.stderr)
+    if dock_result.timed_out:
+        _defer_dock(argv, follow_up=cast("bool", args.follow_up))
+    elif not dock_result.errors:
+        _mark_dock_synced(pairs, reports)
+
+
+def _restart_if_pending(result: DockSyncResult) -> DockSyncResult:
+    """Restart the Dock if an earlier run left it changed but not restarted.
+
+    A run that changes Dock items and runs out of time before restarting
+    the Dock leaves a marker beside the Dock lock, so the next Dock update
+    restarts it even when it finds nothing left to change.
+    """
+    from .dock import restart_dock
+    from .metadata import default_cache_path
+
+    marker = default_cache_path().with_name("dock-restart-pending")
+    if marker.exists() and not (result.restarts or result.timed_out):
+        restarted = restart_dock()
+        result = replace(
+            result,
+            spawned=result.spawned + restarted.spawned,
+            restarts=restarted.restarts,
+            errors=(*result.errors, *restarted.errors),
+            timed_out=restarted.timed_out,
+            restart_pending=restarted.restart_pending,
+        )
+    if result.restart_pending:
+        marker.touch()
+    elif result.restarts:
+        marker.unlink(missing_ok=True)
+    return result
+
+
+def _dock_current(pairs: list[tuple[Path, Path]], reports: list[_PairReport]) -> bool:
+    """Check whether every target with pending Dock work now records it as done."""
+    for (_, to_dir), report in zip(pairs, reports, strict=True):
+        if not report.dock_pending:
+            continue
+        manifest = read_manifest(to_dir)
+        if manifest is None or report.digest is None or manifest.digest != report.digest:
+            return False
+        if not manifest.dock_synced:
+            return False
+    return True
+
+
+def _mark_dock_synced(pairs: list[tuple[Path, Path]], reports: list[_PairReport]) -> None:
+    """Record in each synced target's manifest that its Dock items are current."""
+    from .lock import target_lock
+
+    for (_, to_dir), report in zip(pairs, reports, strict=True):
+        if report.digest is not None:
+            # A target left unmarked only costs a later run another Dock update
+            with suppress(TimeoutError), target_lock(to_dir):
+                _ = mark_dock_synced(to_dir, report.digest)
+
+
+def _defer_dock(argv: list[str], *, follow_up: bool) -> None:
+    """Finish Dock work that ran out of time in a detached background sync."""
+    if follow_up:
+        print("warning: Dock sync ran out of time again; not retrying", file=sys.stderr)
+        return
+
+    import subprocess
+
+    from .metadata import default_cache_path
+
+    log_path = default_cache_path().with_name("follow-up.log")
+    log_path.parent.mkdir(parents=True, exist_ok=True)
+    command = [
+        *_entry_point(),
+        *argv,
+        "--force",
+        "--follow-up",
+        "--deadline",
+        str(FOLLOW_UP_DEADLINE),
+    ]
+    with log_path.open("ab") as log:
+        process = subprocess.Popen(
+            command,
+            stdin=subprocess.DEVNULL,
+            stdout=log,
+            stderr=subprocess.STDOUT,
+            start_new_session=True,
+        )
+    pid = process.pid
+    print(
+        f"warning: Dock sync ran out of time; finishing it in process {pid} (log: {log_path})",
+        file=sys.stderr,
+    )
+
+
+def _entry_point() -> list[str]:
+    """Return the command that re-runs this CLI, preferring the installed script.
+
+    Under nix-darwin the interpreter's site-packages need not contain this
+    package, so `python -m nix_spotlight` is only the last resort.
+    """
+    import shutil
+
+    script = Path(sys.argv[0])
+    if script.name == "nix-spotlight" and script.is_file():
+        return [str(script)]
+    installed = shutil.which("nix-spotlight")
+    if installed is not None:
+        return [installed]
+    return [sys.executable, "-m", "nix_spotlight"]
+
+
+def _sync_pair(from_dir: Path, to_dir: Path, args: argparse.Namespace) -> _PairReport:
+    """Sync trampolines for one source and target, leaving the Dock to the caller."""
+    force = cast("bool", args.force)
+    max_depth = cast("int | None", args.max_depth)
+    report = _PairReport()
+
+    if not from_dir.exists():
+        report.err.append(f"error: source directory does not exist: {from_dir}")
+        report.code = 1
+        return report
+
+    if cast("bool", args.dry_run):
+        from .plan import plan
+
+        depth = DEFAULT_MAX_DEPTH if max_depth is None else max_depth
+        sync_plan = plan(from_dir, to_dir, max_depth=depth)
+        report.out.extend(action.describe() for action in sync_plan.actions)
+        changes = f"{len(sync_plan.actions)} changes"
+        report.out.append(f"Would sync {len(sync_plan.trampolines)} apps to {to_dir} ({changes})")
+        report.trampolines = list(sync_plan.trampolines)
+        report.dock_pending = True
+        return report
+
+    from .lock import target_lock
+
+    # A run that waited for another sync of the same target re-reads the
+    # manifest that run wrote, even with --force, so overlapping activations
+    # coalesce into one sync instead of redoing it back to back.
+    try:
+        with target_lock(to_dir) as waited:
+            _sync_target(from_dir, to_dir, args, report, force=force and not waited)
+    except TimeoutError as e:
+        report.err.append(f"error: {e}")
+        report.code = 1
+    return report
+
+
+def _sync_target(
+    from_dir: Path,
+    to_dir: Path,
+    args: argparse.Namespace,
+    report: _PairReport,
+    *,
+    force: bool,
+) -> None:
+    """Sync one target while holding its lock, adding the outcome to report."""
+    rebuild = cast("bool", args.rebuild)
+    atomic = cast("bool", args.atomic)
+    jobs = cast("int | None", args.jobs)
+    max_depth = cast("int | None", args.max_depth)
+
+    with phase("manifest"):
+        catalog = _find_catalog(cast("list[Path]", args.manifests), from_dir, max_depth)
+        digest = source_digest(from_dir, max_depth) if catalog is None else catalog.digest
+        previous = read_manifest(to_dir)
+    if not force and previous is not None and previous.digest == digest:
+        report.out.append(f"Up to date: {len(previous.apps)} apps in {to_dir}")
+        report.trampolines = [to_dir / name for name in previous.apps]
+        # A run that skipped or failed its Dock update leaves it to this one
+        if not previous.dock_synced:
+            report.dock_pending = True
+            report.digest = digest
+        return
+
+    from .trampoline import (
+        rebuild_trampolines,
+        reconcile_trampolines,
+        swap_trampolines,
+    )
+
+    depth = DEFAULT_MAX_DEPTH if max_depth is None else max_depth
+    apps = None if catalog is None else catalog.apps
+    summary = ""
+    if rebuild:
+        result = rebuild_trampolines(from_dir, to_dir, max_workers=jobs, max_depth=depth, apps=apps)
+    elif atomic:
+        result = swap_trampolines(from_dir, to_dir, max_workers=jobs, max_depth=depth, apps=apps)
+    else:
+        result = reconcile_trampolines(
+            from_dir, to_dir, max_workers=jobs, max_depth=depth, apps=apps
+        )
+        summary = (
+            f" (created {result.created}, repointed {result.repointed},"
+            f" removed {result.removed}, unchanged {result.unchanged})"
+        )
+
+    report.trampolines = list(result.trampolines)
+    report.dock_pending = True
+    report.err.extend(f"warning: {error}" for error in result.errors)
+
+    # Only a complete sync is recorded, so apps that failed are retried next time
+    if not result.errors:
+        manifest = write_manifest(to_dir, digest, report.trampolines)
+        report.digest = digest
+        if previous is not None:
+            report.retired = sorted(set(previous.apps.values()) - set(manifest.apps.values()))
+
+    report.out.append(f"Synced {len(report.trampolines)} apps to {to_dir}{summary}")
+
+
+def main() -> int:
+    """Run the nix-spotlight CLI, profiled or traced if the environment asks for it."""
+    profile_path = os.environ.get(PROFILE_ENV)
+    trace_path = os.environ.get(TRACE_ENV)
+    if profile_path:
+        from .profiling import profile
+
+        with profile(Path(profile_path)):
+            return _main()
+    if trace_path:
+        from .profiling import trace_calls
+
+        with trace_calls(Path(trace_path)):
+            return _main()
+    return _main()
+
+
+def _main() -> int:
+    """Run the nix-spotlight CLI."""
+    parser = _build_parser()
+    args = parser.parse_args()
+
+    command = cast("str", args.command)
+    if command == "rollback":
+        return _rollback(args)
+    if command == "manifest":
+        return _manifest(args)
+    if command == "watch":
+        return _watch(args)
+    if command == "serve":
+        return _serve(args)
+    return _sync(parser, args, sys.argv[1:])
+
+
 if __name__ == "__main__":
     sys.exit(main())
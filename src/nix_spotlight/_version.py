@@ -0,0 +1,3 @@
+"""Package version, rewritten from pyproject.toml by the Nix build."""
+
+__version__ = "0.1.0"
@@ -0,0 +1,85 @@
+"""App manifests written at build time so activation can skip discovery.
+
+The Nix modules run `nix-spotlight manifest` on the profile's Applications
+directory while the system is built. `sync --manifest` then takes the apps
+from that file instead of scanning, as long as the source directory still
+resolves to the store path the manifest was built from. Store paths never
+change, so a matching manifest is exact; anything else falls back to a scan.
+"""
+
+import hashlib
+import json
+import os
+from pathlib import Path
+from typing import cast
+
+from .manifest import DEFAULT_MAX_DEPTH
+from .metadata import STORE_DIR
+from .types import App, Catalog
+
+# Bumped whenever the app manifest layout changes
+_CATALOG_VERSION = 1
+
+
+def dump_catalog(from_dir: Path, *, max_depth: int = DEFAULT_MAX_DEPTH) -> str:
+    """Scan a source directory and render its app manifest as JSON.
+
+    Args:
+        from_dir: Source directory containing .app bundles, usually a store path
+        max_depth: Directory levels below from_dir to search
+
+    Returns:
+        JSON text listing the apps relative to from_dir
+
+    """
+    from .trampoline import iter_apps  # noqa: PLC0415 - sync --manifest must not load it
+
+    data = {
+        "version": _CATALOG_VERSION,
+        "root": os.path.realpath(from_dir),
+        "max_depth": max_depth,
+        "apps": [
+            str(app.path.relative_to(from_dir)) for app in iter_apps(from_dir, max_depth=max_depth)
+        ],
+    }
+    return json.dumps(data, indent=2) + "\n"
+
+
+def load_catalog(
+    path: Path, from_dir: Path, *, max_depth: int = DEFAULT_MAX_DEPTH
+) -> Catalog | None:
+    """Load the apps of from_dir from an app manifest, if it is current.
+
+    Costs one read of the manifest and resolving from_dir; the source
+    directory itself is never listed.
+
+    Args:
+        path: App manifest written by dump_catalog
+        from_dir: Source directory the apps are synced from
+        max_depth: Discovery depth the sync would otherwise scan with
+
+    Returns:
+        The Catalog, or None if the manifest is missing, unreadable, built
+        with another depth or for another root, or the root is not in the store
+
+    """
+    try:
+        data = cast("object", json.loads(path.read_text()))
+    except (OSError, ValueError):
+        return None
+    if not isinstance(data, dict):
+        return None
+
+    fields = cast("dict[str, object]", data)
+    root = os.path.realpath(from_dir)
+    apps = fields.get("apps")
+    if fields.get("version") != _CATALOG_VERSION or fields.get("max_depth") != max_depth:
+        return None
+    if fields.get("root") != root or not root.startswith(f"{STORE_DIR}/"):
+        return None
+    if not isinstance(apps, list):
+        return None
+
+    names = [name for name in cast("list[object]", apps) if isinstance(name, str)]
+    digest = hashlib.sha256(f"catalog\0{from_dir}\0{root}\0{max_depth}".encode()).hexdigest()
+    return Catalog(digest=digest, apps=tuple(App(from_dir / name) for name in names))
@@ -0,0 +1,63 @@
+"""Sync configuration files listing source and target directory pairs."""
+
+import json
+import os
+import tomllib
+from pathlib import Path
+from typing import cast
+
+
+class ConfigError(ValueError):
+    """Raised when a configuration file cannot be used."""
+
+
+def _expand(value: object) -> Path | None:
+    """Expand environment variables and ~ in a configured directory."""
+    if not isinstance(value, str):
+        return None
+    return Path(os.path.expandvars(value)).expanduser()
+
+
+def load_pairs(path: Path) -> list[tuple[Path, Path]]:
+    """Load source and target directory pairs from a TOML or JSON file.
+
+    The file holds a "pairs" array of tables/objects with "source" and
+    "target" keys. Files ending in .toml are parsed as TOML, anything else
+    as JSON. Environment variables such as $HOME are expanded, so the Nix
+    modules can generate one file for every user.
+
+    Args:
+        path: Configuration file
+
+    Returns:
+        List of (from_dir, to_dir) pairs in file order
+
+    Raises:
+        ConfigError: If the file cannot be parsed or has the wrong layout
+
+    """
+    try:
+        text = path.read_text()
+        if path.suffix == ".toml":
+            data = cast("object", tomllib.loads(text))
+        else:
+            data = cast("object", json.loads(text))
+    except (OSError, ValueError) as e:
+        msg = f"invalid config {path}: {e}"
+        raise ConfigError(msg) from e
+
+    pairs = cast("dict[str, object]", data).get("pairs") if isinstance(data, dict) else None
+    if not isinstance(pairs, list):
+        msg = f"invalid config {path}: expected a 'pairs' array"
+        raise ConfigError(msg)
+
+    loaded: list[tuple[Path, Path]] = []
+    for i, pair in enumerate(cast("list[object]", pairs)):
+        entry = cast("dict[str, object]", pair) if isinstance(pair, dict) else {}
+        source = _expand(entry.get("source"))
+        target = _expand(entry.get("target"))
+        if source is None or target is None:
+            msg = f"invalid config {path}: pairs[{i}] needs string 'source' and 'target'"
+            raise ConfigError(msg)
+        loaded.append((source, target))
+    return loaded
@@ -0,0 +1,42 @@
+"""Overall time budget for a sync, shared by every subprocess it runs.
+
+Code that spawns a subprocess asks remaining() for its timeout, which is
+None unless a budget is active. The CLI activates one for sync --deadline:
+
+    with deadline(30):
+        sync_dock(trampolines)
+"""
+
+import time
+from collections.abc import Generator
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+# Monotonic time the active budget runs out at
+_end: ContextVar[float | None] = ContextVar("nix_spotlight_deadline", default=None)
+
+
+@contextmanager
+def deadline(seconds: float | None) -> Generator[None]:
+    """Give the code run inside the block seconds to finish.
+
+    Args:
+        seconds: Time budget, or None for no limit
+
+    """
+    if seconds is None:
+        yield
+        return
+    token = _end.set(time.monotonic() + seconds)
+    try:
+        yield
+    finally:
+        _end.reset(token)
+
+
+def remaining() -> float | None:
+    """Return the seconds left in the active budget, or None without one."""
+    end = _end.get()
+    if end is None:
+        return None
+    return max(0.0, end - time.monotonic())
@@ -1,67 +1,624 @@
-"""Dock syncing via dockutil."""
+"""Dock syncing via dockutil or the Dock preferences plist."""
 
+import os
+import plistlib
 import shutil
 import subprocess
+from collections import Counter
+from collections.abc import Callable, Collection
+from dataclasses import dataclass, replace
 from pathlib import Path
+from typing import cast
+from urllib.parse import unquote, urlsplit
 
-from .types import DockSyncResult
+from .deadline import remaining
+from .metadata import MetadataCache, read_metadata
+from .timings import count, phase
+from .types import App, AppMetadata, DockSyncResult
 
+# Preferences domain holding the pinned apps under "persistent-apps"
+DOCK_DOMAIN = "com.apple.dock"
 
-def sync_dock(apps: list[Path], dockutil_path: str | None = None) -> DockSyncResult:
+# Command restarting the Dock so it reloads its preferences
+_RESTART_DOCK = ("killall", "Dock")
+
+
+def _run(cmd: list[str], stdin: str | None = None) -> subprocess.CompletedProcess[str]:
+    """Run a Dock command, bounded by what is left of the sync deadline.
+
+    Raises:
+        TimeoutError: If the deadline passed before or while it ran
+
+    """
+    timeout = remaining()
+    step = f"{Path(cmd[0]).name} {cmd[1]}"
+    if timeout is not None and timeout <= 0:
+        msg = f"{step} skipped: deadline reached"
+        raise TimeoutError(msg)
+    try:
+        return subprocess.run(
+            cmd, input=stdin, capture_output=True, text=True, check=False, timeout=timeout
+        )
+    except subprocess.TimeoutExpired as e:
+        msg = f"{step} timed out after {e.timeout:.1f}s"
+        raise TimeoutError(msg) from e
+
+
+def _restart_dock() -> str | None:
+    """Restart the Dock so it reloads its preferences.
+
+    Returns:
+        An error message if the restart failed, otherwise None
+
+    Raises:
+        TimeoutError: If the deadline passed before or while it ran
+
+    """
+    result = _run(list(_RESTART_DOCK))
+    if result.returncode != 0:
+        return f"Failed to restart Dock: {result.stderr}"
+    return None
+
+
+def _item_path(location: str) -> str:
+    """Normalize a dockutil listing location (URL or path) to a plain path."""
+    if location.startswith("file://"):
+        location = unquote(urlsplit(location).path)
+    return location.rstrip("/")
+
+
+@dataclass(frozen=True, slots=True)
+class _DockItem:
+    """A Dock item parsed from a dockutil listing."""
+
+    label: str
+    path: str
+
+
+def _parse_listing(listing: str) -> list[_DockItem]:
+    """Parse dockutil -L output (label, location, section, plist) into items."""
+    items: list[_DockItem] = []
+    for line in listing.splitlines():
+        if not line.strip():
+            continue
+        fields = line.split("\t")
+        items.append(_DockItem(fields[0], _item_path(fields[1]) if len(fields) > 1 else ""))
+    return items
+
+
+class _DockIndex:
+    """Trampolines keyed by every name a Dock item may know them by.
+
+    A Dock item pointing into the store is matched by its exact store
+    path, then the CFBundleIdentifier of the bundle it points at, then
+    the basename of that bundle and finally its label. The identifier
+    and basename keep renamed apps and apps sharing a display name
+    apart. Each lookup is a dict access; the trampolines' Info.plist
+    files are only read once an item is not found by store path, and
+    through the metadata cache when one is given. When several
+    trampolines share a key the first one wins, as in sync.
+    """
+
+    def __init__(self, apps: list[Path], metadata: MetadataCache | None = None) -> None:
+        """Resolve each trampoline once and index it by path, basename and label."""
+        self._read: Callable[[App], AppMetadata] = (
+            read_metadata if metadata is None else metadata.get
+        )
+        self._sources: list[tuple[Path, str]] = []
+        self._by_source: dict[str, str] = {}
+        self._by_basename: dict[str, str] = {}
+        self._by_label: dict[str, str] = {}
+        self._by_identifier: dict[str, str] | None = None
+        for app in apps:
+            target = str(app.resolve())
+            source = Path(os.path.realpath(app / "Contents")).parent
+            self._sources.append((source, target))
+            _ = self._by_source.setdefault(str(source), target)
+            _ = self._by_basename.setdefault(source.name, target)
+            _ = self._by_label.setdefault(app.stem, target)
+        self.targets: frozenset[str] = frozenset(target for _, target in self._sources)
+
+    def _identifiers(self) -> dict[str, str]:
+        """Return trampoline targets keyed by bundle identifier, reading them once."""
+        if self._by_identifier is None:
+            self._by_identifier = {}
+            for source, target in self._sources:
+                identifier = self._read(App(source)).bundle_identifier
+                if identifier is not None:
+                    _ = self._by_identifier.setdefault(identifier, target)
+        return self._by_identifier
+
+    def match(self, item: _DockItem) -> str | None:
+        """Return the trampoline a Dock item should point at, if any."""
+        found = self._by_source.get(item.path)
+        if found is not None:
+            return found
+        identifier = self._read(App(Path(item.path))).bundle_identifier
+        if identifier is not None and (found := self._identifiers().get(identifier)):
+            return found
+        return self._by_basename.get(Path(item.path).name) or self._by_label.get(item.label)
+
+
+def _is_stale(path: str, retired: Collection[str]) -> bool:
+    """Check whether the app of an unmatched store item was collected or left the source.
+
+    Args:
+        path: Bundle path the Dock item points at
+        retired: Resolved bundle paths of apps that left the source
+
+    """
+    real = Path(os.path.realpath(path))
+    return not real.exists() or str(real) in retired
+
+
+def _find_replacements(
+    listing: str,
+    apps: list[Path],
+    *,
+    prune: bool = False,
+    retired: Collection[str] = (),
+    metadata: MetadataCache | None = None,
+) -> tuple[list[tuple[str, str]], list[str], int, set[str]]:
+    """Find /nix/store dock items in a dockutil listing that need updating.
+
+    Returns:
+        (name, trampoline path) pairs to replace, the names of stale
+        /nix/store items to remove when pruning, how many other
+        /nix/store items without a matching trampoline are left alone and
+        the names among those to replace or remove that more than one
+        Dock item carries
+
+    """
+    index = _DockIndex(apps, metadata)
+    items = _parse_listing(listing)
+    replacements: list[tuple[str, str]] = []
+    stale: list[str] = []
+    skipped = 0
+
+    for item in items:
+        if item.path in index.targets or "/nix/store" not in item.path:
+            continue
+
+        target = index.match(item)
+        if target is not None:
+            replacements.append((item.label, target))
+        elif prune and _is_stale(item.path, retired):
+            stale.append(item.label)
+        else:
+            skipped += 1
+
+    labels = Counter(item.label for item in items)
+    changed = {name for name, _ in replacements}.union(stale)
+    ambiguous = {name for name in changed if labels[name] > 1}
+    return replacements, stale, skipped, ambiguous
+
+
+def _list_items(dockutil: str) -> subprocess.CompletedProcess[str]:
+    """Run dockutil -L to list the Dock items, raising TimeoutError past the deadline."""
+    with phase("dock_list"):
+        result = _run([dockutil, "-L"])
+    count("subprocesses_spawned")
+    return result
+
+
+def _replace_items(
+    dockutil: str,
+    replacements: list[tuple[str, str]],
+    *,
+    removals: list[str] | None = None,
+    skipped: int = 0,
+    spawned: int = 0,
+) -> DockSyncResult:
+    """Replace and remove Dock items with dockutil, restarting the Dock once.
+
+    Args:
+        dockutil: Path to dockutil binary
+        replacements: (name, trampoline path) pairs to replace
+        removals: Names of items to remove from the Dock
+        skipped: Items already skipped, carried into the result
+        spawned: Subprocesses already spawned, carried into the result
+
+    Returns:
+        DockSyncResult including the carried counts
+
+    """
+    updated = 0
+    removed = 0
+    restarts = 0
+    errors: list[str] = []
+    spawned_before = spawned
+    timed_out = False
+
+    with phase("dock_update"):
+        try:
+            for name in removals or []:
+                remove_result = _run([dockutil, "--remove", name, "--no-restart"])
+                spawned += 1
+
+                if remove_result.returncode != 0:
+                    errors.append(f"Failed to remove {name}: {remove_result.stderr}")
+                else:
+                    removed += 1
+
+            for name, target in replacements:
+                add_result = _run([dockutil, "--add", target, "--replacing", name, "--no-restart"])
+                spawned += 1
+
+                if add_result.returncode != 0:
+                    errors.append(f"Failed to update {name}: {add_result.stderr}")
+                else:
+                    updated += 1
+
+            if updated or removed:
+                error = _restart_dock()
+                spawned += 1
+                restarts += 1
+                if error is not None:
+                    errors.append(error)
+        except TimeoutError as e:
+            # Whatever is left is up to a later run, which must restart the
+            # Dock even if it finds nothing left to change
+            errors.append(str(e))
+            timed_out = True
+
+    count("subprocesses_spawned", spawned - spawned_before)
+    return DockSyncResult(
+        updated=updated,
+        skipped=skipped,
+        removed=removed,
+        spawned=spawned,
+        restarts=restarts,
+        errors=tuple(errors),
+        timed_out=timed_out,
+        restart_pending=timed_out and not restarts and bool(updated or removed),
+    )
+
+
+def restart_dock() -> DockSyncResult:
+    """Restart the Dock so it loads changes made by a run that ran out of time.
+
+    Returns:
+        DockSyncResult with the restart and any error, or timed out with the
+        restart still pending if the deadline ran out
+
+    """
+    try:
+        with phase("dock_restart"):
+            error = _restart_dock()
+    except TimeoutError as e:
+        return DockSyncResult(errors=(str(e),), timed_out=True, restart_pending=True)
+    count("subprocesses_spawned")
+    return DockSyncResult(spawned=1, restarts=1, errors=() if error is None else (error,))
+
+
+def sync_dock(
+    apps: list[Path],
+    dockutil_path: str | None = None,
+    *,
+    prune: bool = False,
+    retired: Collection[str] = (),
+    metadata: MetadataCache | None = None,
+) -> DockSyncResult:
     """Update dock persistent items pointing to /nix/store.
 
     Finds pinned dock items with /nix/store paths and updates them
-    to point to the new trampoline locations.
+    to point to the new trampoline locations. Every update is made with
+    dockutil's --no-restart and the Dock is restarted once at the end,
+    only if something changed. Items already pointing at their trampoline
+    are left alone without spawning dockutil. dockutil addresses items by
+    label, so when an item to update shares its label with another item
+    the whole update goes through sync_dock_plist instead.
 
     Args:
         apps: List of trampoline app paths
         dockutil_path: Path to dockutil binary (auto-detected if None)
+        prune: Remove /nix/store items without a trampoline whose store
+            path is gone or whose app left the source, instead of skipping
+            them; other unmatched items are always left alone
+        retired: Resolved bundle paths of apps that left the source since
+            the last sync
+        metadata: Cache for the Info.plist lookups matching items by
+            bundle identifier (read uncached if None)
 
     Returns:
-        DockSyncResult with counts of updated, skipped items and any errors
+        DockSyncResult with counts of updated, skipped and removed items,
+        spawned subprocesses, Dock restarts and any errors
 
     """
     dockutil = dockutil_path or shutil.which("dockutil")
     if not dockutil:
         return DockSyncResult()
 
-    result = subprocess.run(
-        [dockutil, "-L"],
-        capture_output=True,
-        text=True,
-        check=False,
+    try:
+        result = _list_items(dockutil)
+    except TimeoutError as e:
+        return DockSyncResult(errors=(str(e),), timed_out=True)
+    if result.returncode != 0:
+        return DockSyncResult(spawned=1, errors=(f"dockutil -L failed: {result.stderr}",))
+
+    replacements, stale, skipped, ambiguous = _find_replacements(
+        result.stdout, apps, prune=prune, retired=retired, metadata=metadata
     )
+    if ambiguous:
+        plist = sync_dock_plist(apps, prune=prune, retired=retired, metadata=metadata)
+        return replace(plist, spawned=plist.spawned + 1)
+    return _replace_items(dockutil, replacements, removals=stale, skipped=skipped, spawned=1)
+
+
+def plan_dock(
+    apps: list[Path],
+    dockutil_path: str | None = None,
+    *,
+    metadata: MetadataCache | None = None,
+) -> list[tuple[str, str]]:
+    """List the Dock items sync_dock would update, without changing the Dock.
 
+    Args:
+        apps: List of trampoline app paths
+        dockutil_path: Path to dockutil binary (auto-detected if None)
+        metadata: Cache for Info.plist lookups (read uncached if None)
+
+    Returns:
+        (name, trampoline path) pairs, empty if dockutil is unavailable or fails
+
+    """
+    dockutil = dockutil_path or shutil.which("dockutil")
+    if not dockutil:
+        return []
+
+    try:
+        result = _list_items(dockutil)
+    except TimeoutError:
+        return []
     if result.returncode != 0:
-        return DockSyncResult(errors=(f"dockutil -L failed: {result.stderr}",))
+        return []
+    return _find_replacements(result.stdout, apps, metadata=metadata)[0]
+
+
+def update_dock(
+    replacements: list[tuple[str, str]], dockutil_path: str | None = None
+) -> DockSyncResult:
+    """Replace Dock items listed by plan_dock without listing the Dock again.
+
+    Items sharing a name cannot be told apart by dockutil, so they are
+    left alone and reported as errors.
+
+    Args:
+        replacements: (name, trampoline path) pairs from plan_dock
+        dockutil_path: Path to dockutil binary (auto-detected if None)
+
+    Returns:
+        DockSyncResult with counts of updated and skipped items, spawned
+        subprocesses, Dock restarts and any errors
+
+    """
+    dockutil = dockutil_path or shutil.which("dockutil")
+    if not dockutil or not replacements:
+        return DockSyncResult()
+
+    names = Counter(name for name, _ in replacements)
+    unique = [(name, target) for name, target in replacements if names[name] == 1]
+    result = _replace_items(dockutil, unique, skipped=len(replacements) - len(unique))
+    shared = sorted(name for name, seen in names.items() if seen > 1)
+    if not shared:
+        return result
+    errors = tuple(f"Dock items sharing the name {name} left alone" for name in shared)
+    return replace(result, errors=errors + result.errors)
+
 
-    app_stems = {app.stem: app for app in apps}
+def _file_data(item: object) -> tuple[dict[str, object], dict[str, object]] | None:
+    """Return the tile-data and file-data dicts of a persistent-apps item."""
+    if not isinstance(item, dict):
+        return None
+    tile_data = cast("dict[str, object]", item).get("tile-data")
+    if not isinstance(tile_data, dict):
+        return None
+    tile = cast("dict[str, object]", tile_data)
+    file_data = tile.get("file-data")
+    if not isinstance(file_data, dict):
+        return None
+    return tile, cast("dict[str, object]", file_data)
+
+
+def _rewrite_items(
+    items: list[object],
+    apps: list[Path],
+    *,
+    prune: bool = False,
+    retired: Collection[str] = (),
+    metadata: MetadataCache | None = None,
+) -> tuple[int, int, int]:
+    """Point /nix/store persistent-apps items at their trampolines in place.
+
+    Stale items without a trampoline are dropped from items when pruning.
+
+    Returns:
+        Counts of updated, skipped and removed items
+
+    """
+    index = _DockIndex(apps, metadata)
     updated = 0
     skipped = 0
-    errors: list[str] = []
+    kept: list[object] = []
 
-    for line in result.stdout.splitlines():
-        if not line.strip():
+    for item in items:
+        kept.append(item)
+        found = _file_data(item)
+        if found is None:
             continue
-        if "/nix/store" not in line:
+        tile, file_data = found
+        url = file_data.get("_CFURLString")
+        if not isinstance(url, str) or "/nix/store" not in url:
             continue
 
-        name = line.split("\t")[0]
-        if name not in app_stems:
-            skipped += 1
+        label = tile.get("file-label")
+        path = _item_path(url)
+        target = index.match(_DockItem(label if isinstance(label, str) else "", path))
+        if target is None:
+            if prune and _is_stale(path, retired):
+                _ = kept.pop()
+            else:
+                skipped += 1
             continue
 
-        trampoline = app_stems[name]
-        add_result = subprocess.run(
-            [dockutil, "--add", str(trampoline.resolve()), "--replacing", name],
-            capture_output=True,
-            text=True,
-            check=False,
+        file_data["_CFURLString"] = f"{Path(target).as_uri()}/"
+        file_data["_CFURLStringType"] = 15
+        # Bookmark data would otherwise still resolve to the old store path
+        _ = tile.pop("book", None)
+        updated += 1
+
+    removed = len(items) - len(kept)
+    items[:] = kept
+    return updated, skipped, removed
+
+
+def _defaults(verb: str, data: bytes | None = None) -> bytes:
+    """Export or import the Dock preferences with defaults.
+
+    cfprefsd caches preferences in memory, so the plist file itself is
+    only read and written through it; a direct write would be missed or
+    overwritten by the cached copy.
+
+    Raises:
+        OSError: If defaults failed
+        TimeoutError: If the deadline passed before or while it ran
+
+    """
+    result = _run(["defaults", verb, DOCK_DOMAIN, "-"], None if data is None else data.decode())
+    count("subprocesses_spawned")
+    if result.returncode != 0:
+        raise OSError(result.stderr.strip())
+    return result.stdout.encode()
+
+
+def _read_prefs(plist_path: Path | None) -> bytes:
+    """Read the Dock preferences from plist_path, or through cfprefsd if None."""
+    if plist_path is None:
+        return _defaults("export")
+    return plist_path.read_bytes()
+
+
+def _write_prefs(plist_path: Path | None, prefs: dict[str, object], raw: bytes) -> None:
+    """Write the Dock preferences back in the format raw was read in."""
+    fmt = plistlib.FMT_BINARY if raw.startswith(b"bplist") else plistlib.FMT_XML
+    data = plistlib.dumps(prefs, fmt=fmt)
+    if plist_path is None:
+        _ = _defaults("import", data)
+        return
+    tmp = plist_path.with_name(f"{plist_path.name}.tmp")
+    _ = tmp.write_bytes(data)
+    _ = tmp.replace(plist_path)
+
+
+def sync_dock_plist(  # noqa: PLR0913
+    apps: list[Path],
+    plist_path: Path | None = None,
+    *,
+    restart: bool = True,
+    prune: bool = False,
+    retired: Collection[str] = (),
+    metadata: MetadataCache | None = None,
+) -> DockSyncResult:
+    """Update dock persistent items pointing to /nix/store via the Dock preferences.
+
+    Exports the Dock preferences once, rewrites every matching /nix/store
+    URL in memory, imports them once and restarts the Dock at most once,
+    instead of spawning dockutil for every item.
+
+    Args:
+        apps: List of trampoline app paths
+        plist_path: Plist file to edit directly instead of the live Dock
+            preferences, which go through defaults export and import
+        restart: Whether to restart the Dock after changing the plist
+        prune: Remove stale /nix/store items in the same write, as sync_dock does
+        retired: Resolved bundle paths of apps that left the source since
+            the last sync
+        metadata: Cache for Info.plist lookups (read uncached if None)
+
+    Returns:
+        DockSyncResult with counts of updated, skipped and removed items,
+        spawned subprocesses and any errors
+
+    """
+    source = DOCK_DOMAIN if plist_path is None else str(plist_path)
+    # defaults is spawned to export the live preferences, and again to import them
+    defaults = int(plist_path is None)
+    try:
+        with phase("dock_read"):
+            raw = _read_prefs(plist_path)
+            data = cast("object", plistlib.loads(raw))
+    except TimeoutError as e:
+        return DockSyncResult(errors=(str(e),), timed_out=True)
+    except (OSError, plistlib.InvalidFileException) as e:
+        return DockSyncResult(spawned=defaults, errors=(f"Failed to read {source}: {e}",))
+
+    prefs = cast("dict[str, object]", data) if isinstance(data, dict) else {}
+    items = prefs.get("persistent-apps")
+    if not isinstance(items, list):
+        return DockSyncResult(spawned=defaults)
+
+    updated, skipped, removed = _rewrite_items(
+        cast("list[object]", items), apps, prune=prune, retired=retired, metadata=metadata
+    )
+    if not updated and not removed:
+        return DockSyncResult(skipped=skipped, spawned=defaults)
+
+    read = DockSyncResult(updated=updated, skipped=skipped, removed=removed, spawned=defaults)
+    return _save_prefs(plist_path, prefs, raw, read, restart=restart)
+
+
+def _save_prefs(
+    plist_path: Path | None,
+    prefs: dict[str, object],
+    raw: bytes,
+    read: DockSyncResult,
+    *,
+    restart: bool,
+) -> DockSyncResult:
+    """Write rewritten Dock preferences and restart the Dock once.
+
+    Args:
+        plist_path: Plist file to write, or None for the live preferences
+        prefs: Rewritten preferences
+        raw: Preferences as read, deciding the format written
+        read: Counts of the rewrite and the subprocesses spawned to read
+        restart: Whether to restart the Dock after writing
+
+    Returns:
+        read with the write and restart added, or its skipped count and an
+        error if the write failed
+
+    """
+    source = DOCK_DOMAIN if plist_path is None else str(plist_path)
+    # Live preferences are imported once for the one export that read them
+    spawned = 2 * read.spawned
+    try:
+        with phase("dock_write"):
+            _write_prefs(plist_path, prefs, raw)
+    except TimeoutError as e:
+        # The import may have finished before it was stopped
+        return DockSyncResult(
+            skipped=read.skipped,
+            spawned=read.spawned,
+            errors=(str(e),),
+            timed_out=True,
+            restart_pending=True,
+        )
+    except OSError as e:
+        return DockSyncResult(
+            skipped=read.skipped, spawned=spawned, errors=(f"Failed to write {source}: {e}",)
         )
 
-        if add_result.returncode != 0:
-            errors.append(f"Failed to update {name}: {add_result.stderr}")
-        else:
-            updated += 1
+    written = replace(read, spawned=spawned)
+    if not restart:
+        return written
 
-    return DockSyncResult(updated=updated, skipped=skipped, errors=tuple(errors))
+    restarted = restart_dock()
+    return replace(
+        written,
+        spawned=written.spawned + restarted.spawned,
+        restarts=restarted.restarts,
+        errors=restarted.errors,
+        timed_out=restarted.timed_out,
+        restart_pending=restarted.restart_pending,
+    )
@@ -0,0 +1,118 @@
+"""Advisory per-target locks so overlapping syncs take turns.
+
+The nix-darwin and Home Manager activations and a manual sync may run at
+the same time. Each one holds the lock of the trampolines directory while
+it reads the manifest and writes trampolines, so they never remove or
+rename the same entries concurrently. A run that had to wait re-reads the
+manifest once it gets the lock and stops there if the run before it
+already applied the same source.
+
+Every target shares the user's Dock, so Dock updates take a lock of their
+own, held until the manifests record the update.
+"""
+
+import fcntl
+import os
+import time
+from collections.abc import Generator
+from contextlib import contextmanager
+from pathlib import Path
+
+from .deadline import remaining
+from .timings import phase
+
+# Lock file kept next to the trampolines directory, which rebuilds remove
+_LOCK_NAME = ".{}.lock"
+
+# Lock file of the Dock, kept next to the metadata cache
+_DOCK_LOCK_NAME = "dock.lock"
+
+# Seconds between attempts to take a held lock while a deadline is active
+_POLL_INTERVAL = 0.05
+
+
+def lock_path(to_dir: Path) -> Path:
+    """Return the lock file guarding a trampolines directory."""
+    return to_dir.with_name(_LOCK_NAME.format(to_dir.name))
+
+
+@contextmanager
+def target_lock(to_dir: Path) -> Generator[bool]:
+    """Hold the exclusive lock of a trampolines directory.
+
+    The lock is an flock on a sibling file, released when the block exits
+    or the process dies. The file itself is left in place, since removing
+    it would let a waiting run lock a file nobody else can see. Under a
+    sync deadline, waiting for another run gives up when it runs out.
+
+    Args:
+        to_dir: Target directory for trampolines
+
+    Yields:
+        True if another run held the lock and this one waited for it
+
+    Raises:
+        TimeoutError: If the sync deadline ran out while waiting
+
+    """
+    with _flock(lock_path(to_dir)) as waited:
+        yield waited
+
+
+@contextmanager
+def dock_lock() -> Generator[bool]:
+    """Hold the exclusive lock of the user's Dock.
+
+    Yields:
+        True if another run held the lock and this one waited for it
+
+    Raises:
+        TimeoutError: If the sync deadline ran out while waiting
+
+    """
+    from .metadata import default_cache_path  # noqa: PLC0415 - only Dock syncs need it
+
+    with _flock(default_cache_path().with_name(_DOCK_LOCK_NAME)) as waited:
+        yield waited
+
+
+@contextmanager
+def _flock(path: Path) -> Generator[bool]:
+    """Hold an exclusive flock on path, creating the file if needed."""
+    path.parent.mkdir(parents=True, exist_ok=True)
+    fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o644)
+    try:
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            with phase("lock_wait"):
+                _wait(fd, path)
+            waited = True
+        else:
+            waited = False
+        yield waited
+    finally:
+        os.close(fd)
+
+
+def _wait(fd: int, path: Path) -> None:
+    """Block until fd holds its lock, giving up when the sync deadline runs out.
+
+    Raises:
+        TimeoutError: If the deadline ran out before the lock was released
+
+    """
+    if remaining() is None:
+        fcntl.flock(fd, fcntl.LOCK_EX)
+        return
+    while True:
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            left = remaining() or 0.0
+            if left <= 0:
+                msg = f"Timed out waiting for the lock {path}"
+                raise TimeoutError(msg) from None
+            time.sleep(min(_POLL_INTERVAL, left))
+        else:
+            return
@@ -0,0 +1,176 @@
+"""Persistent sync manifest for skipping no-op activations."""
+
+import hashlib
+import json
+import os
+from collections.abc import Iterator
+from dataclasses import replace
+from pathlib import Path
+from typing import cast
+
+from .types import Manifest
+
+# Manifest file kept inside the trampolines directory
+MANIFEST_NAME = ".nix-spotlight.json"
+
+# How many directory levels below from_dir are searched by default (for nested
+# apps like KDE/). Defined here so the digest covers the same levels as
+# discovery without loading the trampoline module on a no-op run.
+DEFAULT_MAX_DEPTH = 1
+
+# Bumped whenever the manifest layout or digest inputs change
+_MANIFEST_VERSION = 2
+
+
+def _entered_dirs(
+    entries: list[os.DirEntry[str]], depth: int, visited: set[tuple[int, int]]
+) -> Iterator[str]:
+    """Stamp each directory discovery enters below a listing.
+
+    A stamp holds the directory's identity and mtime: a store directory is
+    replaced by a new inode in every generation, while a mutable one gets a
+    new mtime whenever an entry is added, removed or renamed. Costs one stat
+    per directory plus a read of those with levels left below them.
+    """
+    if depth <= 0:
+        return
+    for entry in entries:
+        if entry.name.endswith(".app") or not entry.is_dir():
+            continue
+        st = entry.stat()
+        key = (st.st_dev, st.st_ino)
+        if key in visited:
+            continue
+        visited.add(key)
+        yield f"{entry.path}\0{st.st_dev}\0{st.st_ino}\0{st.st_mtime_ns}"
+        if depth > 1:
+            with os.scandir(entry.path) as it:
+                nested = sorted(it, key=lambda nested_entry: nested_entry.name)
+            yield from _entered_dirs(nested, depth - 1, visited)
+
+
+def source_digest(from_dir: Path, max_depth: int | None = None) -> str:
+    """Digest the listing of a source directory and the directories below it.
+
+    The top level costs one stat and a single directory read: entry names
+    and inode numbers both come from readdir, so no per-entry stat is
+    needed. The directory's own inode changes with every Nix profile
+    generation and its mtime changes whenever an entry is added, removed or
+    replaced. Every nested directory discovery would enter, such as KDE/,
+    is folded in by identity and mtime, so apps added there are noticed.
+
+    Args:
+        from_dir: Source directory containing .app bundles
+        max_depth: Discovery depth of the sync, if not the default, so that
+            changing it invalidates the manifest
+
+    Returns:
+        Hex digest identifying the current directory contents
+
+    """
+    st = from_dir.stat()
+    with os.scandir(from_dir) as it:
+        entries = sorted(it, key=lambda entry: entry.name)
+
+    digest = hashlib.sha256(f"{from_dir}\0{st.st_dev}\0{st.st_ino}\0{st.st_mtime_ns}".encode())
+    if max_depth is not None:
+        digest.update(f"\0depth={max_depth}".encode())
+    for entry in entries:
+        digest.update(f"\n{entry.name}\0{entry.inode()}".encode())
+    depth = DEFAULT_MAX_DEPTH if max_depth is None else max_depth
+    for stamp in _entered_dirs(entries, depth, {(st.st_dev, st.st_ino)}):
+        digest.update(f"\n{stamp}".encode())
+    return digest.hexdigest()
+
+
+def read_manifest(to_dir: Path) -> Manifest | None:
+    """Read the manifest of a trampolines directory.
+
+    Args:
+        to_dir: Target directory for trampolines
+
+    Returns:
+        The stored Manifest, or None if missing, unreadable or outdated
+
+    """
+    try:
+        data = cast("object", json.loads((to_dir / MANIFEST_NAME).read_text()))
+    except (OSError, ValueError):
+        return None
+
+    if not isinstance(data, dict):
+        return None
+
+    fields = cast("dict[str, object]", data)
+    digest = fields.get("digest")
+    apps = fields.get("apps")
+    if fields.get("version") != _MANIFEST_VERSION or not isinstance(digest, str):
+        return None
+    if not isinstance(apps, dict):
+        return None
+
+    entries = cast("dict[str, object]", apps)
+    return Manifest(
+        digest=digest,
+        apps={name: str(path) for name, path in entries.items()},
+        dock_synced=fields.get("dock_synced") is True,
+    )
+
+
+def _write(to_dir: Path, manifest: Manifest) -> None:
+    """Replace the manifest file atomically so readers never see a partial write."""
+    data = {
+        "version": _MANIFEST_VERSION,
+        "digest": manifest.digest,
+        "apps": manifest.apps,
+        "dock_synced": manifest.dock_synced,
+    }
+    tmp = to_dir / f"{MANIFEST_NAME}.tmp"
+    _ = tmp.write_text(json.dumps(data, indent=2, sort_keys=True))
+    _ = tmp.replace(to_dir / MANIFEST_NAME)
+
+
+def write_manifest(to_dir: Path, digest: str, trampolines: list[Path]) -> Manifest:
+    """Write the manifest for a freshly synced trampolines directory.
+
+    Each app name is mapped to the resolved store path of its bundle. The
+    Dock is recorded as not yet updated for these trampolines; see
+    mark_dock_synced.
+
+    Args:
+        to_dir: Target directory for trampolines
+        digest: Source digest the trampolines were synced from
+        trampolines: Trampoline paths created by the sync
+
+    Returns:
+        The Manifest that was written
+
+    """
+    manifest = Manifest(
+        digest=digest,
+        apps={t.name: str((t / "Contents").resolve().parent) for t in trampolines},
+    )
+    _write(to_dir, manifest)
+    return manifest
+
+
+def mark_dock_synced(to_dir: Path, digest: str) -> bool:
+    """Record that the Dock was updated for the trampolines of a manifest.
+
+    Nothing is written if the manifest is gone or another run has since
+    synced a different source into to_dir.
+
+    Args:
+        to_dir: Target directory for trampolines
+        digest: Source digest the Dock was updated for
+
+    Returns:
+        True if the manifest was updated
+
+    """
+    manifest = read_manifest(to_dir)
+    if manifest is None or manifest.digest != digest:
+        return False
+    if not manifest.dock_synced:
+        _write(to_dir, replace(manifest, dock_synced=True))
+    return True
@@ -0,0 +1,178 @@
+"""Info.plist metadata with an on-disk cache for immutable store paths."""
+
+import json
+import os
+import plistlib
+import threading
+from pathlib import Path
+from typing import cast
+
+from .types import App, AppMetadata
+
+# Prefix of immutable paths whose metadata can be cached forever
+STORE_DIR = "/nix/store"
+
+# Bumped whenever the cache layout changes
+_CACHE_VERSION = 1
+
+
+def default_cache_path() -> Path:
+    """Return the metadata cache location, honouring XDG_CACHE_HOME."""
+    base = os.environ.get("XDG_CACHE_HOME") or Path("~/.cache").expanduser()
+    return Path(base) / "nix-spotlight" / "metadata.json"
+
+
+def _str(value: object) -> str | None:
+    """Return value if it is a string, otherwise None."""
+    return value if isinstance(value, str) else None
+
+
+def _url_schemes(url_types: object) -> tuple[str, ...]:
+    """Collect CFBundleURLSchemes from a CFBundleURLTypes array."""
+    if not isinstance(url_types, list):
+        return ()
+    schemes: list[str] = []
+    for url_type in cast("list[object]", url_types):
+        if not isinstance(url_type, dict):
+            continue
+        entries = cast("dict[str, object]", url_type).get("CFBundleURLSchemes")
+        if isinstance(entries, list):
+            schemes.extend(s for s in cast("list[object]", entries) if isinstance(s, str))
+    return tuple(schemes)
+
+
+def read_metadata(app: App) -> AppMetadata:
+    """Parse bundle metadata from an app's Info.plist.
+
+    Args:
+        app: The .app bundle to read
+
+    Returns:
+        AppMetadata, empty if the plist is missing or unreadable
+
+    """
+    try:
+        data = cast("object", plistlib.loads(app.info_plist.read_bytes()))
+    except (OSError, plistlib.InvalidFileException, ValueError):
+        return AppMetadata()
+    if not isinstance(data, dict):
+        return AppMetadata()
+
+    info = cast("dict[str, object]", data)
+    return AppMetadata(
+        bundle_identifier=_str(info.get("CFBundleIdentifier")),
+        bundle_name=_str(info.get("CFBundleName")),
+        version=_str(info.get("CFBundleShortVersionString")) or _str(info.get("CFBundleVersion")),
+        url_schemes=_url_schemes(info.get("CFBundleURLTypes")),
+    )
+
+
+class MetadataCache:
+    """Lazily parsed app metadata, cached on disk by resolved store path.
+
+    Store paths never change once they exist, so their metadata is kept
+    until the path is garbage collected. Apps outside the store are
+    parsed on every lookup. Lookups are safe to make from several threads.
+    """
+
+    def __init__(self, path: Path | None = None, store_dir: str = STORE_DIR) -> None:
+        """Load the cache from path (defaults to default_cache_path())."""
+        self.path: Path = path or default_cache_path()
+        self.store_dir: str = store_dir.rstrip("/") + "/"
+        self._entries: dict[str, AppMetadata] = self._load()
+        self._dirty: bool = False
+        self._lock: threading.Lock = threading.Lock()
+
+    def _load(self) -> dict[str, AppMetadata]:
+        """Read cached entries, ignoring a missing or malformed cache."""
+        try:
+            data = cast("object", json.loads(self.path.read_text()))
+        except (OSError, ValueError):
+            return {}
+        if not isinstance(data, dict):
+            return {}
+        fields = cast("dict[str, object]", data)
+        entries = fields.get("entries")
+        if fields.get("version") != _CACHE_VERSION or not isinstance(entries, dict):
+            return {}
+
+        loaded: dict[str, AppMetadata] = {}
+        for key, value in cast("dict[str, object]", entries).items():
+            if not isinstance(value, dict):
+                continue
+            entry = cast("dict[str, object]", value)
+            schemes = entry.get("url_schemes")
+            loaded[key] = AppMetadata(
+                bundle_identifier=_str(entry.get("bundle_identifier")),
+                bundle_name=_str(entry.get("bundle_name")),
+                version=_str(entry.get("version")),
+                url_schemes=_url_schemes([{"CFBundleURLSchemes": schemes}]),
+            )
+        return loaded
+
+    def __len__(self) -> int:
+        """Return the number of cached store paths."""
+        return len(self._entries)
+
+    def get(self, app: App) -> AppMetadata:
+        """Return the metadata of app, parsing its Info.plist on a cache miss.
+
+        Args:
+            app: The .app bundle to look up
+
+        Returns:
+            AppMetadata for the bundle
+
+        """
+        key = str(app.path.resolve())
+        if not key.startswith(self.store_dir):
+            return read_metadata(app)
+
+        with self._lock:
+            cached = self._entries.get(key)
+        if cached is not None:
+            return cached
+
+        metadata = read_metadata(App(Path(key)))
+        with self._lock:
+            self._entries[key] = metadata
+            self._dirty = True
+        return metadata
+
+    def evict(self) -> int:
+        """Drop entries whose store path no longer exists.
+
+        Returns:
+            Number of evicted entries
+
+        """
+        with self._lock:
+            stale = [key for key in self._entries if not Path(key).exists()]
+            for key in stale:
+                del self._entries[key]
+            self._dirty = self._dirty or bool(stale)
+        return len(stale)
+
+    def save(self) -> None:
+        """Write the cache to disk if it changed since it was loaded."""
+        with self._lock:
+            if not self._dirty:
+                return
+            data = {
+                "version": _CACHE_VERSION,
+                "entries": {
+                    key: {
+                        "bundle_identifier": m.bundle_identifier,
+                        "bundle_name": m.bundle_name,
+                        "version": m.version,
+                        "url_schemes": list(m.url_schemes),
+                    }
+                    for key, m in sorted(self._entries.items())
+                },
+            }
+            self._dirty = False
+
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = self.path.with_name(f"{self.path.name}.tmp")
+        _ = tmp.write_text(json.dumps(data, indent=2))
+        _ = tmp.replace(self.path)
@@ -0,0 +1,194 @@
+"""Plan/apply split of an incremental sync.
+
+plan() scans the source and target once and returns the changes
+reconcile_trampolines would make, without writing anything. apply()
+carries a plan out, grouping its actions by kind so every deletion,
+symlink, touch and Dock update is made in one batch.
+"""
+
+import os
+from collections.abc import Collection
+from functools import partial
+from pathlib import Path
+from typing import Literal, cast
+
+from .dock import plan_dock, update_dock
+from .manifest import DEFAULT_MAX_DEPTH
+from .timings import count, phase
+from .trampoline import (
+    create_trampoline,
+    gather_apps,
+    pending_change,
+    remove_entry,
+    run_each,
+    target_entries,
+    unique_apps,
+)
+from .types import (
+    Action,
+    ActionKind,
+    App,
+    DockSyncResult,
+    Plan,
+    TrampolineSyncResult,
+)
+
+
+def plan(
+    from_dir: Path,
+    to_dir: Path,
+    *,
+    dock: bool = False,
+    dockutil_path: str | None = None,
+    max_depth: int = DEFAULT_MAX_DEPTH,
+) -> Plan:
+    """Compute the changes that would bring to_dir up to date.
+
+    Nothing is written. Deletions come first, then created and repointed
+    trampolines, then the touches that make Spotlight reindex them and
+    finally any Dock items that would be updated.
+
+    Args:
+        from_dir: Source directory containing .app bundles
+        to_dir: Target directory for trampolines
+        dock: Whether to plan Dock updates from a dockutil listing
+        dockutil_path: Path to dockutil binary (auto-detected if None)
+        max_depth: Directory levels below from_dir to search
+
+    Returns:
+        Plan with the actions and the trampolines present after applying it
+
+    """
+    found = gather_apps(from_dir, max_depth=max_depth)
+    changes: list[Action] = []
+    touches: list[Action] = []
+    seen: set[str] = set()
+
+    with phase("plan"):
+        existing = set(target_entries(to_dir))
+        # The same rules as reconcile_trampolines, which this plan must match
+        apps = list(unique_apps(found, seen))
+        for app in apps:
+            outcome = pending_change(app, to_dir, existing)
+            if outcome == "unchanged":
+                continue
+            kind: ActionKind = "create" if outcome == "created" else "repoint"
+            changes.append(Action(kind, app.name, app.contents))
+            touches.append(Action("touch", app.name))
+
+    actions = [Action("delete", name) for name in sorted(existing - seen)]
+    actions.extend(changes)
+    actions.extend(touches)
+    trampolines = tuple(to_dir / app.name for app in apps)
+    if dock:
+        actions.extend(
+            Action("dock", name, Path(target))
+            for name, target in plan_dock(list(trampolines), dockutil_path)
+        )
+    return Plan(from_dir, to_dir, tuple(actions), trampolines)
+
+
+def _link(app: App, to_dir: Path, repoints: Collection[str]) -> Literal["created", "repointed"]:
+    """Write the Contents symlink of a created or repointed trampoline."""
+    _ = create_trampoline(app, to_dir)
+    return "repointed" if app.name in repoints else "created"
+
+
+def _prune(to_dir: Path, deletes: list[Action]) -> tuple[int, list[str]]:
+    """Remove stale entries, returning how many were removed and any errors."""
+    removed = 0
+    errors: list[str] = []
+    with phase("prune"):
+        entries = target_entries(to_dir)
+        for action in deletes:
+            entry = entries.get(action.name)
+            if entry is None:
+                errors.append(f"Failed to remove {action.name}: no such entry")
+                continue
+            try:
+                remove_entry(entry)
+            except OSError as e:
+                errors.append(f"Failed to remove {action.name}: {e}")
+            else:
+                removed += 1
+    return removed, errors
+
+
+def _touch(to_dir: Path, touches: list[Action], failed: set[str]) -> list[str]:
+    """Bump trampoline mtimes, adding entries that fail to failed."""
+    errors: list[str] = []
+    with phase("touch"):
+        for action in touches:
+            if action.name in failed:
+                continue
+            try:
+                os.utime(to_dir / action.name)
+            except OSError as e:
+                failed.add(action.name)
+                errors.append(f"Failed to touch {action.name}: {e}")
+    return errors
+
+
+def apply(
+    plan: Plan,
+    *,
+    max_workers: int | None = None,
+    dockutil_path: str | None = None,
+) -> tuple[TrampolineSyncResult, DockSyncResult]:
+    """Carry out a plan returned by plan().
+
+    A failure for one entry is reported in the result's errors and skips
+    that entry's remaining actions without stopping the others.
+
+    Args:
+        plan: Plan to carry out
+        max_workers: Number of threads writing symlinks (serial if None)
+        dockutil_path: Path to dockutil binary (auto-detected if None)
+
+    Returns:
+        TrampolineSyncResult with the trampolines and per-action counts,
+        and the DockSyncResult of the planned Dock updates
+
+    """
+    by_kind: dict[ActionKind, list[Action]] = {
+        "delete": [],
+        "create": [],
+        "repoint": [],
+        "touch": [],
+        "dock": [],
+    }
+    for action in plan.actions:
+        by_kind[action.kind].append(action)
+
+    to_dir = plan.to_dir
+    to_dir.mkdir(parents=True, exist_ok=True)
+    failed: set[str] = set()
+    removed, errors = _prune(to_dir, by_kind["delete"])
+
+    links = by_kind["create"] + by_kind["repoint"]
+    # plan() sets target to the app's Contents on every create and repoint
+    apps = [App(cast("Path", action.target).parent) for action in links]
+    repoints = {action.name for action in by_kind["repoint"]}
+    task = partial(_link, to_dir=to_dir, repoints=repoints)
+    for app, outcome in run_each(task, apps, max_workers):
+        if isinstance(outcome, OSError):
+            failed.add(app.name)
+            errors.append(f"Failed to create trampoline for {app.name}: {outcome}")
+    count("symlinks_written", len(links) - len(failed))
+
+    errors.extend(_touch(to_dir, by_kind["touch"], failed))
+
+    created = sum(action.name not in failed for action in by_kind["create"])
+    repointed = sum(action.name not in failed for action in by_kind["repoint"])
+    trampolines = tuple(t for t in plan.trampolines if t.name not in failed)
+    result = TrampolineSyncResult(
+        trampolines=trampolines,
+        created=created,
+        repointed=repointed,
+        removed=removed,
+        unchanged=len(trampolines) - created - repointed,
+        errors=tuple(errors),
+    )
+
+    replacements = [(action.name, str(action.target)) for action in by_kind["dock"]]
+    return result, update_dock(replacements, dockutil_path)
@@ -0,0 +1,206 @@
+"""Opt-in profiling of a whole CLI run, for diagnosing slow syncs in place.
+
+Both hooks are switched on from the environment, so they work from an
+activation script without rebuilding the package:
+
+    NIX_SPOTLIGHT_PROFILE=/tmp/sync.pstats   cProfile dump of the run
+    NIX_SPOTLIGHT_TRACE=/tmp/sync.jsonl      every filesystem and subprocess
+                                             call made by the sync modules
+
+They share the interpreter's profile hook, so the cProfile dump wins when
+both are set.
+"""
+
+import sys
+import threading
+import time
+from collections.abc import Generator
+from contextlib import contextmanager
+from pathlib import Path
+from types import FrameType
+from typing import cast
+
+from .types import TracedCall
+
+# Environment variables naming the pstats dump and the call trace to write
+PROFILE_ENV = "NIX_SPOTLIGHT_PROFILE"
+TRACE_ENV = "NIX_SPOTLIGHT_TRACE"
+
+# Modules whose direct filesystem and subprocess calls are traced
+TRACED_MODULES = frozenset({"nix_spotlight.dock", "nix_spotlight.plan", "nix_spotlight.trampoline"})
+
+# Modules whose functions count as filesystem or subprocess calls; posix
+# holds the C functions behind os
+_CALLEE_MODULES = frozenset({"os", "posix", "pathlib", "shutil", "subprocess"})
+
+# pathlib classes whose methods touch the filesystem, across Python versions
+_PATH_CLASSES = frozenset({"Path", "PathBase"})
+
+
+@contextmanager
+def profile(path: Path) -> Generator[None]:
+    """Run the block under cProfile and write a pstats dump to path.
+
+    Args:
+        path: File the dump is written to, even if the block raises
+
+    """
+    import cProfile  # noqa: PLC0415 - only loaded when profiling
+
+    profiler = cProfile.Profile()
+    profiler.enable()
+    try:
+        yield
+    finally:
+        profiler.disable()
+        profiler.dump_stats(path)
+
+
+def _detail(frame: FrameType) -> str | None:
+    """Describe what a traced Python-level call operates on.
+
+    Returns the path of a pathlib method, the command of a subprocess
+    call, or the first argument of anything else.
+    """
+    local = cast("dict[str, object]", frame.f_locals)
+    value = local.get("self")
+    if value is None:
+        popenargs = local.get("popenargs")
+        if isinstance(popenargs, tuple) and popenargs:
+            value = cast("tuple[object, ...]", popenargs)[0]
+        elif frame.f_code.co_argcount:
+            value = local.get(frame.f_code.co_varnames[0])
+    if isinstance(value, list | tuple):
+        return " ".join(str(part) for part in cast("list[object]", value))
+    return None if value is None else str(value)
+
+
+def _callee(module: object, qualname: str) -> str | None:
+    """Name a public filesystem or subprocess function, or None for anything else."""
+    # pathlib is a package from Python 3.13, defining Path in pathlib._local
+    # and some of its methods on pathlib._abc.PathBase
+    package = module.partition(".")[0] if isinstance(module, str) else None
+    owner, _, method = qualname.rpartition(".")
+    if package not in _CALLEE_MODULES or method.startswith("_"):
+        return None
+    if package == "pathlib":
+        # PurePath methods only compute paths; Path holds the ones touching disk
+        if owner not in _PATH_CLASSES:
+            return None
+        return f"pathlib.Path.{method}"
+    return f"{'os' if package == 'posix' else package}.{qualname}"
+
+
+def _c_name(function: object) -> str | None:
+    """Name a C filesystem function such as os.stat, or None for anything else."""
+    module = cast("str | None", getattr(function, "__module__", None))
+    if module is None:
+        # Methods of C types, called bound or through their descriptor
+        owner = cast("type | None", getattr(function, "__objclass__", None))
+        module = (owner or type(cast("object", getattr(function, "__self__", None)))).__module__
+    return _callee(module, cast("str", getattr(function, "__qualname__", "")))
+
+
+def _caller(frame: FrameType) -> str:
+    """Render the module, function and line a call was made from."""
+    module = cast("str", frame.f_globals.get("__name__", "?"))
+    return f"{module}:{frame.f_code.co_qualname}:{frame.f_lineno}"
+
+
+class _Tracer:
+    """Profile hook timing the calls traced modules make into the OS."""
+
+    def __init__(self, modules: frozenset[str]) -> None:
+        """Trace direct calls made from modules."""
+        self.modules: frozenset[str] = modules
+        self.calls: list[TracedCall] = []
+        self._origin: float = time.perf_counter()
+        self._lock: threading.Lock = threading.Lock()
+        self._local: threading.local = threading.local()
+
+    def _pending(self) -> dict[object, tuple[float, str, str, str | None]]:
+        """Return this thread's calls that have not returned yet."""
+        pending = cast(
+            "dict[object, tuple[float, str, str, str | None]] | None",
+            getattr(self._local, "pending", None),
+        )
+        if pending is None:
+            pending = {}
+            self._local.pending = pending
+        return pending
+
+    def _traced(self, frame: FrameType | None) -> bool:
+        """Tell whether a frame belongs to a traced module."""
+        return frame is not None and frame.f_globals.get("__name__") in self.modules
+
+    def _finish(self, key: object) -> None:
+        """Record a call once it returned or raised."""
+        started = self._pending().pop(key, None)
+        if started is None:
+            return
+        start, caller, call, detail = started
+        traced = TracedCall(
+            caller=caller,
+            call=call,
+            start=start - self._origin,
+            seconds=time.perf_counter() - start,
+            thread=threading.current_thread().name,
+            detail=detail,
+        )
+        with self._lock:
+            self.calls.append(traced)
+
+    def dump(self, path: Path) -> None:
+        """Write the recorded calls to path as JSON lines."""
+        # Threads started while tracing may still be recording
+        with self._lock:
+            lines = [f"{call.to_json()}\n" for call in self.calls]
+        _ = path.write_text("".join(lines))
+
+    def __call__(self, frame: FrameType, event: str, arg: object) -> None:
+        """Handle a profile event."""
+        if event == "call":
+            call = _callee(frame.f_globals.get("__name__"), frame.f_code.co_qualname)
+            if call is not None and self._traced(frame.f_back):
+                caller = _caller(cast("FrameType", frame.f_back))
+                self._pending()[frame] = (time.perf_counter(), caller, call, _detail(frame))
+        elif event == "return":
+            self._finish(frame)
+        elif event == "c_call":
+            if self._traced(frame) and (call := _c_name(arg)) is not None:
+                self._pending()[frame, id(arg)] = (time.perf_counter(), _caller(frame), call, None)
+        else:
+            # c_return or c_exception, the only events left for a profile hook
+            self._finish((frame, id(arg)))
+
+
+@contextmanager
+def trace_calls(
+    path: Path, modules: frozenset[str] = TRACED_MODULES
+) -> Generator[list[TracedCall]]:
+    """Record the filesystem and subprocess calls made from modules.
+
+    Every direct call into os, pathlib, shutil or subprocess made by code
+    in modules, on this thread or threads started inside the block, is
+    timed. The calls are written to path as JSON lines when the block
+    exits, even if it raises.
+
+    Args:
+        path: File the trace is written to
+        modules: Names of the modules whose calls are recorded
+
+    Yields:
+        The list of TracedCall records, filled in as calls return
+
+    """
+    tracer = _Tracer(modules)
+    previous = sys.getprofile()
+    previous_threads = threading.getprofile()
+    threading.setprofile(tracer)
+    sys.setprofile(tracer)
+    try:
+        yield tracer.calls
+    finally:
+        sys.setprofile(previous)
+        threading.setprofile(previous_threads)
+        tracer.dump(path)
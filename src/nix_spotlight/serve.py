@@ -0,0 +1,195 @@
+"""Resident sync server and its Unix-socket client.
+
+`nix-spotlight serve` keeps one interpreter with the package imported
+and answers sync requests on a Unix socket, so an activation pays for a
+connection and a manifest check instead of starting Python. A lone
+request is answered at once; requests queued together are answered
+together, and identical ones are run only once.
+"""
+
+import json
+import os
+import socket
+from collections.abc import Callable
+from pathlib import Path
+from typing import cast
+
+from .deadline import remaining
+from .types import SyncReply
+
+# Seconds to keep accepting requests once a batch holds more than one
+DEFAULT_WINDOW = 0.05
+
+# Seconds a client may take to send its request once connected
+_READ_TIMEOUT = 5.0
+
+# Seconds a client waits for the reply when no sync deadline is active
+DEFAULT_REPLY_TIMEOUT = 120.0
+
+# Runs the sync arguments of a request from the given working directory
+Handler = Callable[[list[str], str], SyncReply]
+
+_Request = tuple[socket.socket, list[str], str]
+
+
+def default_socket_path() -> Path:
+    """Return the server socket location, honouring XDG_RUNTIME_DIR."""
+    base = os.environ.get("XDG_RUNTIME_DIR") or Path("~/.cache").expanduser()
+    return Path(base) / "nix-spotlight" / "serve.sock"
+
+
+def _read_request(conn: socket.socket) -> tuple[list[str], str] | None:
+    """Read the sync arguments and working directory a client sent."""
+    conn.settimeout(_READ_TIMEOUT)
+    try:
+        with conn.makefile("rb") as f:
+            data = cast("object", json.loads(f.readline()))
+    except (OSError, ValueError):
+        return None
+    if not isinstance(data, dict):
+        return None
+
+    fields = cast("dict[str, object]", data)
+    argv = fields.get("argv")
+    cwd = fields.get("cwd")
+    if not isinstance(argv, list) or not isinstance(cwd, str):
+        return None
+    args = cast("list[object]", argv)
+    if not all(isinstance(arg, str) for arg in args):
+        return None
+    return cast("list[str]", args), cwd
+
+
+def _send(conn: socket.socket, reply: SyncReply) -> None:
+    """Send a reply and close the connection, ignoring clients that left."""
+    data = {"code": reply.code, "out": reply.out, "err": reply.err}
+    try:
+        conn.sendall(json.dumps(data).encode() + b"\n")
+    except OSError:
+        pass
+    finally:
+        conn.close()
+
+
+def _batch_timeout(taken: int, window: float) -> float | None:
+    """Return how long to wait for the next request of a batch.
+
+    The first request is waited for indefinitely. Requests already queued
+    behind it are taken without waiting, so a lone request is answered at
+    once. Only a batch that gathered a second request stays open for
+    window more seconds.
+    """
+    if not taken:
+        return None
+    return window if taken > 1 else 0.0
+
+
+def _accept_batch(server: socket.socket, window: float) -> list[_Request]:
+    """Wait for a valid request, then take the others arriving with it."""
+    requests: list[_Request] = []
+    while True:
+        server.settimeout(_batch_timeout(len(requests), window))
+        try:
+            conn = server.accept()[0]
+        except (BlockingIOError, TimeoutError):
+            return requests
+        request = _read_request(conn)
+        if request is None:
+            _send(conn, SyncReply(2, err="error: malformed sync request\n"))
+        else:
+            requests.append((conn, *request))
+
+
+def _answer(requests: list[_Request], handler: Handler) -> int:
+    """Run each distinct request once and reply to every client that sent it.
+
+    Returns:
+        Number of syncs run
+
+    """
+    groups: dict[tuple[str, ...], list[socket.socket]] = {}
+    for conn, argv, cwd in requests:
+        groups.setdefault((cwd, *argv), []).append(conn)
+
+    for (cwd, *argv), conns in groups.items():
+        reply = handler(argv, cwd)
+        for conn in conns:
+            _send(conn, reply)
+    return len(groups)
+
+
+def serve(
+    socket_path: Path,
+    handler: Handler,
+    *,
+    window: float = DEFAULT_WINDOW,
+    max_batches: int | None = None,
+) -> None:
+    """Answer sync requests on a Unix socket until interrupted.
+
+    The socket is only accessible to the user running the server and is
+    removed again when the server stops.
+
+    Args:
+        socket_path: Path to create the socket at, replacing a stale one
+        handler: Runs a request's sync arguments and returns the reply
+        window: Seconds to wait for more requests once a batch holds two
+        max_batches: Stop after this many batches (run forever if None)
+
+    """
+    socket_path.parent.mkdir(parents=True, exist_ok=True)
+    socket_path.unlink(missing_ok=True)
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as server:
+        server.bind(str(socket_path))
+        socket_path.chmod(0o600)
+        server.listen()
+        batches = 0
+        try:
+            while max_batches is None or batches < max_batches:
+                _ = _answer(_accept_batch(server, window), handler)
+                batches += 1
+        finally:
+            socket_path.unlink(missing_ok=True)
+
+
+def request_sync(socket_path: Path, argv: list[str], cwd: str) -> SyncReply | None:
+    """Ask a running server to sync, waiting for its reply.
+
+    The wait is bounded by what is left of the active deadline, or by
+    DEFAULT_REPLY_TIMEOUT without one, so a wedged server cannot hang
+    the caller.
+
+    Args:
+        socket_path: Socket of a nix-spotlight serve process
+        argv: Arguments of the sync subcommand
+        cwd: Directory relative paths in argv are resolved against
+
+    Returns:
+        The server's SyncReply, or None if no server answered in time
+
+    """
+    timeout = remaining()
+    if timeout is None:
+        timeout = DEFAULT_REPLY_TIMEOUT
+    elif timeout <= 0:
+        return None
+    request = json.dumps({"argv": argv, "cwd": cwd}).encode() + b"\n"
+    try:
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as client:
+            client.settimeout(timeout)
+            client.connect(str(socket_path))
+            client.sendall(request)
+            with client.makefile("rb") as f:
+                data = cast("object", json.loads(f.readline()))
+    except (OSError, ValueError):
+        return None
+    if not isinstance(data, dict):
+        return None
+
+    fields = cast("dict[str, object]", data)
+    code = fields.get("code")
+    out = fields.get("out")
+    err = fields.get("err")
+    if not isinstance(code, int) or not isinstance(out, str) or not isinstance(err, str):
+        return None
+    return SyncReply(code=code, out=out, err=err)
@@ -0,0 +1,105 @@
+"""Per-phase timing and counters for sync operations.
+
+Instrumented code calls phase() and count(), which do nothing unless a
+collector is active. Library callers activate one with collect():
+
+    with collect() as timings:
+        sync_trampolines(from_dir, to_dir)
+    print(timings.format())
+"""
+
+import json
+import threading
+import time
+from collections.abc import Generator, Iterable, Iterator
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+
+
+@dataclass(slots=True)
+class Timings:
+    """Accumulated wall time per phase and counters."""
+
+    phases: dict[str, float] = field(default_factory=dict)
+    counters: dict[str, int] = field(default_factory=dict)
+
+    def to_json(self) -> str:
+        """Serialize timings as a single JSON line."""
+        return json.dumps({"phases": self.phases, "counters": self.counters}, sort_keys=True)
+
+    def format(self) -> str:
+        """Render timings as aligned human-readable lines."""
+        width = max(map(len, [*self.phases, *self.counters]), default=0)
+        lines = [
+            f"{name:<{width}}  {seconds * 1000:9.2f} ms" for name, seconds in self.phases.items()
+        ]
+        lines.extend(f"{name:<{width}}  {value:9d}" for name, value in self.counters.items())
+        return "\n".join(lines)
+
+
+# Pairs synced concurrently share one collector
+_lock = threading.Lock()
+_current: ContextVar[Timings | None] = ContextVar("nix_spotlight_timings", default=None)
+
+
+@contextmanager
+def collect() -> Generator[Timings]:
+    """Collect timings from instrumented code run inside the block.
+
+    Yields:
+        The Timings being filled in
+
+    """
+    timings = Timings()
+    token = _current.set(timings)
+    try:
+        yield timings
+    finally:
+        _current.reset(token)
+
+
+@contextmanager
+def phase(name: str) -> Generator[None]:
+    """Add the wall time spent in the block to the named phase."""
+    timings = _current.get()
+    if timings is None:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - start
+        with _lock:
+            timings.phases[name] = timings.phases.get(name, 0.0) + elapsed
+
+
+def timed[T](name: str, items: Iterable[T]) -> Iterator[T]:
+    """Yield from items, adding the time spent producing each to the named phase.
+
+    Lets a stream consumed inside another phase, like discovery feeding
+    trampoline writes, still report its own time.
+    """
+    if _current.get() is None:
+        return iter(items)
+    return _timed(name, iter(items))
+
+
+def _timed[T](name: str, items: Iterator[T]) -> Iterator[T]:
+    """Time every next() of items under the named phase."""
+    while True:
+        with phase(name):
+            try:
+                item = next(items)
+            except StopIteration:
+                return
+        yield item
+
+
+def count(name: str, n: int = 1) -> None:
+    """Add n to the named counter."""
+    timings = _current.get()
+    if timings is not None:
+        with _lock:
+            timings.counters[name] = timings.counters.get(name, 0) + n
@@ -1,13 +1,42 @@
 """Trampoline creation using symlink-based approach."""
 
+import os
 import shutil
-from itertools import chain
+from collections.abc import Callable, Collection, Iterable, Iterator
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
 from pathlib import Path
+from typing import Literal
 
-from .types import App
+from .manifest import DEFAULT_MAX_DEPTH, MANIFEST_NAME
+from .timings import count, phase, timed
+from .types import App, SyncEvent, TrampolineSyncResult
 
-# Glob patterns for finding .app bundles (direct and one level nested)
-_APP_PATTERNS = ("*.app", "*/*.app")
+# Syscall budget per directory entry during discovery. readdir reports each
+# entry's name, type and inode, so plain files and directories cost nothing; a
+# symlink costs one stat to learn its type and identity and an .app bundle
+# costs one stat to check for Contents/Info.plist. Directory reads and the
+# single stat of from_dir are amortised over entries.
+SCAN_SYSCALLS_PER_ENTRY = 2
+
+# What happened to a single trampoline during a sync
+_Outcome = Literal["created", "repointed", "unchanged"]
+
+# Receives a SyncEvent as each app or stale entry is handled
+EventCallback = Callable[[SyncEvent], None]
+
+# Sibling directory names used by the staged swap, formatted with to_dir.name
+_STAGING_NAME = ".{}.staging"
+_PREVIOUS_NAME = ".{}.previous"
+
+
+def _is_own_entry(name: str) -> bool:
+    """Check whether an entry is a staged or previous generation of ours.
+
+    They hold trampolines, so discovery would report them as apps if a
+    target directory lived inside a source directory.
+    """
+    return name.startswith(".") and name.endswith((".staging", ".previous"))
 
 
 def create_trampoline(source: App, target_dir: Path) -> Path:
@@ -33,46 +62,450 @@ def create_trampoline(source: App, target_dir: Path) -> Path:
     return trampoline
 
 
-def gather_apps(from_dir: Path) -> list[App]:
+def _dir_key(entry: os.DirEntry[str], dev: int) -> tuple[int, int]:
+    """Identify the directory an entry resolves to by (device, inode).
+
+    A real directory shares its parent's device (mount points aside) and
+    its inode comes from readdir. A symlink's target needs a stat, which
+    is already cached from is_dir().
+    """
+    if entry.is_symlink():
+        st = entry.stat()
+        return st.st_dev, st.st_ino
+    return dev, entry.inode()
+
+
+def _scan_apps(
+    path: str,
+    depth: int,
+    dev: int,
+    visited: set[tuple[int, int]],
+) -> Iterator[App]:
+    """Yield valid .app bundles below path in name order.
+
+    Hidden entries are included, like the glob discovery did, except for
+    the staged and previous generations kept by swap_trampolines. .app
+    bundles are never descended into and symlinked directories are
+    followed. Every directory is entered at most
+    once, so symlink cycles and shared subtrees are read a single time.
+    The directory handle is closed before recursing so at most one is open.
+    """
+    with os.scandir(path) as it:
+        entries = sorted(it, key=lambda entry: entry.name)
+
+    for entry in entries:
+        if _is_own_entry(entry.name) or not entry.is_dir():
+            continue
+        if entry.name.endswith(".app"):
+            count("apps_scanned")
+            if (app := App(Path(entry.path))).is_valid:
+                yield app
+            else:
+                count("invalid_skipped")
+        elif depth > 0:
+            key = _dir_key(entry, dev)
+            if key in visited:
+                count("cycles_skipped")
+                continue
+            visited.add(key)
+            yield from _scan_apps(entry.path, depth - 1, key[0], visited)
+
+
+def iter_apps(from_dir: Path, *, max_depth: int = DEFAULT_MAX_DEPTH) -> Iterator[App]:
+    """Yield valid .app bundles below a directory as they are found.
+
+    Args:
+        from_dir: Directory to search
+        max_depth: Directory levels below from_dir to search
+
+    Yields:
+        Valid App instances, in name order within each directory
+
+    """
+    st = from_dir.stat()
+    return _scan_apps(str(from_dir), max_depth, st.st_dev, {(st.st_dev, st.st_ino)})
+
+
+def gather_apps(from_dir: Path, *, max_depth: int = DEFAULT_MAX_DEPTH) -> list[App]:
     """Gather all valid .app bundles from a directory.
 
-    Searches one level deep (for nested apps like KDE/).
+    Searches max_depth levels deep (one by default, for nested apps like
+    KDE/) in a single pass over os.scandir, staying within
+    SCAN_SYSCALLS_PER_ENTRY.
 
     Args:
         from_dir: Directory to search
+        max_depth: Directory levels below from_dir to search
 
     Returns:
         List of valid App instances
 
     """
-    paths = chain.from_iterable(from_dir.glob(p) for p in _APP_PATTERNS)
-    return [app for path in paths if (app := App(path)).is_valid]
+    with phase("discover"):
+        return list(iter_apps(from_dir, max_depth=max_depth))
+
+
+def _materialize(app: App, to_dir: Path) -> _Outcome:
+    """Create and touch a trampoline so Spotlight picks it up."""
+    create_trampoline(app, to_dir).touch()
+    return "created"
+
+
+def _is_current(app: App, trampoline: Path) -> bool:
+    """Check whether a trampoline's Contents symlink already points at app."""
+    try:
+        return (trampoline / "Contents").readlink() == app.contents
+    except OSError:
+        return False
+
+
+def pending_change(app: App, to_dir: Path, existing: Collection[str]) -> _Outcome:
+    """Tell what an incremental sync would do to the trampoline of app.
+
+    Shared by reconcile_trampolines and plan.plan, so a dry run reports
+    exactly what a sync does.
+
+    Args:
+        app: App to sync
+        to_dir: Target directory for trampolines
+        existing: Names of the entries in to_dir before the sync
+
+    Returns:
+        "created" if there is no trampoline yet, "repointed" if it points
+        elsewhere and "unchanged" if it already points at app
+
+    """
+    if app.name not in existing:
+        return "created"
+    if _is_current(app, to_dir / app.name):
+        return "unchanged"
+    return "repointed"
+
+
+def unique_apps(apps: Iterable[App], seen: set[str]) -> Iterator[App]:
+    """Yield the apps whose name is not in seen yet, adding it as they go.
+
+    If several apps share a name the first one found wins; the names left
+    out of seen afterwards are the stale entries of the target.
+    """
+    for app in apps:
+        if app.name not in seen:
+            seen.add(app.name)
+            yield app
+
+
+def target_entries(to_dir: Path) -> dict[str, os.DirEntry[str]]:
+    """List the entries of a trampolines directory other than the sync manifest.
+
+    Returns an empty listing if to_dir does not exist yet.
+    """
+    try:
+        with os.scandir(to_dir) as it:
+            return {entry.name: entry for entry in it if entry.name != MANIFEST_NAME}
+    except FileNotFoundError:
+        return {}
+
+
+def _reconcile(app: App, to_dir: Path, existing: Collection[str]) -> _Outcome:
+    """Create or repoint a trampoline unless it already points at app."""
+    outcome = pending_change(app, to_dir, existing)
+    if outcome != "unchanged":
+        _ = _materialize(app, to_dir)
+    return outcome
+
+
+def run_each(
+    task: Callable[[App], _Outcome],
+    apps: Iterable[App],
+    max_workers: int | None,
+    on_event: EventCallback | None = None,
+) -> list[tuple[App, _Outcome | OSError]]:
+    """Run task for every app, optionally on a bounded thread pool.
+
+    apps is consumed as a stream, so serial runs handle each app as soon
+    as discovery yields it. Results keep the order of apps regardless of
+    completion order, and an OSError for one app is returned in place of
+    its outcome instead of aborting the remaining apps. on_event is called
+    from the calling thread as each result arrives.
+    """
 
+    def run(app: App) -> tuple[App, _Outcome | OSError]:
+        try:
+            return app, task(app)
+        except OSError as e:
+            return app, e
+
+    def report(
+        results: Iterable[tuple[App, _Outcome | OSError]],
+    ) -> list[tuple[App, _Outcome | OSError]]:
+        outcomes: list[tuple[App, _Outcome | OSError]] = []
+        for app, outcome in results:
+            if on_event is not None:
+                on_event(_event(app, outcome))
+            outcomes.append((app, outcome))
+        return outcomes
+
+    with phase("trampolines"):
+        if max_workers is None or max_workers <= 1:
+            return report(map(run, apps))
+        with ThreadPoolExecutor(max_workers=max_workers) as pool:
+            return report(pool.map(run, apps))
+
+
+def _event(app: App, outcome: _Outcome | OSError) -> SyncEvent:
+    """Describe the result of syncing one app."""
+    if isinstance(outcome, OSError):
+        return SyncEvent("failed", app.name, str(outcome))
+    return SyncEvent(outcome, app.name)
+
+
+def _collect(
+    to_dir: Path,
+    outcomes: list[tuple[App, _Outcome | OSError]],
+    removed: int = 0,
+    errors: Iterable[str] = (),
+) -> TrampolineSyncResult:
+    """Tally per-app outcomes into a TrampolineSyncResult."""
+    trampolines: list[Path] = []
+    counts: dict[_Outcome, int] = {"created": 0, "repointed": 0, "unchanged": 0}
+    failures = list(errors)
 
-def sync_trampolines(from_dir: Path, to_dir: Path) -> list[Path]:
+    for app, outcome in outcomes:
+        if isinstance(outcome, OSError):
+            failures.append(f"Failed to create trampoline for {app.name}: {outcome}")
+            continue
+        counts[outcome] += 1
+        trampolines.append(to_dir / app.name)
+
+    count("symlinks_written", counts["created"] + counts["repointed"])
+    return TrampolineSyncResult(
+        trampolines=tuple(trampolines),
+        created=counts["created"],
+        repointed=counts["repointed"],
+        removed=removed,
+        unchanged=counts["unchanged"],
+        errors=tuple(failures),
+    )
+
+
+def rebuild_trampolines(  # noqa: PLR0913
+    from_dir: Path,
+    to_dir: Path,
+    *,
+    max_workers: int | None = None,
+    max_depth: int = DEFAULT_MAX_DEPTH,
+    on_event: EventCallback | None = None,
+    apps: Iterable[App] | None = None,
+) -> TrampolineSyncResult:
+    """Rebuild the trampolines directory from scratch.
+
+    Removes the existing trampolines directory and recreates it fresh.
+    A failure for one app is reported in the result's errors and does
+    not stop the remaining apps from being synced.
+
+    Args:
+        from_dir: Source directory containing .app bundles
+        to_dir: Target directory for trampolines
+        max_workers: Number of threads creating trampolines (serial if None)
+        max_depth: Directory levels below from_dir to search
+        on_event: Called with a SyncEvent as each app is handled
+        apps: Apps to sync instead of discovering them in from_dir
+
+    Returns:
+        TrampolineSyncResult with the trampolines, all counted as created
+
+    """
+    with phase("clean"):
+        shutil.rmtree(to_dir, ignore_errors=True)
+        to_dir.mkdir(parents=True)
+
+    task = partial(_materialize, to_dir=to_dir)
+    if apps is None:
+        apps = gather_apps(from_dir, max_depth=max_depth)
+    return _collect(to_dir, run_each(task, apps, max_workers, on_event))
+
+
+def sync_trampolines(
+    from_dir: Path,
+    to_dir: Path,
+    *,
+    max_workers: int | None = None,
+    max_depth: int = DEFAULT_MAX_DEPTH,
+    on_event: EventCallback | None = None,
+) -> list[Path]:
     """Sync all .app bundles from source to trampolines directory.
 
-    Removes existing trampolines directory and recreates it fresh.
+    Apps are streamed from iter_apps, so each trampoline is created as
+    soon as its app is found. Only new and repointed trampolines are
+    written and touched, so unchanged ones keep their mtimes and Spotlight
+    does not reindex them. Apps whose trampoline could not be created are
+    left out; use reconcile_trampolines or on_event to get the per-app
+    errors.
 
     Args:
         from_dir: Source directory containing .app bundles
         to_dir: Target directory for trampolines
+        max_workers: Number of threads creating trampolines (serial if None)
+        max_depth: Directory levels below from_dir to search
+        on_event: Called with a SyncEvent as each app or stale entry is handled
 
     Returns:
         List of created trampoline paths
 
     """
-    shutil.rmtree(to_dir, ignore_errors=True)
-    to_dir.mkdir(parents=True)
+    return list(
+        reconcile_trampolines(
+            from_dir, to_dir, max_workers=max_workers, max_depth=max_depth, on_event=on_event
+        ).trampolines
+    )
 
-    apps = gather_apps(from_dir)
-    trampolines: list[Path] = []
 
-    for app in apps:
-        trampoline = create_trampoline(app, to_dir)
-        trampolines.append(trampoline)
+def remove_entry(entry: os.DirEntry[str]) -> None:
+    """Remove a stale entry from the trampolines directory."""
+    if entry.is_dir(follow_symlinks=False):
+        shutil.rmtree(entry.path)
+    else:
+        Path(entry.path).unlink()
+
+
+def reconcile_trampolines(  # noqa: PLR0913
+    from_dir: Path,
+    to_dir: Path,
+    *,
+    max_workers: int | None = None,
+    max_depth: int = DEFAULT_MAX_DEPTH,
+    on_event: EventCallback | None = None,
+    apps: Iterable[App] | None = None,
+) -> TrampolineSyncResult:
+    """Incrementally sync trampolines against those already in to_dir.
+
+    Creates trampolines for new apps as discovery finds them, repoints
+    Contents symlinks whose target changed and finally removes stale
+    entries. Unchanged trampolines and the sync manifest are left alone,
+    so a sync where nothing changed performs no writes. If two apps share
+    a name, the first one found wins.
+
+    Args:
+        from_dir: Source directory containing .app bundles
+        to_dir: Target directory for trampolines
+        max_workers: Number of threads updating trampolines (serial if None)
+        max_depth: Directory levels below from_dir to search
+        on_event: Called with a SyncEvent as each app or stale entry is handled
+        apps: Apps to sync instead of discovering them in from_dir
+
+    Returns:
+        TrampolineSyncResult with the trampolines and per-action counts
+
+    """
+    to_dir.mkdir(parents=True, exist_ok=True)
+    existing = target_entries(to_dir)
+    seen: set[str] = set()
+
+    task = partial(_reconcile, to_dir=to_dir, existing=set(existing))
+    if apps is None:
+        # Discovery runs inside the trampolines phase as it is consumed
+        apps = timed("discover", iter_apps(from_dir, max_depth=max_depth))
+    outcomes = run_each(task, unique_apps(apps, seen), max_workers, on_event)
+
+    removed = 0
+    errors: list[str] = []
+    with phase("prune"):
+        for name, entry in existing.items():
+            if name in seen:
+                continue
+            try:
+                remove_entry(entry)
+            except OSError as e:
+                errors.append(f"Failed to remove {name}: {e}")
+                event = SyncEvent("failed", name, str(e))
+            else:
+                removed += 1
+                event = SyncEvent("removed", name)
+            if on_event is not None:
+                on_event(event)
 
-    for trampoline in trampolines:
-        trampoline.touch()
+    return _collect(to_dir, outcomes, removed=removed, errors=errors)
+
+
+def _staging_dir(to_dir: Path) -> Path:
+    """Sibling directory a new generation is built in."""
+    return to_dir.with_name(_STAGING_NAME.format(to_dir.name))
+
+
+def _previous_dir(to_dir: Path) -> Path:
+    """Sibling directory the previous generation is kept in."""
+    return to_dir.with_name(_PREVIOUS_NAME.format(to_dir.name))
+
+
+def swap_trampolines(  # noqa: PLR0913
+    from_dir: Path,
+    to_dir: Path,
+    *,
+    max_workers: int | None = None,
+    max_depth: int = DEFAULT_MAX_DEPTH,
+    on_event: EventCallback | None = None,
+    apps: Iterable[App] | None = None,
+) -> TrampolineSyncResult:
+    """Build trampolines in a staging directory and swap it into place.
+
+    The new generation is built next to to_dir and then renamed over it,
+    so to_dir is only missing between two renames regardless of how many
+    apps there are. The replaced generation is kept for rollback_trampolines.
+
+    Args:
+        from_dir: Source directory containing .app bundles
+        to_dir: Target directory for trampolines
+        max_workers: Number of threads creating trampolines (serial if None)
+        max_depth: Directory levels below from_dir to search
+        on_event: Called with a SyncEvent as each app is handled
+        apps: Apps to sync instead of discovering them in from_dir
+
+    Returns:
+        TrampolineSyncResult with the trampolines, all counted as created
+
+    """
+    staging = _staging_dir(to_dir)
+    previous = _previous_dir(to_dir)
+
+    shutil.rmtree(staging, ignore_errors=True)
+    staging.mkdir(parents=True)
+
+    task = partial(_materialize, to_dir=staging)
+    if apps is None:
+        apps = gather_apps(from_dir, max_depth=max_depth)
+    outcomes = run_each(task, apps, max_workers, on_event)
+
+    with phase("swap"):
+        shutil.rmtree(previous, ignore_errors=True)
+        if to_dir.exists():
+            _ = to_dir.rename(previous)
+        _ = staging.rename(to_dir)
+
+    return _collect(to_dir, outcomes)
+
+
+def rollback_trampolines(to_dir: Path) -> bool:
+    """Swap the generation replaced by swap_trampolines back into place.
+
+    The current generation becomes the previous one, so rolling back
+    twice restores the original state.
+
+    Args:
+        to_dir: Target directory for trampolines
+
+    Returns:
+        True if a previous generation was restored, False if none exists
+
+    """
+    previous = _previous_dir(to_dir)
+    if not previous.is_dir():
+        return False
 
-    return trampolines
+    staging = _staging_dir(to_dir)
+    shutil.rmtree(staging, ignore_errors=True)
+    if to_dir.exists():
+        _ = to_dir.rename(staging)
+    _ = previous.rename(to_dir)
+    if staging.exists():
+        _ = staging.rename(previous)
+    return True
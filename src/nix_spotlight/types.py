@@ -1,7 +1,15 @@
 """Type definitions for nix-spotlight."""
 
+import json
 from dataclasses import dataclass, field
 from pathlib import Path
+from typing import Literal
+
+# What happened to one app or stale entry during a trampoline sync
+EventKind = Literal["created", "repointed", "unchanged", "removed", "failed"]
+
+# Kinds of change a sync plan is made of
+ActionKind = Literal["create", "repoint", "delete", "touch", "dock"]
 
 
 @dataclass(frozen=True, slots=True)
@@ -37,4 +45,130 @@ class DockSyncResult:
 
     updated: int = 0
     skipped: int = 0
+    removed: int = 0
+    spawned: int = 0
+    restarts: int = 0
     errors: tuple[str, ...] = field(default_factory=tuple)
+    timed_out: bool = False
+    # Items were changed but the deadline ran out before the Dock restarted
+    restart_pending: bool = False
+
+
+@dataclass(frozen=True, slots=True)
+class TrampolineSyncResult:
+    """Result of a trampoline sync operation."""
+
+    trampolines: tuple[Path, ...] = field(default_factory=tuple)
+    created: int = 0
+    repointed: int = 0
+    removed: int = 0
+    unchanged: int = 0
+    errors: tuple[str, ...] = field(default_factory=tuple)
+
+
+@dataclass(frozen=True, slots=True)
+class SyncEvent:
+    """Progress of a trampoline sync, reported once per app or stale entry."""
+
+    kind: EventKind
+    name: str
+    error: str | None = None
+
+
+@dataclass(frozen=True, slots=True)
+class Manifest:
+    """Record of the inputs and results of the last sync of a target."""
+
+    digest: str
+    apps: dict[str, str] = field(default_factory=dict)
+    dock_synced: bool = False
+
+
+@dataclass(frozen=True, slots=True)
+class Catalog:
+    """Apps of a source directory, as listed by a build-time app manifest."""
+
+    digest: str
+    apps: tuple[App, ...] = field(default_factory=tuple)
+
+
+@dataclass(frozen=True, slots=True)
+class AppMetadata:
+    """Bundle metadata parsed from an app's Info.plist."""
+
+    bundle_identifier: str | None = None
+    bundle_name: str | None = None
+    version: str | None = None
+    url_schemes: tuple[str, ...] = field(default_factory=tuple)
+
+
+@dataclass(frozen=True, slots=True)
+class Action:
+    """A single change planned for a trampolines directory or the Dock.
+
+    name is the entry in the trampolines directory, or the Dock item label
+    for dock actions. target is the Contents directory a created or
+    repointed trampoline links to, or the trampoline a Dock item is
+    pointed at.
+    """
+
+    kind: ActionKind
+    name: str
+    target: Path | None = None
+
+    def describe(self) -> str:
+        """Render the action as a single line, as printed by sync --dry-run."""
+        if self.target is None:
+            return f"{self.kind} {self.name}"
+        return f"{self.kind} {self.name} -> {self.target}"
+
+
+@dataclass(frozen=True, slots=True)
+class Plan:
+    """Changes that would bring a trampolines directory up to date."""
+
+    from_dir: Path
+    to_dir: Path
+    actions: tuple[Action, ...] = field(default_factory=tuple)
+    trampolines: tuple[Path, ...] = field(default_factory=tuple)
+
+
+@dataclass(frozen=True, slots=True)
+class SyncReply:
+    """Outcome of a sync run by a nix-spotlight serve process."""
+
+    code: int
+    out: str = ""
+    err: str = ""
+
+
+@dataclass(frozen=True, slots=True)
+class TracedCall:
+    """A filesystem or subprocess call recorded by NIX_SPOTLIGHT_TRACE.
+
+    caller is module:function:line of the call site, call the function
+    called (e.g. 'os.symlink') and detail the path or command it was
+    given, where the tracer can see it. start is seconds since tracing
+    began.
+    """
+
+    caller: str
+    call: str
+    start: float
+    seconds: float
+    thread: str
+    detail: str | None = None
+
+    def to_json(self) -> str:
+        """Serialize the call as a single JSON line."""
+        return json.dumps(
+            {
+                "caller": self.caller,
+                "call": self.call,
+                "start": self.start,
+                "seconds": self.seconds,
+                "thread": self.thread,
+                "detail": self.detail,
+            },
+            sort_keys=True,
+        )
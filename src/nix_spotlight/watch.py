@@ -0,0 +1,289 @@
+"""Watch a source directory and update trampolines incrementally."""
+
+import os
+import select
+import shutil
+import sys
+import time
+from collections.abc import Callable
+from pathlib import Path
+from typing import Protocol
+
+from .lock import target_lock
+from .manifest import source_digest, write_manifest
+from .trampoline import create_trampoline, iter_apps, reconcile_trampolines, unique_apps
+from .types import App, TrampolineSyncResult
+
+# Seconds of quiet after an event before a batch is synced
+DEFAULT_DEBOUNCE = 0.5
+
+# Seconds between checks of the polling watcher
+DEFAULT_INTERVAL = 1.0
+
+# An app together with the (device, inode) of the bundle it resolves to
+Snapshot = dict[str, tuple[App, tuple[int, int]]]
+
+
+class Watcher(Protocol):
+    """Source of change notifications for a directory."""
+
+    def wait(self, timeout: float | None) -> bool:
+        """Block until a change or timeout; return whether a change was seen."""
+        ...
+
+    def close(self) -> None:
+        """Release any resources held by the watcher."""
+        ...
+
+
+class PollingWatcher:
+    """Portable watcher comparing a cheap directory signature at an interval.
+
+    The signature costs one stat and one directory read for from_dir plus
+    one stat per nested (non-.app) directory, whose mtime changes whenever
+    an app is added to or removed from it.
+    """
+
+    def __init__(self, from_dir: Path, interval: float = DEFAULT_INTERVAL) -> None:
+        """Start watching from_dir."""
+        self.from_dir: Path = from_dir
+        self.interval: float = interval
+        self._signature: tuple[str, ...] = self._read_signature()
+
+    def _read_signature(self) -> tuple[str, ...]:
+        """Summarize the top-level listing and nested directory mtimes."""
+        try:
+            with os.scandir(self.from_dir) as it:
+                entries = sorted(it, key=lambda entry: entry.name)
+            nested = tuple(
+                f"{entry.name}\0{entry.stat().st_mtime_ns}"
+                for entry in entries
+                if entry.is_dir() and not entry.name.endswith(".app")
+            )
+            return (source_digest(self.from_dir), *nested)
+        except OSError:
+            return ()
+
+    def wait(self, timeout: float | None) -> bool:
+        """Poll until the signature changes or timeout elapses."""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            signature = self._read_signature()
+            if signature != self._signature:
+                self._signature = signature
+                return True
+            if deadline is not None and time.monotonic() >= deadline:
+                return False
+            remaining = self.interval if deadline is None else deadline - time.monotonic()
+            time.sleep(max(0.0, min(self.interval, remaining)))
+
+    def close(self) -> None:
+        """Nothing to release for polling."""
+
+
+class KqueueWatcher:  # pragma: no cover - requires kqueue (macOS/BSD)
+    """Event-driven watcher using kqueue vnode notifications.
+
+    Watches from_dir and each nested (non-.app) directory for writes,
+    renames and deletions, re-registering after every change so new
+    nested directories are picked up.
+    """
+
+    _FLAGS: int = (
+        getattr(select, "KQ_NOTE_WRITE", 0)
+        | getattr(select, "KQ_NOTE_DELETE", 0)
+        | getattr(select, "KQ_NOTE_RENAME", 0)
+        | getattr(select, "KQ_NOTE_EXTEND", 0)
+    )
+
+    def __init__(self, from_dir: Path) -> None:
+        """Start watching from_dir."""
+        self.from_dir: Path = from_dir
+        self._kq: select.kqueue = select.kqueue()
+        self._fds: list[int] = []
+        self._register()
+
+    def _register(self) -> None:
+        """(Re)open and register from_dir and its nested directories."""
+        self._release_fds()
+        dirs = [self.from_dir]
+        with os.scandir(self.from_dir) as entries:
+            dirs.extend(Path(e.path) for e in entries if e.is_dir() and not e.name.endswith(".app"))
+        for path in dirs:
+            try:
+                fd = os.open(path, os.O_RDONLY | getattr(os, "O_EVTONLY", 0))
+            except OSError:
+                continue
+            self._fds.append(fd)
+        events = [
+            select.kevent(
+                fd,
+                filter=select.KQ_FILTER_VNODE,
+                flags=select.KQ_EV_ADD | select.KQ_EV_CLEAR,
+                fflags=self._FLAGS,
+            )
+            for fd in self._fds
+        ]
+        _ = self._kq.control(events, 0, 0)
+
+    def _release_fds(self) -> None:
+        """Close the watched directory descriptors."""
+        for fd in self._fds:
+            os.close(fd)
+        self._fds = []
+
+    def wait(self, timeout: float | None) -> bool:
+        """Block until a vnode event arrives or timeout elapses."""
+        events = self._kq.control(None, 16, timeout)
+        if events:
+            self._register()
+        return bool(events)
+
+    def close(self) -> None:
+        """Close the kqueue and watched descriptors."""
+        self._release_fds()
+        self._kq.close()
+
+
+def make_watcher(from_dir: Path, interval: float = DEFAULT_INTERVAL) -> Watcher:
+    """Return an event-driven watcher where available, else a polling one."""
+    if hasattr(select, "kqueue") and sys.platform != "linux":  # pragma: no cover
+        return KqueueWatcher(from_dir)
+    return PollingWatcher(from_dir, interval)
+
+
+def snapshot(from_dir: Path) -> Snapshot:
+    """Map each discovered app name to the app and its bundle identity.
+
+    If several apps share a name the first one found wins, as in a sync.
+    """
+    apps: Snapshot = {}
+    for app in unique_apps(iter_apps(from_dir), set()):
+        try:
+            st = app.path.stat()
+        except OSError:
+            continue
+        apps[app.name] = (app, (st.st_dev, st.st_ino))
+    return apps
+
+
+def apply_changes(
+    old: Snapshot, new: Snapshot, to_dir: Path, *, failed: set[str] | None = None
+) -> TrampolineSyncResult:
+    """Update only the trampolines affected between two snapshots.
+
+    Args:
+        old: Snapshot the trampolines currently reflect
+        new: Snapshot to bring the trampolines up to
+        to_dir: Target directory for trampolines
+        failed: Set the names of trampolines that could not be updated are added to
+
+    Returns:
+        TrampolineSyncResult listing the created or repointed trampolines
+
+    """
+    changed: list[Path] = []
+    created = 0
+    repointed = 0
+    removed = 0
+    errors: list[str] = []
+    if failed is None:
+        failed = set()
+
+    for name in old.keys() - new.keys():
+        try:
+            shutil.rmtree(to_dir / name)
+        except OSError as e:
+            failed.add(name)
+            errors.append(f"Failed to remove {name}: {e}")
+        else:
+            removed += 1
+
+    for name, (app, identity) in sorted(new.items()):
+        previous = old.get(name)
+        if previous is not None and previous[1] == identity and previous[0] == app:
+            continue
+        try:
+            create_trampoline(app, to_dir).touch()
+        except OSError as e:
+            failed.add(name)
+            errors.append(f"Failed to create trampoline for {name}: {e}")
+            continue
+        changed.append(to_dir / name)
+        if previous is None:
+            created += 1
+        else:
+            repointed += 1
+
+    return TrampolineSyncResult(
+        trampolines=tuple(changed),
+        created=created,
+        repointed=repointed,
+        removed=removed,
+        unchanged=len(new) - len(changed),
+        errors=tuple(errors),
+    )
+
+
+def _settle(old: Snapshot, new: Snapshot, failed: set[str]) -> Snapshot:
+    """Return the snapshot the trampolines reflect after a batch.
+
+    Names that failed keep their old entry, or none, so the next batch
+    retries them.
+    """
+    state = {name: entry for name, entry in new.items() if name not in failed}
+    state.update((name, old[name]) for name in failed if name in old)
+    return state
+
+
+def watch(  # noqa: PLR0913
+    from_dir: Path,
+    to_dir: Path,
+    *,
+    on_batch: Callable[[TrampolineSyncResult], None] | None = None,
+    debounce: float = DEFAULT_DEBOUNCE,
+    watcher: Watcher | None = None,
+    max_batches: int | None = None,
+) -> None:
+    """Keep trampolines in to_dir in sync with from_dir as it changes.
+
+    Reconciles once on start, then waits for change notifications. Events
+    arriving within debounce seconds of each other are coalesced into one
+    batch, and each batch only touches the trampolines that changed. Every
+    batch holds the target's lock, so it never overlaps a sync.
+
+    Args:
+        from_dir: Source directory containing .app bundles
+        to_dir: Target directory for trampolines
+        on_batch: Called with the result of every synced batch
+        debounce: Seconds of quiet required before a batch is synced
+        watcher: Change notifier (defaults to make_watcher(from_dir))
+        max_batches: Stop after this many batches (run forever if None)
+
+    """
+    with target_lock(to_dir):
+        _ = reconcile_trampolines(from_dir, to_dir)
+    state = snapshot(from_dir)
+    watcher = watcher or make_watcher(from_dir)
+    batches = 0
+
+    try:
+        while max_batches is None or batches < max_batches:
+            if not watcher.wait(None):
+                continue
+            while watcher.wait(debounce):
+                pass
+
+            new = snapshot(from_dir)
+            failed: set[str] = set()
+            with target_lock(to_dir):
+                result = apply_changes(state, new, to_dir, failed=failed)
+                if not result.errors:
+                    trampolines = [to_dir / name for name in sorted(new)]
+                    _ = write_manifest(to_dir, source_digest(from_dir), trampolines)
+            state = _settle(state, new, failed)
+            batches += 1
+            if on_batch is not None:
+                on_batch(result)
+    finally:
+        watcher.close()
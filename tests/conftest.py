@@ -1,25 +1,64 @@
 """Shared test fixtures."""
 
+import plistlib
 from collections.abc import Callable
 from pathlib import Path
 
 import pytest
 
 
+@pytest.fixture(autouse=True)
+def _cache_home(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> None:
+    """Keep caches and logs written by the code under test out of the real home."""
+    monkeypatch.setenv("XDG_CACHE_HOME", str(tmp_path / "cache"))
+
+
 @pytest.fixture
-def make_app(tmp_path: Path) -> Callable[[str], Path]:
+def make_app(tmp_path: Path) -> Callable[..., Path]:
     """Create a valid .app bundle for testing.
 
     Returns:
-        A factory function that creates a valid app with the given name.
+        A factory function that creates a valid app with the given name,
+        in the given parent directory (tmp_path by default), creating the
+        parent if needed.
 
     """
 
-    def _make_app(name: str) -> Path:
-        app = tmp_path / name
-        app.mkdir()
-        (app / "Contents").mkdir()
+    def _make_app(name: str, parent: Path | None = None) -> Path:
+        app = (tmp_path if parent is None else parent) / name
+        (app / "Contents").mkdir(parents=True)
         (app / "Contents" / "Info.plist").touch()
         return app
 
     return _make_app
+
+
+@pytest.fixture
+def make_dock_plist(tmp_path: Path) -> Callable[[list[tuple[str, str]]], Path]:
+    """Create a Dock preferences plist for testing.
+
+    Returns:
+        A factory function that writes a binary plist whose persistent-apps
+        holds one item per (label, url) pair, plus a spacer tile.
+
+    """
+
+    def _make_dock_plist(items: list[tuple[str, str]]) -> Path:
+        tiles: list[object] = [
+            {
+                "GUID": i,
+                "tile-data": {
+                    "file-label": label,
+                    "file-data": {"_CFURLString": url, "_CFURLStringType": 15},
+                    "book": b"bookmark",
+                },
+                "tile-type": "file-tile",
+            }
+            for i, (label, url) in enumerate(items)
+        ]
+        tiles.append({"tile-data": {}, "tile-type": "spacer-tile"})
+        path = tmp_path / "com.apple.dock.plist"
+        _ = path.write_bytes(plistlib.dumps({"persistent-apps": tiles}, fmt=plistlib.FMT_BINARY))
+        return path
+
+    return _make_dock_plist
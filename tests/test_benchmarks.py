@@ -0,0 +1,80 @@
+"""Smoke tests for the benchmark suite."""
+
+import json
+from pathlib import Path
+from typing import cast
+from unittest.mock import patch
+
+import pytest
+
+from benchmarks.run import bench_tree, cli_sync, main, make_tree
+from nix_spotlight.trampoline import reconcile_trampolines
+from nix_spotlight.types import TrampolineSyncResult
+
+SIZE = 3
+
+
+def test_make_tree_layouts(tmp_path: Path) -> None:
+    """Test generated trees hold the requested number of apps."""
+    flat = make_tree(tmp_path / "flat", SIZE, nested=False)
+    nested = make_tree(tmp_path / "nested", SIZE, nested=True)
+
+    assert len(list(flat.glob("*.app"))) == SIZE
+    assert len(list(nested.glob("*/*.app"))) == SIZE
+
+
+def test_sync_warm_repoints_every_trampoline() -> None:
+    """Test the warm case times repointing every trampoline, not an unchanged tree."""
+    repointed: list[tuple[str, int]] = []
+
+    def spy(source: Path, target: Path, **kwargs: object) -> TrampolineSyncResult:
+        result = reconcile_trampolines(source, target, **kwargs)  # pyright: ignore[reportArgumentType]
+        repointed.append((source.parent.name, result.repointed))
+        return result
+
+    with patch("nix_spotlight.trampoline.reconcile_trampolines", side_effect=spy):
+        _ = bench_tree(SIZE, nested=False, latency=0, repeat=1)
+
+    assert [count for parent, count in repointed if parent != "rebuilt"].count(SIZE) == 1
+
+
+def test_cli_sync_hits_manifest(tmp_path: Path) -> None:
+    """Test the noop case stops at the manifest check of an unchanged tree."""
+    source = make_tree(tmp_path, SIZE, nested=True)
+    target = tmp_path / "target"
+    assert cli_sync(source, target) == 0
+
+    with patch("nix_spotlight.trampoline.reconcile_trampolines") as mock_reconcile:
+        assert cli_sync(source, target) == 0
+
+    mock_reconcile.assert_not_called()
+
+
+def test_benchmark_writes_results(tmp_path: Path, capsys: pytest.CaptureFixture[str]) -> None:
+    """Test the runner writes one result per size, layout and case."""
+    output = tmp_path / "bench.json"
+
+    argv = ["--sizes", str(SIZE), "--latency", "0", "--repeat", "1", "--output", str(output)]
+    assert main(argv) == 0
+
+    report = cast("dict[str, list[dict[str, object]]]", json.loads(output.read_text()))
+    results = report["results"]
+    cases = {(r["layout"], r["case"]) for r in results}
+    assert ("flat", "sync_noop") in cases
+    assert ("nested", "sync_dock") in cases
+    assert ("flat", "startup_version") in cases
+    assert all(isinstance(r["seconds"], float) and r["seconds"] >= 0 for r in results)
+    assert {r["size"] for r in results if "budget" not in r} == {SIZE}
+    assert f"Wrote {output}" in capsys.readouterr().out
+
+
+def test_benchmark_check_budgets(tmp_path: Path, capsys: pytest.CaptureFixture[str]) -> None:
+    """Test --check-budgets fails when CLI startup exceeds its budget."""
+    argv = ["--sizes", "1", "--latency", "0", "--repeat", "1", "--output", str(tmp_path / "b")]
+    budgets = {"startup_version": 0.0, "startup_sync_noop": 0.0}
+
+    with patch.dict("benchmarks.run.STARTUP_BUDGETS", budgets):
+        assert main(argv) == 0
+        assert main([*argv, "--check-budgets"]) == 1
+
+    assert "over budget: startup_version" in capsys.readouterr().err
@@ -0,0 +1,80 @@
+"""Tests for catalog module."""
+
+import json
+from pathlib import Path
+from typing import cast
+from unittest.mock import patch
+
+import pytest
+
+from nix_spotlight.catalog import dump_catalog, load_catalog
+from nix_spotlight.trampoline import gather_apps
+
+
+@pytest.fixture
+def store(tmp_path: Path) -> Path:
+    """Return a fake store directory holding an Applications tree."""
+    store = tmp_path / "store"
+    for relative in ("A.app", "KDE/B.app"):
+        contents = store / "apps" / "Applications" / relative / "Contents"
+        contents.mkdir(parents=True)
+        (contents / "Info.plist").touch()
+    return store
+
+
+def test_catalog_round_trip(tmp_path: Path, store: Path) -> None:
+    """Test a manifest built in the store loads through a symlinked source."""
+    built = store / "apps" / "Applications"
+    source = tmp_path / "Nix Apps"
+    source.symlink_to(built)
+    manifest = tmp_path / "apps.json"
+    _ = manifest.write_text(dump_catalog(built))
+
+    with patch("nix_spotlight.catalog.STORE_DIR", str(store)):
+        catalog = load_catalog(manifest, source)
+        again = load_catalog(manifest, source)
+
+    assert catalog is not None
+    assert list(catalog.apps) == gather_apps(source)
+    assert again is not None
+    assert again.digest == catalog.digest
+
+
+@pytest.mark.parametrize(
+    "change",
+    [
+        {"version": 0},
+        {"max_depth": 2},
+        {"root": "/nix/store/other"},
+        {"apps": "A.app"},
+    ],
+)
+def test_catalog_stale(tmp_path: Path, store: Path, change: dict[str, object]) -> None:
+    """Test manifests for another version, depth or root are ignored."""
+    built = store / "apps" / "Applications"
+    manifest = tmp_path / "apps.json"
+    data = cast("dict[str, object]", json.loads(dump_catalog(built)))
+    _ = manifest.write_text(json.dumps(data | change))
+
+    with patch("nix_spotlight.catalog.STORE_DIR", str(store)):
+        assert load_catalog(manifest, built) is None
+
+
+@pytest.mark.parametrize("content", [None, "{not json", "[]"])
+def test_catalog_unreadable(tmp_path: Path, store: Path, content: str | None) -> None:
+    """Test missing or malformed manifests are ignored."""
+    manifest = tmp_path / "apps.json"
+    if content is not None:
+        _ = manifest.write_text(content)
+
+    with patch("nix_spotlight.catalog.STORE_DIR", str(store)):
+        assert load_catalog(manifest, store / "apps" / "Applications") is None
+
+
+def test_catalog_outside_store(tmp_path: Path, store: Path) -> None:
+    """Test a mutable source directory never trusts its manifest."""
+    built = store / "apps" / "Applications"
+    manifest = tmp_path / "apps.json"
+    _ = manifest.write_text(dump_catalog(built))
+
+    assert load_catalog(manifest, built) is None
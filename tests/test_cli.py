@@ -1,13 +1,25 @@
 """Tests for CLI module."""
 
+import io
+import json
+import os
+import shutil
+import socket
 import sys
+import threading
+import time
+from collections.abc import Callable, Generator
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from functools import partial
 from pathlib import Path
-from typing import Final
-from unittest.mock import patch
+from typing import Final, cast
+from unittest.mock import ANY, patch
 
 import pytest
 
 from nix_spotlight.__main__ import main
+from nix_spotlight.types import DockSyncResult
 
 ARGPARSE_ERROR: Final = 2
 
@@ -118,7 +130,7 @@ def test_main_sync_with_dock(tmp_path: Path) -> None:
 
     with (
         patch.object(sys, "argv", ["nix-spotlight", "sync", str(source), str(target)]),
-        patch("nix_spotlight.__main__.sync_dock") as mock_dock,
+        patch("nix_spotlight.dock.sync_dock", return_value=DockSyncResult()) as mock_dock,
     ):
         result = main()
 
@@ -146,7 +158,7 @@ def test_main_sync_with_dock_errors(
 
     with (
         patch.object(sys, "argv", ["nix-spotlight", "sync", str(source), str(target)]),
-        patch("nix_spotlight.__main__.sync_dock", return_value=mock_result),
+        patch("nix_spotlight.dock.sync_dock", return_value=mock_result),
     ):
         result = main()
 
@@ -176,7 +188,7 @@ def test_main_sync_with_dock_no_errors(
 
     with (
         patch.object(sys, "argv", ["nix-spotlight", "sync", str(source), str(target)]),
-        patch("nix_spotlight.__main__.sync_dock", return_value=mock_result),
+        patch("nix_spotlight.dock.sync_dock", return_value=mock_result),
     ):
         result = main()
 
@@ -184,3 +196,970 @@ def test_main_sync_with_dock_no_errors(
     captured = capsys.readouterr()
     assert "warning" not in captured.err
     assert "Synced 1 apps" in captured.out
+
+
+def test_main_sync_reconcile(tmp_path: Path, capsys: pytest.CaptureFixture[str]) -> None:
+    """Test sync --reconcile reports per-action counts."""
+    source = tmp_path / "source"
+    source.mkdir()
+    target = tmp_path / "target"
+
+    app = source / "Test.app"
+    app.mkdir()
+    (app / "Contents").mkdir()
+    (app / "Contents" / "Info.plist").touch()
+
+    argv = [
+        "nix-spotlight",
+        "sync",
+        "--no-dock",
+        "--force",
+        "--reconcile",
+        str(source),
+        str(target),
+    ]
+    with patch.object(sys, "argv", argv):
+        assert main() == 0
+    with patch.object(sys, "argv", argv):
+        assert main() == 0
+
+    captured = capsys.readouterr()
+    assert "(created 1, repointed 0, removed 0, unchanged 0)" in captured.out
+    assert "(created 0, repointed 0, removed 0, unchanged 1)" in captured.out
+
+
+def test_main_sync_atomic_and_rollback(tmp_path: Path, capsys: pytest.CaptureFixture[str]) -> None:
+    """Test sync --atomic followed by rollback."""
+    source = tmp_path / "source"
+    source.mkdir()
+    target = tmp_path / "target"
+
+    app = source / "Test.app"
+    app.mkdir()
+    (app / "Contents").mkdir()
+    (app / "Contents" / "Info.plist").touch()
+
+    argv = ["nix-spotlight", "sync", "--no-dock", "--force", "--atomic", str(source), str(target)]
+    with patch.object(sys, "argv", argv):
+        assert main() == 0
+    with patch.object(sys, "argv", argv):
+        assert main() == 0
+    with patch.object(sys, "argv", ["nix-spotlight", "rollback", str(target)]):
+        assert main() == 0
+
+    captured = capsys.readouterr()
+    assert "Synced 1 apps" in captured.out
+    assert f"Rolled back {target}" in captured.out
+    assert (target / "Test.app" / "Contents").is_symlink()
+
+
+def test_main_rollback_without_previous(tmp_path: Path, capsys: pytest.CaptureFixture[str]) -> None:
+    """Test rollback fails when there is no previous generation."""
+    with patch.object(sys, "argv", ["nix-spotlight", "rollback", str(tmp_path / "target")]):
+        assert main() == 1
+
+    captured = capsys.readouterr()
+    assert "no previous generation" in captured.err
+
+
+def test_main_sync_modes_exclusive() -> None:
+    """Test --reconcile and --atomic cannot be combined."""
+    argv = ["nix-spotlight", "sync", "--reconcile", "--atomic", "src", "dst"]
+    with patch.object(sys, "argv", argv), pytest.raises(SystemExit) as exc_info:
+        _ = main()
+    assert exc_info.value.code == ARGPARSE_ERROR
+
+
+def test_main_sync_skips_when_manifest_matches(
+    tmp_path: Path, capsys: pytest.CaptureFixture[str]
+) -> None:
+    """Test a repeated sync exits early without touching dock or trampolines."""
+    source = tmp_path / "source"
+    source.mkdir()
+    target = tmp_path / "target"
+
+    app = source / "Test.app"
+    app.mkdir()
+    (app / "Contents").mkdir()
+    (app / "Contents" / "Info.plist").touch()
+
+    argv = ["nix-spotlight", "sync", str(source), str(target)]
+    with (
+        patch.object(sys, "argv", argv),
+        patch("nix_spotlight.dock.sync_dock", return_value=DockSyncResult()),
+    ):
+        assert main() == 0
+
+    with (
+        patch.object(sys, "argv", argv),
+        patch("nix_spotlight.dock.sync_dock", return_value=DockSyncResult()) as mock_dock,
+        patch("nix_spotlight.trampoline.reconcile_trampolines") as mock_sync,
+    ):
+        assert main() == 0
+
+    mock_dock.assert_not_called()
+    mock_sync.assert_not_called()
+    captured = capsys.readouterr()
+    assert f"Up to date: 1 apps in {target}" in captured.out
+
+
+def test_main_sync_retries_pending_dock(
+    make_app: Callable[..., Path], tmp_path: Path, capsys: pytest.CaptureFixture[str]
+) -> None:
+    """Test an up-to-date target still updates the Dock until an update succeeds."""
+    source = tmp_path / "source"
+    target = tmp_path / "target"
+    _ = make_app("Test.app", source)
+    argv = ["nix-spotlight", "sync", str(source), str(target)]
+    failed = DockSyncResult(errors=("dockutil -L failed: no Dock",))
+    with patch.object(sys, "argv", [*argv[:2], "--no-dock", *argv[2:]]):
+        assert main() == 0
+
+    calls: list[list[Path]] = []
+    for result in (failed, DockSyncResult(), DockSyncResult()):
+        with (
+            patch.object(sys, "argv", argv),
+            patch("nix_spotlight.dock.sync_dock", return_value=result) as mock_dock,
+            patch("nix_spotlight.trampoline.reconcile_trampolines") as mock_sync,
+        ):
+            assert main() == 0
+        calls.extend(call.args[0] for call in mock_dock.call_args_list)
+        mock_sync.assert_not_called()
+
+    # Skipped by --no-dock, then failed, then done; the last run skips it
+    assert calls == [[target / "Test.app"]] * 2
+    assert capsys.readouterr().out.count(f"Up to date: 1 apps in {target}") == len(calls) + 1
+
+
+def test_main_sync_notices_nested_apps(
+    make_app: Callable[..., Path], tmp_path: Path, capsys: pytest.CaptureFixture[str]
+) -> None:
+    """Test an app added to a nested directory is synced rather than skipped."""
+    source = tmp_path / "source"
+    target = tmp_path / "target"
+    _ = make_app("Top.app", source)
+    _ = make_app("A.app", source / "KDE")
+    argv = ["nix-spotlight", "sync", "--no-dock", str(source), str(target)]
+    with patch.object(sys, "argv", argv):
+        assert main() == 0
+
+    _ = make_app("B.app", source / "KDE")
+    with patch.object(sys, "argv", argv):
+        assert main() == 0
+
+    assert (target / "B.app" / "Contents").is_symlink()
+    assert "Synced 3 apps" in capsys.readouterr().out
+
+
+def test_main_sync_jobs_reports_app_errors(
+    tmp_path: Path, capsys: pytest.CaptureFixture[str]
+) -> None:
+    """Test sync --jobs warns per failed app and skips the manifest."""
+    from nix_spotlight.types import TrampolineSyncResult
+
+    source = tmp_path / "source"
+    source.mkdir()
+    target = tmp_path / "target"
+    target.mkdir()
+
+    failed = TrampolineSyncResult(errors=("Failed to create trampoline for Bad.app: boom",))
+    argv = ["nix-spotlight", "sync", "--no-dock", "--jobs", "4", str(source), str(target)]
+
+    with (
+        patch.object(sys, "argv", argv),
+        patch("nix_spotlight.trampoline.reconcile_trampolines", return_value=failed) as mock_sync,
+    ):
+        assert main() == 0
+
+    assert mock_sync.call_args.kwargs == {"max_workers": 4, "max_depth": 1, "apps": None}
+    captured = capsys.readouterr()
+    assert "warning: Failed to create trampoline for Bad.app: boom" in captured.err
+    assert not (target / ".nix-spotlight.json").exists()
+
+
+def test_main_sync_plist_dock_backend(tmp_path: Path) -> None:
+    """Test sync --dock-backend plist uses the plist backend."""
+    source = tmp_path / "source"
+    source.mkdir()
+    target = tmp_path / "target"
+
+    argv = ["nix-spotlight", "sync", "--dock-backend", "plist", str(source), str(target)]
+    with (
+        patch.object(sys, "argv", argv),
+        patch("nix_spotlight.dock.sync_dock_plist", return_value=DockSyncResult()) as mock_plist,
+        patch("nix_spotlight.dock.sync_dock", return_value=DockSyncResult()) as mock_dock,
+    ):
+        assert main() == 0
+
+    mock_plist.assert_called_once_with([], prune=False, retired=[], metadata=ANY)
+    mock_dock.assert_not_called()
+
+
+def test_main_sync_timings(tmp_path: Path, capsys: pytest.CaptureFixture[str]) -> None:
+    """Test sync --timings reports phases on stderr in both formats."""
+    source = tmp_path / "source"
+    source.mkdir()
+    target = tmp_path / "target"
+
+    app = source / "Test.app"
+    app.mkdir()
+    (app / "Contents").mkdir()
+    (app / "Contents" / "Info.plist").touch()
+
+    argv = ["nix-spotlight", "sync", "--no-dock", "--timings", str(source), str(target)]
+    with patch.object(sys, "argv", argv):
+        assert main() == 0
+    text = capsys.readouterr().err
+
+    argv = ["nix-spotlight", "sync", "--no-dock", "--timings-json", str(source), str(target)]
+    with patch.object(sys, "argv", argv):
+        assert main() == 0
+    report = cast("dict[str, dict[str, float]]", json.loads(capsys.readouterr().err))
+
+    assert "discover" in text
+    assert "trampolines" in text
+    assert "symlinks_written" in text
+    assert set(report["phases"]) == {"manifest"}
+
+
+def test_main_watch(tmp_path: Path, capsys: pytest.CaptureFixture[str]) -> None:
+    """Test watch reports batches, syncs the Dock and stops on Ctrl-C."""
+    from nix_spotlight.types import TrampolineSyncResult
+
+    source = tmp_path / "source"
+    source.mkdir()
+    target = tmp_path / "target"
+    changed = TrampolineSyncResult(
+        trampolines=(target / "New.app",), created=1, errors=("Failed to remove Old.app: busy",)
+    )
+
+    def fake_watch(*_args: object, **kwargs: object) -> None:
+        on_batch = kwargs["on_batch"]
+        assert callable(on_batch)
+        _ = on_batch(changed)
+        _ = on_batch(TrampolineSyncResult(removed=1))
+        raise KeyboardInterrupt
+
+    mock_result = DockSyncResult(errors=("dock error",))
+    argv = ["nix-spotlight", "watch", "--interval", "0.1", str(source), str(target)]
+    with (
+        patch.object(sys, "argv", argv),
+        patch("nix_spotlight.watch.watch", side_effect=fake_watch),
+        patch("nix_spotlight.dock.sync_dock", return_value=mock_result) as mock_dock,
+    ):
+        assert main() == 0
+
+    mock_dock.assert_called_once_with([target / "New.app"], metadata=ANY)
+    captured = capsys.readouterr()
+    assert f"Watching {source}" in captured.out
+    assert "(created 1, repointed 0, removed 0)" in captured.out
+    assert "(created 0, repointed 0, removed 1)" in captured.out
+    assert "warning: Failed to remove Old.app: busy" in captured.err
+    assert "warning: dock error" in captured.err
+
+
+def test_main_sync_evicts_collected_metadata(tmp_path: Path) -> None:
+    """Test a Dock sync drops cached metadata of collected store paths and saves the cache."""
+    source = tmp_path / "source"
+    source.mkdir()
+    cache = tmp_path / "cache" / "nix-spotlight" / "metadata.json"
+    cache.parent.mkdir(parents=True)
+    entry: dict[str, object] = {
+        "bundle_identifier": "gone",
+        "bundle_name": None,
+        "version": None,
+        "url_schemes": [],
+    }
+    _ = cache.write_text(
+        json.dumps({"version": 1, "entries": {"/nix/store/x-gone/Gone.app": entry}})
+    )
+
+    argv = ["nix-spotlight", "sync", str(source), str(tmp_path / "target")]
+    with (
+        patch.object(sys, "argv", argv),
+        patch("nix_spotlight.dock.sync_dock", return_value=DockSyncResult()),
+    ):
+        assert main() == 0
+
+    assert json.loads(cache.read_text()) == {"version": 1, "entries": {}}
+
+
+def test_main_watch_no_dock(tmp_path: Path) -> None:
+    """Test watch --no-dock never touches the Dock."""
+    from nix_spotlight.types import TrampolineSyncResult
+
+    source = tmp_path / "source"
+    source.mkdir()
+
+    def fake_watch(*_args: object, **kwargs: object) -> None:
+        on_batch = kwargs["on_batch"]
+        assert callable(on_batch)
+        _ = on_batch(TrampolineSyncResult(trampolines=(tmp_path / "New.app",), created=1))
+
+    argv = ["nix-spotlight", "watch", "--no-dock", str(source), str(tmp_path / "target")]
+    with (
+        patch.object(sys, "argv", argv),
+        patch("nix_spotlight.watch.watch", side_effect=fake_watch),
+        patch("nix_spotlight.dock.sync_dock", return_value=DockSyncResult()) as mock_dock,
+    ):
+        assert main() == 0
+
+    mock_dock.assert_not_called()
+
+
+def test_main_watch_missing_source(tmp_path: Path, capsys: pytest.CaptureFixture[str]) -> None:
+    """Test watch with a non-existent source directory."""
+    argv = ["nix-spotlight", "watch", str(tmp_path / "missing"), str(tmp_path / "target")]
+    with patch.object(sys, "argv", argv):
+        assert main() == 1
+
+    assert "does not exist" in capsys.readouterr().err
+
+
+def test_main_sync_multiple_pairs(tmp_path: Path, capsys: pytest.CaptureFixture[str]) -> None:
+    """Test several pairs sync in one run with a single combined Dock update."""
+    pairs: list[str] = []
+    for name in ("System", "User"):
+        source = tmp_path / f"{name}Apps"
+        app = source / f"{name}.app" / "Contents"
+        app.mkdir(parents=True)
+        (app / "Info.plist").touch()
+        pairs.extend([str(source), str(tmp_path / f"{name}Trampolines")])
+    missing = [str(tmp_path / "missing"), str(tmp_path / "unused")]
+
+    with (
+        patch.object(sys, "argv", ["nix-spotlight", "sync", *pairs, *missing]),
+        patch("nix_spotlight.dock.sync_dock", return_value=DockSyncResult()) as mock_dock,
+    ):
+        assert main() == 1
+
+    captured = capsys.readouterr()
+    summary = "(created 1, repointed 0, removed 0, unchanged 0)"
+    assert captured.out.splitlines() == [
+        f"Synced 1 apps to {pairs[1]} {summary}",
+        f"Synced 1 apps to {pairs[3]} {summary}",
+    ]
+    assert "does not exist" in captured.err
+    mock_dock.assert_called_once_with(
+        [
+            Path(pairs[1]) / "System.app",
+            Path(pairs[3]) / "User.app",
+        ],
+        prune=False,
+        retired=[],
+        metadata=ANY,
+    )
+
+
+def test_main_sync_config(tmp_path: Path, capsys: pytest.CaptureFixture[str]) -> None:
+    """Test --config adds pairs and skips the Dock when nothing was synced."""
+    source = tmp_path / "source"
+    source.mkdir()
+    config = tmp_path / "pairs.json"
+    _ = config.write_text(
+        json.dumps({"pairs": [{"source": str(source), "target": str(tmp_path / "target")}]})
+    )
+    argv = ["nix-spotlight", "sync", "--timings", "--config", str(config)]
+
+    with patch.object(sys, "argv", argv):
+        assert main() == 0
+    _ = capsys.readouterr()
+
+    with (
+        patch.object(sys, "argv", [*argv, str(source), str(tmp_path / "other")]),
+        patch("nix_spotlight.dock.sync_dock", return_value=DockSyncResult()) as mock_dock,
+    ):
+        assert main() == 0
+
+    mock_dock.assert_called_once_with([], prune=False, retired=[], metadata=ANY)
+    assert "Up to date: 0 apps" in capsys.readouterr().out
+
+    with (
+        patch.object(sys, "argv", argv),
+        patch("nix_spotlight.dock.sync_dock", return_value=DockSyncResult()) as mock_dock,
+    ):
+        assert main() == 0
+    mock_dock.assert_not_called()
+
+
+@pytest.mark.parametrize(
+    "extra",
+    [[], ["only-source"], ["--config", "missing.json"]],
+)
+def test_main_sync_bad_pairs(tmp_path: Path, extra: list[str]) -> None:
+    """Test missing, odd or unreadable pairs are usage errors."""
+    argv = ["nix-spotlight", "sync", *(str(tmp_path / arg) if "." in arg else arg for arg in extra)]
+    with patch.object(sys, "argv", argv), pytest.raises(SystemExit) as exc_info:
+        _ = main()
+    assert exc_info.value.code == ARGPARSE_ERROR
+
+
+def test_main_sync_dry_run(tmp_path: Path, capsys: pytest.CaptureFixture[str]) -> None:
+    """Test sync --dry-run prints the plan, including Dock updates, and writes nothing."""
+    source = tmp_path / "source"
+    contents = source / "MyApp.app" / "Contents"
+    contents.mkdir(parents=True)
+    (contents / "Info.plist").touch()
+    target = tmp_path / "target"
+    cache = tmp_path / "cache" / "nix-spotlight" / "metadata.json"
+    cache.parent.mkdir(parents=True)
+    stale = '{"version": 1, "entries": {"/nix/store/x-gone/Gone.app": {}}}'
+    _ = cache.write_text(stale)
+
+    with (
+        patch.object(sys, "argv", ["nix-spotlight", "sync", "--dry-run", str(source), str(target)]),
+        patch("nix_spotlight.dock.plan_dock", return_value=[("MyApp", "/t/MyApp.app")]),
+        patch("nix_spotlight.dock.sync_dock", return_value=DockSyncResult()) as mock_dock,
+    ):
+        assert main() == 0
+
+    assert capsys.readouterr().out.splitlines() == [
+        f"create MyApp.app -> {contents}",
+        "touch MyApp.app",
+        f"Would sync 1 apps to {target} (2 changes)",
+        "dock MyApp -> /t/MyApp.app",
+    ]
+    assert not target.exists()
+    assert cache.read_text() == stale
+    mock_dock.assert_not_called()
+
+
+def test_main_sync_touches_only_changes(tmp_path: Path) -> None:
+    """Test a forced sync keeps mtimes by default while --rebuild rewrites everything."""
+    source = tmp_path / "source"
+    contents = source / "MyApp.app" / "Contents"
+    contents.mkdir(parents=True)
+    (contents / "Info.plist").touch()
+    target = tmp_path / "target"
+    trampoline = target / "MyApp.app"
+    argv = ["nix-spotlight", "sync", "--no-dock", "--force", str(source), str(target)]
+
+    with patch.object(sys, "argv", argv):
+        assert main() == 0
+    os.utime(trampoline, ns=(0, 0))
+
+    with patch.object(sys, "argv", argv):
+        assert main() == 0
+    assert trampoline.stat().st_mtime_ns == 0
+
+    with patch.object(sys, "argv", [*argv, "--rebuild"]):
+        assert main() == 0
+    assert trampoline.stat().st_mtime_ns > 0
+
+
+def test_main_sync_max_depth(tmp_path: Path, capsys: pytest.CaptureFixture[str]) -> None:
+    """Test --max-depth finds deeper apps and invalidates the manifest."""
+    source = tmp_path / "source"
+    contents = source / "Vendor" / "Suite" / "Deep.app" / "Contents"
+    contents.mkdir(parents=True)
+    (contents / "Info.plist").touch()
+    target = tmp_path / "target"
+    argv = ["nix-spotlight", "sync", "--no-dock", str(source), str(target)]
+
+    with patch.object(sys, "argv", argv):
+        assert main() == 0
+    with patch.object(sys, "argv", [*argv, "--max-depth", "2", "--dry-run"]):
+        assert main() == 0
+    with patch.object(sys, "argv", [*argv, "--max-depth", "2"]):
+        assert main() == 0
+
+    lines = capsys.readouterr().out.splitlines()
+    assert lines[0].startswith("Synced 0 apps")
+    assert lines[1] == f"create Deep.app -> {contents}"
+    assert lines[-1].startswith("Synced 1 apps")
+    assert (target / "Deep.app" / "Contents").is_symlink()
+
+
+def test_main_manifest(tmp_path: Path, capsys: pytest.CaptureFixture[str]) -> None:
+    """Test the manifest subcommand prints or writes the app manifest."""
+    source = tmp_path / "source"
+    (source / "Test.app" / "Contents").mkdir(parents=True)
+    (source / "Test.app" / "Contents" / "Info.plist").touch()
+    output = tmp_path / "apps.json"
+
+    with patch.object(sys, "argv", ["nix-spotlight", "manifest", str(source)]):
+        assert main() == 0
+    printed = capsys.readouterr().out
+    argv = ["nix-spotlight", "manifest", str(source), "-o", str(output), "--max-depth", "1"]
+    with patch.object(sys, "argv", argv):
+        assert main() == 0
+
+    assert json.loads(printed)["apps"] == ["Test.app"]
+    assert output.read_text() == printed
+
+
+def test_main_manifest_missing_source(tmp_path: Path, capsys: pytest.CaptureFixture[str]) -> None:
+    """Test the manifest subcommand rejects a missing source."""
+    with patch.object(sys, "argv", ["nix-spotlight", "manifest", str(tmp_path / "missing")]):
+        assert main() == 1
+
+    assert "source directory does not exist" in capsys.readouterr().err
+
+
+def test_main_sync_app_manifest(tmp_path: Path, capsys: pytest.CaptureFixture[str]) -> None:
+    """Test sync --manifest takes apps from a current manifest without scanning."""
+    source = tmp_path / "source"
+    (source / "Test.app" / "Contents").mkdir(parents=True)
+    (source / "Test.app" / "Contents" / "Info.plist").touch()
+    target = tmp_path / "target"
+    stale = tmp_path / "stale.json"
+    _ = stale.write_text("{}")
+    current = tmp_path / "apps.json"
+    with patch.object(sys, "argv", ["nix-spotlight", "manifest", str(source), "-o", str(current)]):
+        assert main() == 0
+
+    argv = [
+        "nix-spotlight",
+        "sync",
+        "--no-dock",
+        "--manifest",
+        str(stale),
+        "--manifest",
+        str(current),
+        str(source),
+        str(target),
+    ]
+    with (
+        patch("nix_spotlight.catalog.STORE_DIR", str(tmp_path)),
+        patch("nix_spotlight.trampoline.iter_apps") as mock_scan,
+    ):
+        for _ in range(2):
+            with patch.object(sys, "argv", argv):
+                assert main() == 0
+
+    mock_scan.assert_not_called()
+    assert (target / "Test.app" / "Contents").is_symlink()
+    lines = capsys.readouterr().out.splitlines()
+    assert lines[0].startswith("Synced 1 apps")
+    assert lines[1] == f"Up to date: 1 apps in {target}"
+
+
+@pytest.mark.parametrize("mode", ["--rebuild", "--atomic"])
+def test_main_sync_stale_app_manifest(tmp_path: Path, mode: str) -> None:
+    """Test sync falls back to scanning when no manifest matches the source."""
+    source = tmp_path / "source"
+    (source / "Test.app" / "Contents").mkdir(parents=True)
+    (source / "Test.app" / "Contents" / "Info.plist").touch()
+    target = tmp_path / "target"
+    stale = tmp_path / "apps.json"
+    _ = stale.write_text("{}")
+    argv = ["nix-spotlight", "sync", "--no-dock", mode, "--manifest", str(stale)]
+
+    with patch.object(sys, "argv", [*argv, str(source), str(target)]):
+        assert main() == 0
+
+    assert (target / "Test.app" / "Contents").is_symlink()
+
+
+def test_main_sync_waits_and_coalesces(tmp_path: Path, capsys: pytest.CaptureFixture[str]) -> None:
+    """Test a forced sync that waited for another run skips what that run applied."""
+    from nix_spotlight.lock import target_lock
+
+    source = tmp_path / "source"
+    (source / "Test.app" / "Contents").mkdir(parents=True)
+    (source / "Test.app" / "Contents" / "Info.plist").touch()
+    target = tmp_path / "target"
+    argv = ["nix-spotlight", "sync", "--no-dock", str(source), str(target)]
+    with patch.object(sys, "argv", argv):
+        assert main() == 0
+
+    codes: list[int] = []
+    with patch.object(sys, "argv", [*argv, "--force"]):
+        with target_lock(target):
+            thread = threading.Thread(target=lambda: codes.append(main()))
+            thread.start()
+            time.sleep(0.1)
+            assert thread.is_alive()
+        thread.join()
+
+    assert codes == [0]
+    lines = capsys.readouterr().out.splitlines()
+    assert lines == [
+        f"Synced 1 apps to {target} (created 1, repointed 0, removed 0, unchanged 0)",
+        f"Up to date: 1 apps in {target}",
+    ]
+
+
+def _sync_behind_dock_lock(argv: list[str], while_waiting: Callable[[], object]) -> int:
+    """Run main while the Dock lock is held, returning how often it synced the Dock."""
+    from nix_spotlight.lock import dock_lock
+
+    waiting = threading.Event()
+
+    @contextmanager
+    def lock_wait(_name: str) -> Generator[None]:
+        waiting.set()
+        yield
+
+    with (
+        patch.object(sys, "argv", argv),
+        patch("nix_spotlight.lock.phase", lock_wait),
+        patch("nix_spotlight.dock.sync_dock", return_value=DockSyncResult()) as mock_dock,
+    ):
+        with dock_lock():
+            thread = threading.Thread(target=main)
+            thread.start()
+            assert waiting.wait(timeout=5)
+            _ = while_waiting()
+        thread.join()
+    return mock_dock.call_count
+
+
+def test_main_sync_waits_for_dock_update(tmp_path: Path) -> None:
+    """Test a run that waited for the Dock lock skips the update the holder recorded."""
+    from nix_spotlight.manifest import mark_dock_synced, read_manifest, write_manifest
+
+    source = tmp_path / "source"
+    (source / "Test.app" / "Contents").mkdir(parents=True)
+    (source / "Test.app" / "Contents" / "Info.plist").touch()
+    target = tmp_path / "target"
+    argv = ["nix-spotlight", "sync", str(source), str(target)]
+    with patch.object(sys, "argv", [*argv, "--no-dock"]):
+        assert main() == 0
+    manifest = read_manifest(target)
+    assert manifest is not None
+    missing = [str(tmp_path / "missing"), str(tmp_path / "other")]
+
+    def resync() -> None:
+        _ = write_manifest(target, "other source", [target / "Test.app"])
+
+    def unsynced() -> None:
+        _ = write_manifest(target, manifest.digest, [target / "Test.app"])
+
+    assert _sync_behind_dock_lock([*argv[:2], *missing, *argv[2:]], lambda: None) == 1
+    unsynced()
+    assert _sync_behind_dock_lock(argv, resync) == 1
+    unsynced()
+    assert _sync_behind_dock_lock(argv, lambda: mark_dock_synced(target, manifest.digest)) == 0
+
+
+def test_main_rollback_holds_lock(tmp_path: Path) -> None:
+    """Test rollback takes the target's lock."""
+    target = tmp_path / "target"
+
+    with patch.object(sys, "argv", ["nix-spotlight", "rollback", str(target)]):
+        assert main() == 1
+
+    assert (tmp_path / ".target.lock").is_file()
+
+
+def test_main_serve(tmp_path: Path, capsys: pytest.CaptureFixture[str]) -> None:
+    """Test serve listens on the given or default socket until interrupted."""
+    sock = tmp_path / "s.sock"
+    with (
+        patch.object(
+            sys, "argv", ["nix-spotlight", "serve", "--socket", str(sock), "--window", "1"]
+        ),
+        patch("nix_spotlight.serve.serve", side_effect=KeyboardInterrupt) as mock_serve,
+    ):
+        assert main() == 0
+    assert mock_serve.call_args.args[0] == sock
+    assert mock_serve.call_args.kwargs == {"window": 1.0}
+
+    with (
+        patch.object(sys, "argv", ["nix-spotlight", "serve"]),
+        patch("nix_spotlight.serve.default_socket_path", return_value=sock),
+        patch("nix_spotlight.serve.serve") as mock_serve,
+    ):
+        assert main() == 0
+    assert mock_serve.call_args.kwargs == {"window": 0.05}
+    assert capsys.readouterr().out == f"Serving on {sock}\n" * 2
+
+
+@contextmanager
+def _cli_server(sock: Path, batches: int) -> Generator[None]:
+    """Run nix-spotlight serve in a thread until it has answered the given batches."""
+    from nix_spotlight.serve import serve
+
+    with (
+        patch.object(sys, "argv", ["nix-spotlight", "serve", "--socket", str(sock)]),
+        patch("nix_spotlight.serve.serve", partial(serve, max_batches=batches)),
+    ):
+        server = threading.Thread(target=main)
+        server.start()
+        while not sock.exists():
+            time.sleep(0.01)
+    yield
+    server.join()
+
+
+def test_main_sync_through_server(
+    tmp_path: Path, monkeypatch: pytest.MonkeyPatch, capsys: pytest.CaptureFixture[str]
+) -> None:
+    """Test sync --socket runs in the server from the client's directory."""
+    (tmp_path / "source" / "Test.app" / "Contents").mkdir(parents=True)
+    (tmp_path / "source" / "Test.app" / "Contents" / "Info.plist").touch()
+    sock = tmp_path / "s.sock"
+    monkeypatch.chdir(tmp_path)
+
+    argv = ["nix-spotlight", "sync", "--no-dock", "--socket", str(sock), "source", "target"]
+    usage_error = 2
+    with _cli_server(sock, batches=2):
+        with patch.object(sys, "argv", argv):
+            assert main() == 0
+        with patch.object(sys, "argv", [*argv, "extra"]):
+            assert main() == usage_error
+
+    captured = capsys.readouterr()
+    assert f"Serving on {sock}\nSynced 1 apps to target" in captured.out
+    assert "directories must be given as FROM TO pairs" in captured.err
+    assert (tmp_path / "target" / "Test.app" / "Contents").is_symlink()
+
+
+def test_main_serve_sync_reports_failures(tmp_path: Path) -> None:
+    """Test a sync failing inside the server is reported instead of raised."""
+    from nix_spotlight.serve import request_sync
+
+    sock = tmp_path / "s.sock"
+    with (
+        patch("nix_spotlight.__main__._sync", side_effect=RuntimeError("boom")),
+        _cli_server(sock, batches=1),
+    ):
+        reply = request_sync(sock, ["a", "b"], str(tmp_path))
+
+    assert reply is not None
+    assert reply.code == 1
+    assert reply.err == "error: boom\n"
+
+
+def test_main_sync_without_server(tmp_path: Path, capsys: pytest.CaptureFixture[str]) -> None:
+    """Test sync --socket syncs in-process when no server answers."""
+    source = tmp_path / "source"
+    source.mkdir()
+    argv = ["nix-spotlight", "sync", "--socket", str(tmp_path / "none.sock")]
+
+    with patch.object(sys, "argv", [*argv, "--no-dock", str(source), str(tmp_path / "t")]):
+        assert main() == 0
+
+    assert capsys.readouterr().out.startswith("Synced 0 apps")
+
+
+def test_main_sync_bypasses_silent_server(
+    tmp_path: Path, capsys: pytest.CaptureFixture[str]
+) -> None:
+    """Test sync --socket stops waiting at --deadline and syncs in-process."""
+    source = tmp_path / "source"
+    source.mkdir()
+    sock = tmp_path / "s.sock"
+    argv = ["nix-spotlight", "sync", "--socket", str(sock), "--deadline", "0.2", "--no-dock"]
+
+    # Listens without ever accepting, like a server stuck in a long sync
+    with (
+        socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as server,
+        patch.object(sys, "argv", [*argv, str(source), str(tmp_path / "t")]),
+    ):
+        server.bind(str(sock))
+        server.listen()
+        assert main() == 0
+
+    assert capsys.readouterr().out.startswith("Synced 0 apps")
+
+
+@pytest.mark.parametrize("backend", ["dockutil", "plist"])
+def test_main_sync_prune_dock(tmp_path: Path, backend: str) -> None:
+    """Test --prune-dock asks either Dock backend to prune."""
+    source = tmp_path / "source"
+    source.mkdir()
+    argv = ["nix-spotlight", "sync", "--prune-dock", "--dock-backend", backend]
+
+    with (
+        patch.object(sys, "argv", [*argv, str(source), str(tmp_path / "target")]),
+        patch("nix_spotlight.dock.sync_dock", return_value=DockSyncResult()) as mock_dock,
+        patch("nix_spotlight.dock.sync_dock_plist", return_value=DockSyncResult()) as mock_plist,
+    ):
+        assert main() == 0
+
+    called = mock_plist if backend == "plist" else mock_dock
+    called.assert_called_once_with([], prune=True, retired=[], metadata=ANY)
+
+
+def test_main_sync_prune_dock_keeps_unchanged_pairs(
+    make_app: Callable[..., Path], tmp_path: Path
+) -> None:
+    """Test the Dock sees every pair's trampolines and only apps that left are retired."""
+    alpha = make_app("Alpha.app", tmp_path / "srcA")
+    _ = make_app("Beta.app", tmp_path / "srcB")
+    gamma = make_app("Gamma.app", tmp_path / "srcB")
+    dirs = [str(tmp_path / name) for name in ("srcA", "dstA", "srcB", "dstB")]
+    argv = ["nix-spotlight", "sync", "--prune-dock", *dirs]
+    with (
+        patch.object(sys, "argv", argv),
+        patch("nix_spotlight.dock.sync_dock", return_value=DockSyncResult()),
+    ):
+        assert main() == 0
+
+    shutil.rmtree(gamma)
+    with (
+        patch.object(sys, "argv", argv),
+        patch("nix_spotlight.dock.sync_dock", return_value=DockSyncResult()) as mock_dock,
+    ):
+        assert main() == 0
+
+    mock_dock.assert_called_once_with(
+        [tmp_path / "dstA" / "Alpha.app", tmp_path / "dstB" / "Beta.app"],
+        prune=True,
+        retired=[str(gamma.resolve())],
+        metadata=ANY,
+    )
+    assert (tmp_path / "dstA" / "Alpha.app" / "Contents").readlink() == alpha / "Contents"
+
+
+@dataclass
+class _Spawned:
+    """A detached process the CLI asked to start."""
+
+    command: list[str]
+    kwargs: dict[str, object] = field(default_factory=dict)
+    pid: int = 42
+
+
+def _spawn_into(spawned: list[_Spawned]) -> Callable[..., _Spawned]:
+    """Return a stand-in for subprocess.Popen that records each process."""
+
+    def popen(command: list[str], **kwargs: object) -> _Spawned:
+        spawned.append(_Spawned(command, kwargs))
+        return spawned[-1]
+
+    return popen
+
+
+def test_main_sync_deadline_defers_dock(
+    tmp_path: Path, capsys: pytest.CaptureFixture[str], monkeypatch: pytest.MonkeyPatch
+) -> None:
+    """Test Dock work cut short by --deadline is finished by one background run."""
+    from nix_spotlight.deadline import remaining
+
+    source = tmp_path / "source"
+    source.mkdir()
+    budgets: list[float | None] = []
+    spawned: list[_Spawned] = []
+
+    def timed_out_dock(_apps: list[Path], **_kwargs: object) -> DockSyncResult:
+        budgets.append(remaining())
+        return DockSyncResult(errors=("dockutil --add timed out after 1.0s",), timed_out=True)
+
+    monkeypatch.setenv("XDG_CACHE_HOME", str(tmp_path / "cache"))
+    installed = str(tmp_path / "bin" / "nix-spotlight")
+    argv = ["nix-spotlight", "sync", "--deadline", "5", str(source), str(tmp_path / "target")]
+    with (
+        patch.object(sys, "argv", argv),
+        patch("nix_spotlight.dock.sync_dock", side_effect=timed_out_dock),
+        patch("shutil.which", return_value=installed),
+        patch("subprocess.Popen", _spawn_into(spawned)),
+    ):
+        assert main() == 0
+        with patch.object(sys, "argv", [*argv, "--force", "--follow-up"]):
+            assert main() == 0
+
+    assert len(spawned) == 1
+    command = spawned[0].command
+    assert command == [installed, *argv[1:], "--force", "--follow-up", "--deadline", "300.0"]
+    assert spawned[0].kwargs["start_new_session"]
+    log_path = tmp_path / "cache" / "nix-spotlight" / "follow-up.log"
+    log = spawned[0].kwargs["stdout"]
+    assert isinstance(log, io.BufferedWriter)
+    assert log.name == str(log_path)
+    assert log_path.exists()
+    limit = 5.0
+    assert all(budget is not None and 0 < budget <= limit for budget in budgets)
+    err = capsys.readouterr().err
+    assert "warning: dockutil --add timed out after 1.0s" in err
+    assert f"finishing it in process 42 (log: {log_path})" in err
+    assert "ran out of time again; not retrying" in err
+
+
+def _follow_up_command(tmp_path: Path, script: str, installed: str | None) -> list[str]:
+    """Return the command a deadline-cut sync run as script starts to finish the Dock."""
+    source = tmp_path / "source"
+    source.mkdir(exist_ok=True)
+    timed_out = DockSyncResult(errors=("dockutil --add timed out after 1.0s",), timed_out=True)
+    spawned: list[_Spawned] = []
+    argv = [script, "sync", "--deadline", "5", str(source), str(tmp_path / "target")]
+    with (
+        patch.object(sys, "argv", argv),
+        patch("nix_spotlight.dock.sync_dock", return_value=timed_out),
+        patch("shutil.which", return_value=installed),
+        patch("subprocess.Popen", _spawn_into(spawned)),
+    ):
+        assert main() == 0
+    return spawned[0].command
+
+
+def test_follow_up_prefers_installed_script(tmp_path: Path) -> None:
+    """Test follow-up runs re-exec the running script, then the one on PATH, then -m."""
+    script = tmp_path / "nix-spotlight"
+    _ = script.write_text("")
+    installed = "/run/current-system/sw/bin/nix-spotlight"
+    module = [sys.executable, "-m", "nix_spotlight"]
+
+    assert _follow_up_command(tmp_path, str(script), installed)[0] == str(script)
+    assert _follow_up_command(tmp_path, str(tmp_path / "__main__.py"), installed)[0] == installed
+    assert _follow_up_command(tmp_path, "nix-spotlight", None)[:3] == module
+
+
+def test_main_sync_restarts_dock_left_pending(
+    tmp_path: Path, capsys: pytest.CaptureFixture[str]
+) -> None:
+    """Test the run after one cut off before the Dock restart restarts it with nothing to change."""
+    source = tmp_path / "source"
+    source.mkdir()
+    marker = tmp_path / "cache" / "nix-spotlight" / "dock-restart-pending"
+    argv = ["nix-spotlight", "sync", "--deadline", "5", str(source), str(tmp_path / "target")]
+    cut_off = DockSyncResult(
+        updated=1,
+        errors=("killall Dock timed out after 1.0s",),
+        timed_out=True,
+        restart_pending=True,
+    )
+    restarted = DockSyncResult(spawned=1, restarts=1)
+    spawned: list[_Spawned] = []
+
+    with (
+        patch.object(sys, "argv", argv),
+        patch("nix_spotlight.dock.sync_dock", return_value=cut_off),
+        patch("subprocess.Popen", _spawn_into(spawned)),
+    ):
+        assert main() == 0
+    assert marker.exists()
+    assert len(spawned) == 1
+
+    with (
+        patch.object(sys, "argv", [*argv, "--force", "--follow-up"]),
+        patch("nix_spotlight.dock.sync_dock", return_value=DockSyncResult()),
+        patch("nix_spotlight.dock.restart_dock", return_value=restarted) as mock_restart,
+    ):
+        assert main() == 0
+        assert main() == 0
+
+    mock_restart.assert_called_once_with()
+    assert not marker.exists()
+    assert "warning: killall Dock timed out after 1.0s" in capsys.readouterr().err
+
+
+def test_main_sync_gives_up_on_locks_at_deadline(
+    tmp_path: Path, capsys: pytest.CaptureFixture[str]
+) -> None:
+    """Test --deadline bounds waiting for the target and Dock locks held by another run."""
+    from nix_spotlight.lock import dock_lock, target_lock
+
+    source = tmp_path / "source"
+    source.mkdir()
+    target = tmp_path / "target"
+    argv = ["nix-spotlight", "sync", "--deadline", "0.1", str(source), str(target)]
+    spawned: list[_Spawned] = []
+
+    with patch.object(sys, "argv", [*argv, "--no-dock"]), target_lock(target):
+        assert main() == 1
+    with (
+        patch.object(sys, "argv", argv),
+        patch("nix_spotlight.dock.sync_dock") as mock_dock,
+        patch("subprocess.Popen", _spawn_into(spawned)),
+        dock_lock(),
+    ):
+        assert main() == 0
+
+    mock_dock.assert_not_called()
+    assert len(spawned) == 1
+    err = capsys.readouterr().err
+    assert f"error: Timed out waiting for the lock {tmp_path / '.target.lock'}" in err
+    assert "warning: Timed out waiting for the lock" in err
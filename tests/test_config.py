@@ -0,0 +1,63 @@
+"""Tests for config module."""
+
+import json
+from pathlib import Path
+
+import pytest
+
+from nix_spotlight.config import ConfigError, load_pairs
+
+
+def test_load_pairs_json(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> None:
+    """Test JSON configs load in order with variables expanded."""
+    monkeypatch.setenv("HOME", str(tmp_path))
+    config = tmp_path / "pairs.json"
+    _ = config.write_text(
+        json.dumps(
+            {
+                "pairs": [
+                    {"source": "/Applications/Nix Apps", "target": "/Applications/Nix Trampolines"},
+                    {"source": "$HOME/Apps", "target": "~/Trampolines"},
+                ]
+            }
+        )
+    )
+
+    assert load_pairs(config) == [
+        (Path("/Applications/Nix Apps"), Path("/Applications/Nix Trampolines")),
+        (tmp_path / "Apps", tmp_path / "Trampolines"),
+    ]
+
+
+def test_load_pairs_toml(tmp_path: Path) -> None:
+    """Test TOML configs are recognised by their suffix."""
+    config = tmp_path / "pairs.toml"
+    _ = config.write_text('[[pairs]]\nsource = "/a"\ntarget = "/b"\n')
+
+    assert load_pairs(config) == [(Path("/a"), Path("/b"))]
+
+
+@pytest.mark.parametrize(
+    ("content", "message"),
+    [
+        ("{not json", "invalid config"),
+        ("[]", "expected a 'pairs' array"),
+        ('{"pairs": {}}', "expected a 'pairs' array"),
+        ('{"pairs": ["/a"]}', r"pairs\[0\] needs"),
+        ('{"pairs": [{"source": "/a"}]}', r"pairs\[0\] needs"),
+        ('{"pairs": [{"source": "/a", "target": 1}]}', r"pairs\[0\] needs"),
+    ],
+)
+def test_load_pairs_invalid(tmp_path: Path, content: str, message: str) -> None:
+    """Test malformed configs raise ConfigError naming the problem."""
+    config = tmp_path / "pairs.json"
+    _ = config.write_text(content)
+
+    with pytest.raises(ConfigError, match=message):
+        _ = load_pairs(config)
+
+
+def test_load_pairs_missing(tmp_path: Path) -> None:
+    """Test an unreadable config raises ConfigError."""
+    with pytest.raises(ConfigError, match="invalid config"):
+        _ = load_pairs(tmp_path / "missing.toml")
@@ -0,0 +1,26 @@
+"""Tests for deadline module."""
+
+import time
+
+from nix_spotlight.deadline import deadline, remaining
+
+
+def test_no_deadline() -> None:
+    """Test there is no limit outside a budget or with a None budget."""
+    assert remaining() is None
+    with deadline(None):
+        assert remaining() is None
+
+
+def test_deadline_counts_down() -> None:
+    """Test the remaining budget shrinks, stops at zero and is restored after the block."""
+    budget = 10.0
+    with deadline(budget):
+        left = remaining()
+        assert left is not None
+        assert 0 < left <= budget
+        with deadline(0.01):
+            time.sleep(0.02)
+            assert remaining() == 0
+        assert remaining() is not None
+    assert remaining() is None
@@ -1,9 +1,23 @@
 """Tests for dock module."""
 
+import plistlib
+import subprocess
+from collections.abc import Callable
 from pathlib import Path
+from typing import cast
 from unittest.mock import MagicMock, patch
 
-from nix_spotlight.dock import sync_dock
+from nix_spotlight.deadline import deadline
+from nix_spotlight.dock import (
+    plan_dock,
+    restart_dock,
+    sync_dock,
+    sync_dock_plist,
+    update_dock,
+)
+from nix_spotlight.metadata import MetadataCache
+from nix_spotlight.trampoline import create_trampoline
+from nix_spotlight.types import App, DockSyncResult
 
 
 def test_sync_dock_no_dockutil(tmp_path: Path) -> None:
@@ -102,8 +116,12 @@ def test_sync_dock_updates_matching_items(tmp_path: Path) -> None:
     assert result.updated == 1
     assert result.skipped == 0
     assert result.errors == ()
-    expected_calls = 1 + 1  # list + add
+    expected_calls = 1 + 1 + 1  # list + add + restart
     assert len(calls) == expected_calls
+    assert result.spawned == expected_calls
+    assert result.restarts == 1
+    assert calls[1][-1] == "--no-restart"
+    assert calls[2] == ["killall", "Dock"]
 
 
 def test_sync_dock_skips_unmatched_nix_items(tmp_path: Path) -> None:
@@ -154,6 +172,87 @@ def test_sync_dock_reports_add_errors(tmp_path: Path) -> None:
     assert result.updated == 0
     assert len(result.errors) == 1
     assert "Failed to update MyApp" in result.errors[0]
+    assert result.restarts == 0
+
+
+def test_sync_dock_batches_updates_with_one_restart(tmp_path: Path) -> None:
+    """Test several updates share a single Dock restart."""
+    apps = [tmp_path / "A.app", tmp_path / "B.app", tmp_path / "C.app"]
+    for app in apps:
+        app.mkdir()
+
+    mock_list_result = MagicMock(returncode=0)
+    mock_list_result.stdout = "\n".join(
+        f"{app.stem}\tfile:///nix/store/abc-{app.stem}/Applications/{app.name}/\tpersistentApps"
+        for app in apps
+    )
+    calls: list[list[str]] = []
+
+    def mock_run(cmd: list[str], **_kwargs: object) -> MagicMock:
+        calls.append(cmd)
+        if "-L" in cmd:
+            return mock_list_result
+        return MagicMock(returncode=0, stderr="")
+
+    with (
+        patch("shutil.which", return_value="/usr/bin/dockutil"),
+        patch("subprocess.run", side_effect=mock_run),
+    ):
+        result = sync_dock(apps)
+
+    assert result.updated == len(apps)
+    assert result.restarts == 1
+    assert result.spawned == len(calls) == len(apps) + 2
+    assert [cmd for cmd in calls if cmd[0] == "killall"] == [["killall", "Dock"]]
+
+
+def test_sync_dock_skips_current_items(tmp_path: Path) -> None:
+    """Test items already pointing at their trampoline spawn nothing."""
+    app1 = tmp_path / "My App.app"
+    app1.mkdir()
+    app2 = tmp_path / "Other.app"
+    app2.mkdir()
+
+    mock_result = MagicMock(returncode=0)
+    mock_result.stdout = (
+        f"My App\t{app1.resolve().as_uri()}/\tpersistentApps\n"
+        f"Other\t{app2.resolve()}\tpersistentApps"
+    )
+
+    with (
+        patch("shutil.which", return_value="/usr/bin/dockutil"),
+        patch("subprocess.run", return_value=mock_result) as mock_run,
+    ):
+        result = sync_dock([app1, app2])
+
+    assert (result.updated, result.skipped, result.restarts) == (0, 0, 0)
+    assert result.spawned == 1
+    mock_run.assert_called_once()
+
+
+def test_sync_dock_restart_fails(tmp_path: Path) -> None:
+    """Test a failed Dock restart is reported after successful updates."""
+    app1 = tmp_path / "MyApp.app"
+    app1.mkdir()
+
+    mock_list_result = MagicMock(returncode=0)
+    mock_list_result.stdout = "MyApp\tfile:///nix/store/abc/MyApp.app/"
+
+    def mock_run(cmd: list[str], **_kwargs: object) -> MagicMock:
+        if "-L" in cmd:
+            return mock_list_result
+        if cmd[0] == "killall":
+            return MagicMock(returncode=1, stderr="No matching processes")
+        return MagicMock(returncode=0, stderr="")
+
+    with (
+        patch("shutil.which", return_value="/usr/bin/dockutil"),
+        patch("subprocess.run", side_effect=mock_run),
+    ):
+        result = sync_dock([app1])
+
+    assert result.updated == 1
+    assert result.errors == ("Failed to restart Dock: No matching processes",)
 
 
 def test_sync_dock_empty_line(tmp_path: Path) -> None:
@@ -171,3 +270,562 @@ def test_sync_dock_empty_line(tmp_path: Path) -> None:
         result = sync_dock(apps)
 
     assert result.updated == 0
+
+
+def _persistent_apps(plist: bytes) -> list[dict[str, dict[str, dict[str, str]]]]:
+    """Load the persistent-apps items of a Dock plist."""
+    data = cast("dict[str, list[dict[str, dict[str, dict[str, str]]]]]", plistlib.loads(plist))
+    return data["persistent-apps"]
+
+
+def test_sync_dock_plist_updates_matching_items(
+    tmp_path: Path, make_dock_plist: Callable[[list[tuple[str, str]]], Path]
+) -> None:
+    """Test the plist backend rewrites all matches with one write and restart."""
+    apps = [tmp_path / "MyApp.app", tmp_path / "Other.app"]
+    for app in apps:
+        app.mkdir()
+    plist = make_dock_plist(
+        [
+            ("MyApp", "file:///nix/store/abc-myapp/Applications/MyApp.app/"),
+            ("Other", "file:///nix/store/def-other/Applications/Other.app/"),
+            ("Gone", "file:///nix/store/ghi-gone/Applications/Gone.app/"),
+            ("Safari", "file:///Applications/Safari.app/"),
+        ]
+    )
+
+    mock_restart = MagicMock(returncode=0)
+    with patch("subprocess.run", return_value=mock_restart) as mock_run:
+        result = sync_dock_plist(apps, plist)
+
+    expected_updated = 2
+    assert result.updated == expected_updated
+    assert result.skipped == 1
+    assert result.errors == ()
+    assert (result.spawned, result.restarts) == (1, 1)
+    mock_run.assert_called_once()
+    assert mock_run.call_args[0][0] == ["killall", "Dock"]
+
+    assert plist.read_bytes().startswith(b"bplist")
+    tiles = _persistent_apps(plist.read_bytes())
+    assert tiles[0]["tile-data"]["file-data"]["_CFURLString"] == f"{apps[0].as_uri()}/"
+    assert "book" not in tiles[0]["tile-data"]
+    assert "book" in tiles[2]["tile-data"]
+    assert tiles[3]["tile-data"]["file-data"]["_CFURLString"] == "file:///Applications/Safari.app/"
+
+
+def test_sync_dock_plist_no_changes(
+    tmp_path: Path, make_dock_plist: Callable[[list[tuple[str, str]]], Path]
+) -> None:
+    """Test the plist backend leaves the file and Dock alone without matches."""
+    plist = make_dock_plist([("Safari", "file:///Applications/Safari.app/")])
+    before = plist.read_bytes()
+
+    with patch("subprocess.run") as mock_run:
+        result = sync_dock_plist([tmp_path / "MyApp.app"], plist)
+
+    assert result.updated == 0
+    mock_run.assert_not_called()
+    assert plist.read_bytes() == before
+
+
+def test_sync_dock_plist_without_restart(
+    tmp_path: Path, make_dock_plist: Callable[[list[tuple[str, str]]], Path]
+) -> None:
+    """Test the plist backend can skip restarting the Dock."""
+    app = tmp_path / "MyApp.app"
+    app.mkdir()
+    plist = make_dock_plist([("MyApp", "file:///nix/store/abc-myapp/Applications/MyApp.app/")])
+
+    with patch("subprocess.run") as mock_run:
+        result = sync_dock_plist([app], plist, restart=False)
+
+    assert result.updated == 1
+    assert (result.spawned, result.restarts) == (0, 0)
+    mock_run.assert_not_called()
+
+
+def test_sync_dock_plist_restart_fails(
+    tmp_path: Path, make_dock_plist: Callable[[list[tuple[str, str]]], Path]
+) -> None:
+    """Test the plist backend reports a failed Dock restart."""
+    app = tmp_path / "MyApp.app"
+    app.mkdir()
+    plist = make_dock_plist([("MyApp", "file:///nix/store/abc-myapp/Applications/MyApp.app/")])
+
+    mock_restart = MagicMock(returncode=1, stderr="No matching processes")
+    with patch("subprocess.run", return_value=mock_restart):
+        result = sync_dock_plist([app], plist)
+
+    assert result.updated == 1
+    assert result.errors == ("Failed to restart Dock: No matching processes",)
+
+
+def test_sync_dock_plist_unreadable(tmp_path: Path) -> None:
+    """Test the plist backend reports unreadable preferences."""
+    missing = sync_dock_plist([], tmp_path / "missing.plist")
+    garbage = tmp_path / "garbage.plist"
+    _ = garbage.write_bytes(b"not a plist")
+
+    assert missing.errors[0].startswith("Failed to read")
+    assert sync_dock_plist([], garbage).errors[0].startswith("Failed to read")
+
+
+def test_sync_dock_plist_unexpected_layout(tmp_path: Path) -> None:
+    """Test the plist backend ignores preferences it does not understand."""
+    plist = tmp_path / "com.apple.dock.plist"
+    layouts: list[list[object] | dict[str, object]] = [
+        [],
+        {"persistent-apps": {}},
+        {"persistent-apps": ["item", {"tile-data": []}, {"tile-data": {"file-data": []}}]},
+        {"persistent-apps": [{"tile-data": {"file-data": {"_CFURLString": 1}}}]},
+    ]
+    for layout in layouts:
+        _ = plist.write_bytes(plistlib.dumps(layout))
+        result = sync_dock_plist([], plist)
+        assert (result.updated, result.skipped, result.errors) == (0, 0, ())
+
+
+def test_sync_dock_plist_write_fails(
+    tmp_path: Path, make_dock_plist: Callable[[list[tuple[str, str]]], Path]
+) -> None:
+    """Test the plist backend reports a failed write without restarting."""
+    app = tmp_path / "MyApp.app"
+    app.mkdir()
+    plist = make_dock_plist([("MyApp", "file:///nix/store/abc-myapp/Applications/MyApp.app/")])
+
+    with (
+        patch.object(Path, "write_bytes", side_effect=OSError("read-only")),
+        patch("subprocess.run") as mock_run,
+    ):
+        result = sync_dock_plist([app], plist)
+
+    assert result.updated == 0
+    assert result.errors[0].startswith("Failed to write")
+    mock_run.assert_not_called()
+
+
+def test_sync_dock_plist_keeps_xml_format(tmp_path: Path) -> None:
+    """Test the plist backend writes back XML preferences as XML."""
+    app = tmp_path / "MyApp.app"
+    app.mkdir()
+    plist = tmp_path / "com.apple.dock.plist"
+    tile = {
+        "tile-data": {
+            "file-label": "MyApp",
+            "file-data": {"_CFURLString": "file:///nix/store/abc/MyApp.app/"},
+        }
+    }
+    _ = plist.write_bytes(plistlib.dumps({"persistent-apps": [tile]}, fmt=plistlib.FMT_XML))
+
+    result = sync_dock_plist([app], plist, restart=False)
+
+    assert result.updated == 1
+    assert plist.read_bytes().startswith(b"<?xml")
+
+
+def test_plan_dock_and_update_dock(tmp_path: Path) -> None:
+    """Test plan_dock lists replacements that update_dock applies."""
+    app = tmp_path / "MyApp.app"
+    listing = MagicMock(returncode=0, stdout="MyApp\tfile:///nix/store/abc/MyApp.app/\n")
+    failed = MagicMock(returncode=1, stderr="boom")
+
+    with patch("shutil.which", return_value=None):
+        assert plan_dock([app]) == []
+        assert update_dock([("MyApp", str(app))]) == DockSyncResult()
+    with patch("subprocess.run", return_value=failed):
+        assert plan_dock([app], "/bin/dockutil") == []
+    with patch("subprocess.run", return_value=listing):
+        replacements = plan_dock([app], "/bin/dockutil")
+
+    assert replacements == [("MyApp", str(app.resolve()))]
+    assert update_dock([], "/bin/dockutil") == DockSyncResult()
+    with patch("subprocess.run", return_value=failed):
+        result = update_dock(replacements, "/bin/dockutil")
+    assert result.spawned == 1
+    assert result.errors == ("Failed to update MyApp: boom",)
+
+
+def _make_store_app(store: Path, relative: str, identifier: str | None = None) -> Path:
+    """Create a store bundle, with a CFBundleIdentifier if given."""
+    app = store / relative
+    (app / "Contents").mkdir(parents=True)
+    info = {} if identifier is None else {"CFBundleIdentifier": identifier}
+    _ = (app / "Contents" / "Info.plist").write_bytes(plistlib.dumps(info))
+    return app
+
+
+def test_sync_dock_matches_by_identifier_path_and_basename(tmp_path: Path) -> None:
+    """Test renamed apps and apps sharing a display name find their trampoline."""
+    store = tmp_path / "nix" / "store"
+    old = _make_store_app(store, "a-firefox-1/Applications/Firefox.app", "org.mozilla.firefox")
+    new = _make_store_app(
+        store, "b-firefox-2/Applications/Firefox Browser.app", "org.mozilla.firefox"
+    )
+    term1 = _make_store_app(store, "c-term/Applications/Term.app", "one.term")
+    term2 = _make_store_app(store, "d-term/Applications/Term.app", "two.term")
+    old_term2 = _make_store_app(store, "h-term/Applications/Term.app", "two.term")
+    tool = _make_store_app(store, "e-tool/Applications/Tool.app")
+    first, second = tmp_path / "first", tmp_path / "second"
+    apps = [
+        create_trampoline(App(new), first),
+        create_trampoline(App(term1), first),
+        create_trampoline(App(tool), first),
+        create_trampoline(App(term2), second),
+    ]
+    listing = MagicMock(returncode=0)
+    listing.stdout = (
+        f"Firefox\t{old.as_uri()}/\tpersistentApps\n"
+        f"Term\t{term2}\tpersistentApps\n"
+        f"Term 2\t{old_term2}\tpersistentApps\n"
+        f"Old Tool\t{store}/f-tool/Applications/Tool.app\tpersistentApps\n"
+        f"Missing\t{store}/g-missing/Applications/Missing.app\tpersistentApps\n"
+    )
+
+    with patch("subprocess.run", return_value=listing):
+        replacements = plan_dock(apps, "/bin/dockutil")
+
+    assert replacements == [
+        ("Firefox", str(first / "Firefox Browser.app")),
+        ("Term", str(second / "Term.app")),
+        ("Term 2", str(second / "Term.app")),
+        ("Old Tool", str(first / "Tool.app")),
+    ]
+
+
+def test_sync_dock_index_reads_plists_only_when_needed(tmp_path: Path) -> None:
+    """Test items found by their store path read no Info.plist."""
+    store = tmp_path / "nix" / "store"
+    app = _make_store_app(store, "a-term/Applications/Term.app", "one.term")
+    apps = [create_trampoline(App(app), tmp_path / "target")]
+    listing = MagicMock(returncode=0, stdout=f"Term\t{app}\n")
+
+    with (
+        patch("subprocess.run", return_value=listing),
+        patch("nix_spotlight.dock.read_metadata") as mock_read,
+    ):
+        replacements = plan_dock(apps, "/bin/dockutil")
+
+    mock_read.assert_not_called()
+    assert replacements == [("Term", str(apps[0]))]
+
+
+def test_sync_dock_routes_shared_labels_to_plist(
+    tmp_path: Path, make_dock_plist: Callable[[list[tuple[str, str]]], Path]
+) -> None:
+    """Test items dockutil cannot tell apart by label are updated through the plist."""
+    store = tmp_path / "nix" / "store"
+    term1 = _make_store_app(store, "c-term/Applications/Term.app", "one.term")
+    term2 = _make_store_app(store, "d-term/Applications/Term.app", "two.term")
+    old_term1 = _make_store_app(store, "g-term/Applications/Term.app", "one.term")
+    old_term2 = _make_store_app(store, "h-term/Applications/Term.app", "two.term")
+    apps = [
+        create_trampoline(App(term1), tmp_path / "first"),
+        create_trampoline(App(term2), tmp_path / "second"),
+    ]
+    plist = make_dock_plist(
+        [("Term", f"{old_term1.as_uri()}/"), ("Term", f"{old_term2.as_uri()}/")]
+    )
+    listing = MagicMock(returncode=0)
+    listing.stdout = f"Term\t{old_term1}\tpersistentApps\nTerm\t{old_term2}\tpersistentApps\n"
+    calls: list[list[str]] = []
+    imported: list[object] = []
+
+    def mock_run(cmd: list[str], **kwargs: object) -> MagicMock:
+        calls.append(cmd)
+        imported.append(kwargs["input"])
+        if "-L" in cmd:
+            return listing
+        return MagicMock(returncode=0, stdout=_exported(plist))
+
+    with patch("subprocess.run", side_effect=mock_run):
+        result = sync_dock(apps, "/bin/dockutil")
+
+    updated = 2
+    spawned = 4
+    assert (result.updated, result.spawned, result.restarts) == (updated, spawned, 1)
+    assert calls == [
+        ["/bin/dockutil", "-L"],
+        ["defaults", "export", "com.apple.dock", "-"],
+        ["defaults", "import", "com.apple.dock", "-"],
+        ["killall", "Dock"],
+    ]
+    assert isinstance(imported[2], str)
+    tiles = _persistent_apps(imported[2].encode())
+    urls = [tile["tile-data"]["file-data"]["_CFURLString"] for tile in tiles[:2]]
+    assert urls == [f"{apps[0].resolve().as_uri()}/", f"{apps[1].resolve().as_uri()}/"]
+
+
+def _exported(plist: Path) -> str:
+    """Return a Dock plist as defaults export prints it."""
+    data = cast("dict[str, object]", plistlib.loads(plist.read_bytes()))
+    return plistlib.dumps(data).decode()
+
+
+def test_sync_dock_plist_reports_defaults_failures(
+    tmp_path: Path, make_dock_plist: Callable[[list[tuple[str, str]]], Path]
+) -> None:
+    """Test failed defaults exports and imports leave the Dock alone, and timeouts are reported.
+
+    An import that timed out may still have changed the preferences, so the
+    restart is left pending.
+    """
+    app = tmp_path / "MyApp.app"
+    app.mkdir()
+    exported = _exported(
+        make_dock_plist([("MyApp", "file:///nix/store/abc-myapp/Applications/MyApp.app/")])
+    )
+
+    def defaults(export: MagicMock | Exception, imported: MagicMock | Exception) -> DockSyncResult:
+        def mock_run(cmd: list[str], **_kwargs: object) -> MagicMock:
+            outcome = export if "export" in cmd else imported
+            if isinstance(outcome, Exception):
+                raise outcome
+            return outcome
+
+        with patch("subprocess.run", side_effect=mock_run):
+            return sync_dock_plist([app])
+
+    ok = MagicMock(returncode=0, stdout=exported)
+    failed = MagicMock(returncode=1, stderr="No such domain\n")
+    timeout = subprocess.TimeoutExpired(["defaults"], 1.0)
+
+    assert defaults(failed, ok) == DockSyncResult(
+        spawned=1, errors=("Failed to read com.apple.dock: No such domain",)
+    )
+    assert defaults(timeout, ok) == DockSyncResult(
+        errors=("defaults export timed out after 1.0s",), timed_out=True
+    )
+    assert defaults(ok, failed) == DockSyncResult(
+        spawned=2, errors=("Failed to write com.apple.dock: No such domain",)
+    )
+    assert defaults(ok, timeout) == DockSyncResult(
+        spawned=1,
+        errors=("defaults import timed out after 1.0s",),
+        timed_out=True,
+        restart_pending=True,
+    )
+    empty = MagicMock(returncode=0, stdout=plistlib.dumps({}).decode())
+    assert defaults(empty, failed) == DockSyncResult(spawned=1)
+
+
+def test_update_dock_leaves_shared_names_alone(tmp_path: Path) -> None:
+    """Test update_dock reports names it cannot address instead of updating one tile twice."""
+    first, second = tmp_path / "first" / "Term.app", tmp_path / "second" / "Term.app"
+    done = MagicMock(returncode=0, stderr="")
+
+    with patch("subprocess.run", return_value=done) as mock_run:
+        result = update_dock(
+            [("Term", str(first)), ("Term", str(second)), ("Tool", str(first))], "/bin/dockutil"
+        )
+
+    assert (result.updated, result.skipped) == (1, 2)
+    assert result.errors == ("Dock items sharing the name Term left alone",)
+    assert [call.args[0][1:3] for call in mock_run.call_args_list] == [
+        ["--add", str(first)],
+        ["Dock"],
+    ]
+
+
+def test_dock_index_reads_identifiers_through_cache(tmp_path: Path) -> None:
+    """Test identifier lookups go through the metadata cache and hit it on the next sync."""
+    store = tmp_path / "nix" / "store"
+    old = _make_store_app(store, "a-firefox-1/Applications/Firefox.app", "org.mozilla.firefox")
+    new = _make_store_app(store, "b-firefox-2/Applications/Browser.app", "org.mozilla.firefox")
+    apps = [create_trampoline(App(new), tmp_path / "target")]
+    listing = MagicMock(returncode=0, stdout=f"Firefox\t{old.as_uri()}/\n")
+    cache_path = tmp_path / "cache.json"
+    cache = MetadataCache(cache_path, store_dir=str(store))
+
+    with patch("subprocess.run", return_value=listing):
+        assert plan_dock(apps, "/bin/dockutil", metadata=cache) == [("Firefox", str(apps[0]))]
+    cache.save()
+
+    assert len(cache) == len([old, new])
+    with (
+        patch("subprocess.run", return_value=listing),
+        patch("nix_spotlight.metadata.read_metadata") as mock_read,
+    ):
+        replacements = plan_dock(
+            apps, "/bin/dockutil", metadata=MetadataCache(cache_path, store_dir=str(store))
+        )
+    mock_read.assert_not_called()
+    assert replacements == [("Firefox", str(apps[0]))]
+
+
+def test_sync_dock_prunes_stale_items(tmp_path: Path) -> None:
+    """Test pruning removes unmatched store items with the updates and one restart."""
+    app = tmp_path / "MyApp.app"
+    app.mkdir()
+    listing = MagicMock(returncode=0)
+    listing.stdout = (
+        "MyApp\tfile:///nix/store/abc-myapp/Applications/MyApp.app/\tpersistentApps\n"
+        "Gone\tfile:///nix/store/def-gone/Applications/Gone.app/\tpersistentApps\n"
+        "Stuck\tfile:///nix/store/ghi-stuck/Applications/Stuck.app/\tpersistentApps\n"
+        "Safari\tfile:///Applications/Safari.app/\tpersistentApps\n"
+    )
+    calls: list[list[str]] = []
+
+    def mock_run(cmd: list[str], **_kwargs: object) -> MagicMock:
+        calls.append(cmd)
+        if "-L" in cmd:
+            return listing
+        return MagicMock(returncode=int("Stuck" in cmd), stderr="busy")
+
+    with patch("subprocess.run", side_effect=mock_run):
+        result = sync_dock([app], "/bin/dockutil", prune=True)
+
+    assert (result.updated, result.skipped, result.removed, result.restarts) == (1, 0, 1, 1)
+    assert result.errors == ("Failed to remove Stuck: busy",)
+    assert [cmd[1:3] for cmd in calls[1:4]] == [
+        ["--remove", "Gone"],
+        ["--remove", "Stuck"],
+        ["--add", str(app.resolve())],
+    ]
+    assert calls[4:] == [["killall", "Dock"]]
+
+
+def test_sync_dock_prune_alone_restarts_once(tmp_path: Path) -> None:
+    """Test a prune without updates still restarts the Dock once."""
+    listing = MagicMock(returncode=0, stdout="Gone\t/nix/store/def-gone/Applications/Gone.app\n")
+    done = MagicMock(returncode=0, stderr="")
+
+    with patch("subprocess.run", side_effect=[listing, done, done]) as mock_run:
+        result = sync_dock([tmp_path / "MyApp.app"], "/bin/dockutil", prune=True)
+
+    assert (result.updated, result.removed, result.restarts, result.spawned) == (0, 1, 1, 3)
+    assert mock_run.call_args[0][0] == ["killall", "Dock"]
+
+
+def test_sync_dock_plist_prunes_stale_items(
+    tmp_path: Path, make_dock_plist: Callable[[list[tuple[str, str]]], Path]
+) -> None:
+    """Test the plist backend drops unmatched store items in the same write."""
+    plist = make_dock_plist(
+        [
+            ("Gone", "file:///nix/store/ghi-gone/Applications/Gone.app/"),
+            ("Safari", "file:///Applications/Safari.app/"),
+        ]
+    )
+
+    with patch("subprocess.run", return_value=MagicMock(returncode=0)) as mock_run:
+        result = sync_dock_plist([tmp_path / "MyApp.app"], plist, prune=True)
+
+    assert (result.updated, result.skipped, result.removed, result.restarts) == (0, 0, 1, 1)
+    mock_run.assert_called_once()
+    labels = [tile["tile-data"].get("file-label") for tile in _persistent_apps(plist.read_bytes())]
+    assert "Gone" not in labels
+    assert "Safari" in labels
+
+
+def test_prune_keeps_live_unmatched_items(
+    tmp_path: Path, make_dock_plist: Callable[[list[tuple[str, str]]], Path]
+) -> None:
+    """Test only collected or retired apps are pruned, not apps merely unmatched."""
+    store = tmp_path / "nix" / "store"
+    live = _make_store_app(store, "a-live/Applications/Live.app")
+    retired = _make_store_app(store, "b-retired/Applications/Retired.app")
+    gone = store / "c-gone" / "Applications" / "Gone.app"
+    items = [("Live", live), ("Retired", retired), ("Gone", gone)]
+    listing = MagicMock(returncode=0)
+    listing.stdout = "".join(f"{label}\t{path}\tpersistentApps\n" for label, path in items)
+    done = MagicMock(returncode=0, stderr="")
+    plist = make_dock_plist([(label, f"{path.as_uri()}/") for label, path in items])
+
+    with patch("subprocess.run", side_effect=[listing, done, done, done]) as mock_run:
+        result = sync_dock([], "/bin/dockutil", prune=True, retired=[str(retired)])
+    with patch("subprocess.run", return_value=done):
+        plist_result = sync_dock_plist([], plist, prune=True, retired=[str(retired)])
+
+    removals = [call.args[0][2] for call in mock_run.call_args_list if "--remove" in call.args[0]]
+    assert removals == ["Retired", "Gone"]
+    assert (
+        (result.removed, result.skipped) == (plist_result.removed, plist_result.skipped) == (2, 1)
+    )
+    labels = [tile["tile-data"].get("file-label") for tile in _persistent_apps(plist.read_bytes())]
+    assert labels == ["Live", None]
+
+
+def test_sync_dock_stops_at_deadline(tmp_path: Path) -> None:
+    """Test Dock commands get the remaining budget and a timeout leaves the rest undone."""
+    apps = [tmp_path / "A.app", tmp_path / "B.app"]
+    listing = MagicMock(returncode=0)
+    listing.stdout = "\n".join(f"{app.stem}\t/nix/store/x-{app.stem}/{app.name}" for app in apps)
+    timeouts: list[object] = []
+
+    def mock_run(cmd: list[str], **kwargs: object) -> MagicMock:
+        timeouts.append(kwargs["timeout"])
+        if "--add" in cmd:
+            raise subprocess.TimeoutExpired(cmd, 2.0)
+        return listing
+
+    budget = 10.0
+    with deadline(budget), patch("subprocess.run", side_effect=mock_run):
+        result = sync_dock(apps, "/bin/dockutil")
+
+    assert result.timed_out
+    assert result.errors == ("dockutil --add timed out after 2.0s",)
+    assert (result.updated, result.restarts) == (0, 0)
+    expected_calls = 2  # list + first add
+    assert len(timeouts) == expected_calls
+    assert all(isinstance(t, float) and 0 < t <= budget for t in timeouts)
+
+
+def test_sync_dock_leaves_restart_pending(tmp_path: Path) -> None:
+    """Test items changed before the deadline ran out leave the Dock restart pending."""
+    apps = [tmp_path / "A.app", tmp_path / "B.app"]
+    listing = MagicMock(returncode=0)
+    listing.stdout = "\n".join(f"{app.stem}\t/nix/store/x-{app.stem}/{app.name}" for app in apps)
+    outcomes: list[MagicMock | Exception] = [
+        listing,
+        MagicMock(returncode=0),
+        subprocess.TimeoutExpired(["dockutil"], 2.0),
+    ]
+
+    def mock_run(_cmd: list[str], **_kwargs: object) -> MagicMock:
+        outcome = outcomes.pop(0)
+        if isinstance(outcome, Exception):
+            raise outcome
+        return outcome
+
+    with patch("subprocess.run", side_effect=mock_run):
+        result = sync_dock(apps, "/bin/dockutil")
+
+    assert (result.updated, result.restarts, result.timed_out) == (1, 0, True)
+    assert result.restart_pending
+
+
+def test_restart_dock() -> None:
+    """Test a standalone restart reports failures and leaves itself pending past the deadline."""
+    with patch("subprocess.run", return_value=MagicMock(returncode=1, stderr="no Dock")):
+        assert restart_dock() == DockSyncResult(
+            spawned=1, restarts=1, errors=("Failed to restart Dock: no Dock",)
+        )
+    with deadline(0), patch("subprocess.run") as mock_run:
+        assert restart_dock() == DockSyncResult(
+            errors=("killall Dock skipped: deadline reached",), timed_out=True, restart_pending=True
+        )
+    mock_run.assert_not_called()
+
+
+def test_dock_skips_commands_past_deadline(
+    tmp_path: Path, make_dock_plist: Callable[[list[tuple[str, str]]], Path]
+) -> None:
+    """Test nothing is spawned once the budget is spent."""
+    app = tmp_path / "MyApp.app"
+    app.mkdir()
+    plist = make_dock_plist([("MyApp", "file:///nix/store/abc-myapp/Applications/MyApp.app/")])
+
+    with deadline(0), patch("subprocess.run") as mock_run:
+        listed = sync_dock([app], "/bin/dockutil")
+        planned = plan_dock([app], "/bin/dockutil")
+        rewritten = sync_dock_plist([app], plist)
+
+    mock_run.assert_not_called()
+    assert listed == DockSyncResult(
+        errors=("dockutil -L skipped: deadline reached",), timed_out=True
+    )
+    assert planned == []
+    assert (rewritten.updated, rewritten.restarts, rewritten.timed_out) == (1, 0, True)
+    assert rewritten.restart_pending
+    assert rewritten.errors == ("killall Dock skipped: deadline reached",)
@@ -0,0 +1,106 @@
+"""Tests for the package namespace and its import cost."""
+
+import json
+import subprocess
+import sys
+import tomllib
+from pathlib import Path
+from typing import cast
+
+import pytest
+
+import nix_spotlight
+from nix_spotlight.manifest import DEFAULT_MAX_DEPTH
+from nix_spotlight.trampoline import sync_trampolines
+
+PYPROJECT = Path(__file__).parent.parent / "pyproject.toml"
+
+# Modules that --version and an up-to-date sync must not load
+HEAVY_MODULES = (
+    "concurrent.futures",
+    "importlib.metadata",
+    "subprocess",
+    "nix_spotlight.dock",
+    "nix_spotlight.trampoline",
+    "nix_spotlight.watch",
+)
+
+
+def _loaded_after(code: str) -> set[str]:
+    """Run code in a fresh interpreter and return the heavy modules it loaded."""
+    loaded = f"' '.join(m for m in {HEAVY_MODULES!r} if m in sys.modules)"
+    probe = f"import sys\n{code}\nprint({loaded}, file=sys.stderr)"
+    result = subprocess.run(
+        [sys.executable, "-c", probe], capture_output=True, text=True, check=True
+    )
+    return set(result.stderr.split())
+
+
+def test_version_matches_pyproject() -> None:
+    """Test the baked-in version matches the project metadata."""
+    with PYPROJECT.open("rb") as f:
+        project = cast("dict[str, object]", tomllib.load(f)["project"])
+    assert nix_spotlight.__version__ == project["version"]
+
+
+def test_lazy_exports() -> None:
+    """Test public names resolve from their submodules on access."""
+    assert nix_spotlight.sync_trampolines is sync_trampolines
+    assert set(nix_spotlight.__all__) <= set(dir(nix_spotlight))
+    with pytest.raises(AttributeError, match="no attribute 'missing'"):
+        _ = nix_spotlight.missing
+
+
+def test_import_is_lazy() -> None:
+    """Test importing the package loads no submodules or subprocess."""
+    assert _loaded_after("import nix_spotlight") == set()
+
+
+def test_cli_version_is_lazy() -> None:
+    """Test --version loads neither importlib.metadata nor the sync modules."""
+    code = (
+        "sys.argv = ['nix-spotlight', '--version']\n"
+        "from nix_spotlight.__main__ import main\n"
+        "try:\n    main()\nexcept SystemExit:\n    pass"
+    )
+    assert _loaded_after(code) == set()
+
+
+def test_cli_noop_sync_is_lazy(tmp_path: Path) -> None:
+    """Test a sync that finds the manifest up to date loads nothing heavy."""
+    source = tmp_path / "source"
+    source.mkdir()
+    target = tmp_path / "target"
+    argv = ["nix-spotlight", "sync", "--no-dock", str(source), str(target)]
+    code = f"sys.argv = {argv!r}\nfrom nix_spotlight.__main__ import main\nmain()"
+
+    assert "nix_spotlight.trampoline" in _loaded_after(code)
+    assert _loaded_after(code) == set()
+
+
+def test_cli_noop_sync_from_manifest_is_lazy(tmp_path: Path) -> None:
+    """Test an up-to-date sync --manifest, as activation runs it, loads nothing heavy."""
+    store = tmp_path / "store"
+    source = store / "abc-apps" / "Applications"
+    source.mkdir(parents=True)
+    catalog = tmp_path / "apps.json"
+    fields = {"version": 1, "root": str(source.resolve()), "max_depth": DEFAULT_MAX_DEPTH}
+    _ = catalog.write_text(json.dumps(fields | {"apps": []}))
+    target = tmp_path / "target"
+    argv = [
+        "nix-spotlight",
+        "sync",
+        "--no-dock",
+        "--manifest",
+        str(catalog),
+        str(source),
+        str(target),
+    ]
+    code = (
+        "import nix_spotlight.metadata\n"
+        f"nix_spotlight.metadata.STORE_DIR = {str(store.resolve())!r}\n"
+        f"sys.argv = {argv!r}\nfrom nix_spotlight.__main__ import main\nmain()"
+    )
+
+    assert "nix_spotlight.trampoline" in _loaded_after(code)
+    assert _loaded_after(code) == set()
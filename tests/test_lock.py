@@ -0,0 +1,75 @@
+"""Tests for lock module."""
+
+import threading
+import time
+from pathlib import Path
+
+import pytest
+
+from nix_spotlight.deadline import deadline
+from nix_spotlight.lock import dock_lock, lock_path, target_lock
+from nix_spotlight.timings import collect
+
+
+def test_target_lock_uncontended(tmp_path: Path) -> None:
+    """Test an uncontended lock is taken at once next to the target."""
+    target = tmp_path / "apps" / "Trampolines"
+
+    with target_lock(target) as waited:
+        assert not waited
+
+    assert lock_path(target) == tmp_path / "apps" / ".Trampolines.lock"
+    assert lock_path(target).is_file()
+    assert not target.exists()
+
+
+def test_target_lock_waits_for_holder(tmp_path: Path) -> None:
+    """Test a second holder waits until the first releases the lock."""
+    target = tmp_path / "Trampolines"
+    events: list[str] = []
+
+    def contend() -> None:
+        with collect() as timings, target_lock(target) as waited:
+            events.append(f"acquired waited={waited}")
+        events.append(f"lock_wait={'lock_wait' in timings.phases}")
+
+    with target_lock(target):
+        thread = threading.Thread(target=contend)
+        thread.start()
+        time.sleep(0.1)
+        events.append("released")
+    thread.join()
+
+    assert events == ["released", "acquired waited=True", "lock_wait=True"]
+
+
+def test_dock_lock_next_to_cache(tmp_path: Path) -> None:
+    """Test the Dock lock is one file shared by all targets, beside the metadata cache."""
+    with dock_lock() as waited:
+        assert not waited
+
+    assert (tmp_path / "cache" / "nix-spotlight" / "dock.lock").is_file()
+
+
+def test_target_lock_waits_within_deadline(tmp_path: Path) -> None:
+    """Test a run under a deadline polls for the lock and gives up when time runs out."""
+    target = tmp_path / "Trampolines"
+    acquired: list[bool] = []
+
+    def contend() -> None:
+        with deadline(5), target_lock(target) as waited:
+            acquired.append(waited)
+
+    with target_lock(target):
+        with (
+            deadline(0.1),
+            pytest.raises(TimeoutError, match="Timed out waiting for the lock"),
+            target_lock(target),
+        ):
+            pass
+        thread = threading.Thread(target=contend)
+        thread.start()
+        time.sleep(0.1)
+    thread.join()
+
+    assert acquired == [True]
@@ -0,0 +1,127 @@
+"""Tests for manifest module."""
+
+import json
+from collections.abc import Callable
+from pathlib import Path
+
+from nix_spotlight.manifest import (
+    MANIFEST_NAME,
+    mark_dock_synced,
+    read_manifest,
+    source_digest,
+    write_manifest,
+)
+from nix_spotlight.trampoline import reconcile_trampolines, sync_trampolines
+
+
+def test_source_digest_stable(make_app: Callable[..., Path], tmp_path: Path) -> None:
+    """Test digest is stable while the source listing is unchanged."""
+    _ = make_app("MyApp.app", tmp_path)
+
+    assert source_digest(tmp_path) == source_digest(tmp_path)
+
+
+def test_source_digest_changes_with_entries(tmp_path: Path) -> None:
+    """Test digest changes when an entry is added or replaced."""
+    link = tmp_path / "MyApp.app"
+    link.symlink_to("/nix/store/aaa-myapp/Applications/MyApp.app")
+    before = source_digest(tmp_path)
+
+    link.unlink()
+    link.symlink_to("/nix/store/bbb-myapp/Applications/MyApp.app")
+    replaced = source_digest(tmp_path)
+
+    (tmp_path / "Other.app").mkdir()
+    added = source_digest(tmp_path)
+
+    assert len({before, replaced, added}) == len((before, replaced, added))
+
+
+def test_source_digest_changes_with_nested_apps(
+    make_app: Callable[..., Path], tmp_path: Path
+) -> None:
+    """Test digest covers every directory discovery enters, and only those."""
+    _ = make_app("Top.app", tmp_path)
+    _ = make_app("A.app", tmp_path / "KDE")
+    (tmp_path / "KDE" / "Extras").mkdir()
+    (tmp_path / "Loop").symlink_to(tmp_path)
+    before = source_digest(tmp_path)
+    flat = source_digest(tmp_path, max_depth=0)
+
+    _ = make_app("B.app", tmp_path / "KDE")
+    added = source_digest(tmp_path)
+    deep = source_digest(tmp_path, max_depth=2)
+
+    _ = make_app("C.app", tmp_path / "KDE" / "Extras")
+    assert source_digest(tmp_path) == added
+    assert source_digest(tmp_path, max_depth=2) != deep
+    assert source_digest(tmp_path, max_depth=0) == flat
+    assert added != before
+
+
+def test_write_and_read_manifest(make_app: Callable[..., Path], tmp_path: Path) -> None:
+    """Test manifest round trip maps apps to resolved bundle paths."""
+    source = tmp_path / "source"
+    app_path = make_app("MyApp.app", source)
+    target = tmp_path / "target"
+    trampolines = sync_trampolines(source, target)
+
+    written = write_manifest(target, "digest", trampolines)
+
+    assert written.apps == {"MyApp.app": str(app_path.resolve())}
+    assert read_manifest(target) == written
+    assert not (target / f"{MANIFEST_NAME}.tmp").exists()
+
+
+def test_mark_dock_synced(make_app: Callable[..., Path], tmp_path: Path) -> None:
+    """Test the Dock is recorded as synced only for the manifest's own digest."""
+    source = tmp_path / "source"
+    _ = make_app("MyApp.app", source)
+    target = tmp_path / "target"
+    written = write_manifest(target, "digest", sync_trampolines(source, target))
+
+    assert not mark_dock_synced(tmp_path, "digest")
+    assert not mark_dock_synced(target, "other")
+    assert read_manifest(target) == written
+    assert not written.dock_synced
+
+    assert mark_dock_synced(target, "digest")
+    assert mark_dock_synced(target, "digest")
+    marked = read_manifest(target)
+    assert marked is not None
+    assert marked.dock_synced
+    assert marked.apps == written.apps
+
+
+def test_read_manifest_missing(tmp_path: Path) -> None:
+    """Test reading a manifest that does not exist."""
+    assert read_manifest(tmp_path) is None
+
+
+def test_read_manifest_invalid(tmp_path: Path) -> None:
+    """Test malformed or outdated manifests are ignored."""
+    path = tmp_path / MANIFEST_NAME
+    invalid = [
+        "not json",
+        json.dumps([]),
+        json.dumps({"version": 0, "digest": "x", "apps": {}}),
+        json.dumps({"version": 2, "digest": 1, "apps": {}}),
+        json.dumps({"version": 2, "digest": "x", "apps": []}),
+    ]
+    for content in invalid:
+        _ = path.write_text(content)
+        assert read_manifest(tmp_path) is None
+
+
+def test_reconcile_keeps_manifest(make_app: Callable[..., Path], tmp_path: Path) -> None:
+    """Test reconcile does not treat the manifest as a stale trampoline."""
+    source = tmp_path / "source"
+    _ = make_app("MyApp.app", source)
+    target = tmp_path / "target"
+    trampolines = sync_trampolines(source, target)
+    _ = write_manifest(target, "digest", trampolines)
+
+    result = reconcile_trampolines(source, target)
+
+    assert result.removed == 0
+    assert (target / MANIFEST_NAME).exists()
@@ -0,0 +1,157 @@
+"""Tests for metadata module."""
+
+import plistlib
+from collections.abc import Mapping
+from pathlib import Path
+
+import pytest
+
+from nix_spotlight.metadata import MetadataCache, default_cache_path, read_metadata
+from nix_spotlight.types import App, AppMetadata
+
+INFO = {
+    "CFBundleIdentifier": "org.example.MyApp",
+    "CFBundleName": "MyApp",
+    "CFBundleShortVersionString": "1.2.3",
+    "CFBundleURLTypes": [
+        {"CFBundleURLSchemes": ["myapp", "myapp-beta", 1]},
+        {"CFBundleURLName": "no schemes"},
+        "garbage",
+    ],
+}
+
+
+def _make_app(parent: Path, name: str, info: Mapping[str, object] | list[object]) -> App:
+    """Create an .app bundle whose Info.plist holds info."""
+    app = parent / name
+    (app / "Contents").mkdir(parents=True)
+    _ = (app / "Contents" / "Info.plist").write_bytes(plistlib.dumps(info))
+    return App(app)
+
+
+def test_read_metadata(tmp_path: Path) -> None:
+    """Test metadata is parsed from Info.plist."""
+    app = _make_app(tmp_path, "MyApp.app", INFO)
+
+    assert read_metadata(app) == AppMetadata(
+        bundle_identifier="org.example.MyApp",
+        bundle_name="MyApp",
+        version="1.2.3",
+        url_schemes=("myapp", "myapp-beta"),
+    )
+
+
+def test_read_metadata_fallbacks(tmp_path: Path) -> None:
+    """Test version falls back to CFBundleVersion and bad values are ignored."""
+    app = _make_app(tmp_path, "MyApp.app", {"CFBundleVersion": "42", "CFBundleName": 1})
+
+    assert read_metadata(app) == AppMetadata(version="42")
+
+
+def test_read_metadata_invalid(tmp_path: Path) -> None:
+    """Test unreadable or unexpected plists give empty metadata."""
+    empty = tmp_path / "Empty.app"
+    (empty / "Contents").mkdir(parents=True)
+    (empty / "Contents" / "Info.plist").touch()
+
+    assert read_metadata(App(tmp_path / "Missing.app")) == AppMetadata()
+    assert read_metadata(App(empty)) == AppMetadata()
+    assert read_metadata(_make_app(tmp_path, "List.app", ["x"])) == AppMetadata()
+
+
+def test_default_cache_path(monkeypatch: pytest.MonkeyPatch, tmp_path: Path) -> None:
+    """Test the cache lives under XDG_CACHE_HOME when set."""
+    monkeypatch.setenv("XDG_CACHE_HOME", str(tmp_path))
+    assert default_cache_path() == tmp_path / "nix-spotlight" / "metadata.json"
+
+    monkeypatch.delenv("XDG_CACHE_HOME")
+    assert default_cache_path() == Path("~/.cache/nix-spotlight/metadata.json").expanduser()
+
+
+def test_cache_store_paths_persist(tmp_path: Path) -> None:
+    """Test store path metadata is cached and survives a reload."""
+    store = tmp_path / "store"
+    app = _make_app(store / "abc-myapp", "MyApp.app", INFO)
+    cache_path = tmp_path / "cache" / "metadata.json"
+
+    cache = MetadataCache(cache_path, store_dir=str(store))
+    first = cache.get(app)
+    assert cache.get(app) is first
+    cache.save()
+
+    app.info_plist.unlink()
+    reloaded = MetadataCache(cache_path, store_dir=str(store))
+    assert len(reloaded) == 1
+    assert reloaded.get(app) == first
+
+
+def test_cache_resolves_symlinks(tmp_path: Path) -> None:
+    """Test apps are keyed by the store path they resolve to."""
+    store = tmp_path / "store"
+    app = _make_app(store / "abc-myapp", "MyApp.app", INFO)
+    link = tmp_path / "MyApp.app"
+    link.symlink_to(app.path)
+
+    cache = MetadataCache(tmp_path / "metadata.json", store_dir=str(store))
+
+    assert cache.get(App(link)).bundle_identifier == "org.example.MyApp"
+    assert cache.get(app) is cache.get(App(link))
+    assert len(cache) == 1
+
+
+def test_cache_skips_mutable_paths(tmp_path: Path) -> None:
+    """Test apps outside the store are parsed on every lookup."""
+    app = _make_app(tmp_path, "MyApp.app", INFO)
+    cache = MetadataCache(tmp_path / "metadata.json", store_dir=str(tmp_path / "store"))
+
+    assert cache.get(app).bundle_name == "MyApp"
+    _ = app.info_plist.write_bytes(plistlib.dumps({"CFBundleName": "Renamed"}))
+    assert cache.get(app).bundle_name == "Renamed"
+    assert len(cache) == 0
+
+
+def test_cache_evicts_collected_paths(tmp_path: Path) -> None:
+    """Test entries for deleted store paths are evicted and saved."""
+    store = tmp_path / "store"
+    kept = _make_app(store / "abc-kept", "Kept.app", INFO)
+    gone = _make_app(store / "def-gone", "Gone.app", INFO)
+    cache_path = tmp_path / "metadata.json"
+    cache = MetadataCache(cache_path, store_dir=str(store))
+    _ = cache.get(kept)
+    _ = cache.get(gone)
+    cache.save()
+
+    gone.info_plist.unlink()
+    gone.contents.rmdir()
+    gone.path.rmdir()
+    reloaded = MetadataCache(cache_path, store_dir=str(store))
+
+    assert reloaded.evict() == 1
+    assert reloaded.evict() == 0
+    reloaded.save()
+    assert len(MetadataCache(cache_path, store_dir=str(store))) == 1
+
+
+def test_cache_save_without_changes(tmp_path: Path) -> None:
+    """Test saving an unchanged cache does not write a file."""
+    cache_path = tmp_path / "metadata.json"
+    MetadataCache(cache_path).save()
+
+    assert not cache_path.exists()
+
+
+def test_cache_ignores_malformed_file(tmp_path: Path) -> None:
+    """Test malformed caches are treated as empty."""
+    cache_path = tmp_path / "metadata.json"
+    contents = [
+        "not json",
+        "[]",
+        '{"version": 0, "entries": {}}',
+        '{"version": 1, "entries": []}',
+    ]
+    for content in contents:
+        _ = cache_path.write_text(content)
+        assert len(MetadataCache(cache_path)) == 0
+
+    _ = cache_path.write_text('{"version": 1, "entries": {"/nix/store/a": 1, "/nix/store/b": {}}}')
+    assert len(MetadataCache(cache_path)) == 1
@@ -0,0 +1,168 @@
+"""Tests for plan module."""
+
+from collections.abc import Callable
+from pathlib import Path
+from unittest.mock import MagicMock, patch
+
+from nix_spotlight.plan import apply, plan
+from nix_spotlight.trampoline import create_trampoline, sync_trampolines
+from nix_spotlight.types import Action, App, Plan
+
+
+def _snapshot(path: Path) -> list[tuple[str, float]]:
+    """Return every path below path with its mtime, without following links."""
+    return sorted((str(p), p.lstat().st_mtime) for p in path.rglob("*"))
+
+
+def test_plan_empty_target(make_app: Callable[..., Path], tmp_path: Path) -> None:
+    """Test a missing target plans creates followed by touches."""
+    source = tmp_path / "source"
+    app = make_app("App.app", source)
+    target = tmp_path / "target"
+
+    result = plan(source, target)
+
+    assert result.actions == (
+        Action("create", "App.app", app / "Contents"),
+        Action("touch", "App.app"),
+    )
+    assert result.trampolines == (target / "App.app",)
+    assert not target.exists()
+
+
+def test_plan_writes_nothing(make_app: Callable[..., Path], tmp_path: Path) -> None:
+    """Test planning against a stale target leaves it untouched."""
+    source = tmp_path / "source"
+    kept = make_app("Kept.app", source)
+    moved = make_app("Moved.app", source)
+    target = tmp_path / "target"
+    _ = sync_trampolines(source, target)
+    (target / "Moved.app" / "Contents").unlink()
+    (target / "Moved.app" / "Contents").symlink_to(tmp_path / "old")
+    (target / "Stale.app").mkdir()
+    plain = make_app("Plain.app", source)
+    (target / "Plain.app" / "Contents").mkdir(parents=True)
+    before = _snapshot(target)
+
+    result = plan(source, target)
+
+    assert _snapshot(target) == before
+    assert [action.describe() for action in result.actions] == [
+        "delete Stale.app",
+        f"repoint Moved.app -> {moved / 'Contents'}",
+        f"repoint Plain.app -> {plain / 'Contents'}",
+        "touch Moved.app",
+        "touch Plain.app",
+    ]
+    assert target / "Kept.app" in result.trampolines
+    assert kept.exists()
+
+
+def test_plan_matches_sync_for_duplicate_names(
+    make_app: Callable[..., Path], tmp_path: Path
+) -> None:
+    """Test the first of two apps sharing a name wins in plans as in syncs."""
+    source = tmp_path / "source"
+    first = make_app("Foo.app", source)
+    _ = make_app("Foo.app", source / "KDE")
+    target = tmp_path / "target"
+
+    assert plan(source, target).actions == (
+        Action("create", "Foo.app", first / "Contents"),
+        Action("touch", "Foo.app"),
+    )
+    _ = sync_trampolines(source, target)
+    after_sync = plan(source, target)
+    _ = apply(after_sync)
+
+    assert after_sync.actions == ()
+    assert after_sync.trampolines == (target / "Foo.app",)
+    assert (target / "Foo.app" / "Contents").readlink() == first / "Contents"
+
+
+def test_apply_carries_out_plan(make_app: Callable[..., Path], tmp_path: Path) -> None:
+    """Test applying a plan makes the target match and a second plan empty."""
+    source = tmp_path / "source"
+    _ = make_app("New.app", source)
+    moved = make_app("Moved.app", source)
+    _ = make_app("Kept.app", source)
+    target = tmp_path / "target"
+    _ = sync_trampolines(source, target)
+    (target / "Moved.app" / "Contents").unlink()
+    (target / "Moved.app" / "Contents").symlink_to(tmp_path / "old")
+    (target / "Stale.app").mkdir()
+    (target / "stale-link").symlink_to(tmp_path)
+    _ = (target / "New.app").rename(target / "Removed.app")
+
+    result, dock = apply(plan(source, target), max_workers=2)
+
+    assert (result.created, result.repointed, result.removed, result.unchanged) == (1, 1, 3, 1)
+    assert result.errors == ()
+    assert dock.updated == 0
+    assert (target / "Moved.app" / "Contents").readlink() == moved / "Contents"
+    assert not (target / "stale-link").exists()
+    assert plan(source, target).actions == ()
+
+
+def test_apply_reports_failures(make_app: Callable[..., Path], tmp_path: Path) -> None:
+    """Test per-entry failures are reported and leave other entries alone."""
+    source = tmp_path / "source"
+    app = make_app("App.app", source)
+    target = tmp_path / "target"
+    (target / "Busy.app").mkdir(parents=True)
+    sync_plan = Plan(
+        source,
+        target,
+        (
+            Action("delete", "Missing.app"),
+            Action("delete", "Busy.app"),
+            Action("create", "App.app", app / "Contents"),
+            Action("create", "Broken.app", tmp_path / "Broken.app" / "Contents"),
+            Action("touch", "App.app"),
+            Action("touch", "Broken.app"),
+            Action("touch", "Untouchable.app"),
+        ),
+        (target / "App.app", target / "Broken.app"),
+    )
+
+    def flaky(app: App, to_dir: Path) -> Path:
+        if app.name == "Broken.app":
+            msg = "boom"
+            raise OSError(msg)
+        return create_trampoline(app, to_dir)
+
+    with (
+        patch("nix_spotlight.plan.create_trampoline", flaky),
+        patch("nix_spotlight.plan.remove_entry", side_effect=OSError("busy")),
+    ):
+        result, _ = apply(sync_plan)
+
+    assert result.trampolines == (target / "App.app",)
+    assert (result.created, result.removed) == (1, 0)
+    missing_error, busy_error, create_error, touch_error = result.errors
+    assert missing_error.startswith("Failed to remove Missing.app")
+    assert busy_error == "Failed to remove Busy.app: busy"
+    assert create_error == "Failed to create trampoline for Broken.app: boom"
+    assert touch_error.startswith("Failed to touch Untouchable.app")
+
+
+def test_plan_and_apply_dock(make_app: Callable[..., Path], tmp_path: Path) -> None:
+    """Test Dock updates are planned from one listing and applied without another."""
+    source = tmp_path / "source"
+    _ = make_app("MyApp.app", source)
+    target = tmp_path / "target"
+    listing = MagicMock(returncode=0, stdout="MyApp\tfile:///nix/store/abc-myapp/MyApp.app/\n")
+    done = MagicMock(returncode=0)
+
+    with patch("subprocess.run", return_value=listing) as mock_run:
+        sync_plan = plan(source, target, dock=True, dockutil_path="/bin/dockutil")
+    mock_run.assert_called_once()
+    resolved = (target / "MyApp.app").resolve()
+    assert sync_plan.actions[-1] == Action("dock", "MyApp", resolved)
+
+    with patch("subprocess.run", return_value=done) as mock_run:
+        _, dock = apply(sync_plan, dockutil_path="/bin/dockutil")
+
+    assert dock.updated == 1
+    assert dock.restarts == 1
+    assert mock_run.call_args_list[0][0][0][:2] == ["/bin/dockutil", "--add"]
@@ -0,0 +1,231 @@
+"""Tests for profiling module."""
+
+import json
+import os
+import pstats
+import shutil
+import subprocess
+import sys
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from pathlib import Path
+from types import CodeType, FunctionType
+from typing import TYPE_CHECKING, cast
+from unittest.mock import patch
+
+import pytest
+
+from nix_spotlight.__main__ import main
+from nix_spotlight.profiling import PROFILE_ENV, TRACE_ENV, trace_calls
+from nix_spotlight.trampoline import sync_trampolines
+from nix_spotlight.types import TracedCall
+
+if TYPE_CHECKING:
+    from collections.abc import Callable
+
+# Module name the fake caller frames below pretend to belong to
+_TRACED = "traced"
+
+
+def _calls_made_here(root: Path) -> None:
+    """Make one of each kind of call the tracer distinguishes."""
+    _ = os.getcwd()  # noqa: PTH109 - the os call is what is traced
+    with pytest.raises(FileNotFoundError):
+        _ = os.stat(root / "missing")  # noqa: PTH116
+    with os.scandir(root) as entries:
+        _ = [entry.is_dir() for entry in entries]
+    _ = (root / "file").exists()
+    _ = subprocess.run(["true"], check=False)  # noqa: S607
+    _ = shutil.get_archive_formats()
+    _ = len(str(root))
+
+
+def test_trace_calls_records_direct_calls(tmp_path: Path) -> None:
+    """Test calls from traced modules are timed with their paths and commands."""
+    trace = tmp_path / "trace.jsonl"
+    (tmp_path / "file").touch()
+
+    with trace_calls(trace, frozenset({__name__})) as calls:
+        _calls_made_here(tmp_path)
+        with ThreadPoolExecutor(max_workers=1, thread_name_prefix="worker") as pool:
+            _ = pool.submit(os.getcwd).result()
+
+    assert sys.getprofile() is None
+    names = [call.call for call in calls]
+    assert names[:3] == ["os.getcwd", "os.stat", "os.scandir"]
+    assert "os.DirEntry.is_dir" in names
+    assert "shutil.get_archive_formats" in names
+    details = {call.call: call.detail for call in calls}
+    assert details["pathlib.Path.exists"] == str(tmp_path / "file")
+    assert details["subprocess.run"] == "true"
+    assert details["shutil.get_archive_formats"] is None
+    assert all(call.caller.startswith(f"{__name__}:") for call in calls)
+    assert all(call.seconds >= 0 for call in calls)
+    lines = [cast("dict[str, object]", json.loads(line)) for line in trace.read_text().splitlines()]
+    assert [line["call"] for line in lines] == names
+
+
+def test_trace_calls_follows_sync_threads(tmp_path: Path) -> None:
+    """Test a threaded sync records its trampoline writes from worker threads."""
+    source = tmp_path / "source"
+    for name in ("A.app", "B.app"):
+        (source / name / "Contents").mkdir(parents=True)
+        (source / name / "Contents" / "Info.plist").touch()
+
+    with trace_calls(tmp_path / "trace.jsonl") as calls:
+        _ = sync_trampolines(source, tmp_path / "target", max_workers=2)
+
+    symlinks = [call for call in calls if call.call == "pathlib.Path.symlink_to"]
+    assert sorted(call.detail or "" for call in symlinks) == [
+        str(tmp_path / "target" / name / "Contents") for name in ("A.app", "B.app")
+    ]
+    assert {call.caller.split(":")[0] for call in calls} == {"nix_spotlight.trampoline"}
+
+
+def test_main_profile_and_trace_from_environment(
+    tmp_path: Path, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    """Test the environment switches on a pstats dump or a call trace of main()."""
+    source = tmp_path / "source"
+    source.mkdir()
+    argv = ["nix-spotlight", "sync", "--no-dock", "--force", str(source), str(tmp_path / "t")]
+    dump = tmp_path / "sync.pstats"
+    trace = tmp_path / "sync.jsonl"
+
+    monkeypatch.setenv(PROFILE_ENV, str(dump))
+    with patch.object(sys, "argv", argv):
+        assert main() == 0
+    monkeypatch.delenv(PROFILE_ENV)
+    monkeypatch.setenv(TRACE_ENV, str(trace))
+    with patch.object(sys, "argv", argv):
+        assert main() == 0
+
+    assert pstats.Stats(str(dump)).get_stats_profile().func_profiles
+    assert any("os.scandir" in line for line in trace.read_text().splitlines())
+
+
+def _no_params() -> None:
+    """Stand in for a function called without named parameters."""
+
+
+def _self(self: object) -> None:
+    """Stand in for a method."""
+    del self
+
+
+def _args(args: object) -> None:
+    """Stand in for a function taking a command."""
+    del args
+
+
+def _cmd(cmd: object) -> None:
+    """Stand in for a function taking a command name."""
+    del cmd
+
+
+def _code(qualname: str, function: FunctionType = _no_params) -> CodeType:
+    """Return the code of function renamed to the given qualified name."""
+    code = function.__code__
+    return code.replace(co_name=qualname.rpartition(".")[2], co_qualname=qualname)
+
+
+@dataclass(eq=False)
+class _Frame:
+    """The parts of a frame the trace hook reads, for calls coverage can follow."""
+
+    module: str | None
+    f_code: CodeType
+    f_locals: dict[str, object] = field(default_factory=dict)
+    f_back: "_Frame | None" = None
+    f_lineno: int = 1
+
+    @property
+    def f_globals(self) -> dict[str, object]:
+        """Return globals naming the frame's module."""
+        return {} if self.module is None else {"__name__": self.module}
+
+
+_CALLER = _Frame(_TRACED, _code("caller"), f_lineno=7)
+
+
+def _replay(events: list[tuple[_Frame, str, object]]) -> list[TracedCall]:
+    """Feed events to the hook trace_calls installs, as the interpreter would.
+
+    The events are fed from an unprofiled thread, so coverage sees the
+    hook's branches.
+    """
+    with trace_calls(Path(os.devnull), frozenset({_TRACED})) as calls:
+        profiler = sys.getprofile()
+        assert profiler is not None
+        # The hook only reads the frame attributes _Frame provides
+        hook = cast("Callable[[_Frame, str, object], object]", profiler)
+
+        def feed() -> None:
+            for frame, event, arg in events:
+                _ = hook(frame, event, arg)
+
+        threading.setprofile(None)
+        worker = threading.Thread(target=feed)
+        worker.start()
+        worker.join()
+    return calls
+
+
+def _called(module: str | None, qualname: str) -> list[str]:
+    """Return the name recorded for a Python-level call made from a traced module."""
+    frame = _Frame(module, _code(qualname), f_back=_CALLER)
+    return [call.call for call in _replay([(frame, "call", None), (frame, "return", None)])]
+
+
+def test_hook_names_only_public_disk_and_process_calls() -> None:
+    """Test pathlib methods are named by Path on every version and the rest are skipped."""
+    assert _called("pathlib._local", "Path.mkdir") == ["pathlib.Path.mkdir"]
+    assert _called("pathlib._abc", "PathBase.exists") == ["pathlib.Path.exists"]
+    assert _called("pathlib", "PurePath.joinpath") == []
+    assert _called("pathlibx", "Path.mkdir") == []
+    assert _called("posix", "stat") == ["os.stat"]
+    assert _called("os", "_walk") == []
+    assert _called(None, "mkdir") == []
+
+
+def test_hook_describes_arguments() -> None:
+    """Test the detail of a call is its path, command or first argument."""
+
+    def detail(code: CodeType, **f_locals: object) -> str | None:
+        frame = _Frame("subprocess", code, f_locals, _CALLER)
+        calls = _replay([(frame, "call", None), (frame, "return", None)])
+        return calls[0].detail
+
+    assert detail(_code("Popen.wait", _self), self=Path("/probe")) == "/probe"
+    assert detail(_code("run"), popenargs=(["dockutil", "-L"],)) == "dockutil -L"
+    assert detail(_code("call", _args), args=("killall", "Dock")) == "killall Dock"
+    assert detail(_code("getoutput")) is None
+
+
+def test_hook_times_c_calls(tmp_path: Path) -> None:
+    """Test C functions and methods called from traced modules are timed until they return."""
+    (tmp_path / "file").touch()
+    with os.scandir(tmp_path) as entries:
+        is_dir = next(entries).is_dir
+    untraced = _Frame("elsewhere", _code("caller"), f_back=_CALLER)
+    orphan = _Frame("shutil", _code("which", _cmd), {"cmd": "true"})
+
+    calls = _replay(
+        [
+            (_CALLER, "c_call", os.DirEntry[str].is_dir),
+            (_CALLER, "c_return", os.DirEntry[str].is_dir),
+            (_CALLER, "c_call", is_dir),
+            (_CALLER, "c_exception", is_dir),
+            (_CALLER, "c_call", len),
+            (_CALLER, "c_return", len),
+            (untraced, "c_call", os.getcwd),
+            (untraced, "c_return", os.getcwd),
+            (orphan, "call", None),
+            (orphan, "return", None),
+            (orphan, "return", None),
+        ]
+    )
+
+    assert [call.call for call in calls] == ["os.DirEntry.is_dir", "os.DirEntry.is_dir"]
+    assert all(call.caller == f"{_TRACED}:caller:7" for call in calls)
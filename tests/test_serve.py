@@ -0,0 +1,200 @@
+"""Tests for serve module."""
+
+import json
+import socket
+import threading
+import time
+from collections.abc import Iterator
+from pathlib import Path
+from typing import cast
+from unittest.mock import patch
+
+import pytest
+
+from nix_spotlight.deadline import deadline
+from nix_spotlight.serve import default_socket_path, request_sync, serve
+from nix_spotlight.types import SyncReply
+
+
+def _start(  # noqa: PLR0913
+    socket_path: Path,
+    calls: list[list[str]],
+    max_batches: int = 1,
+    *,
+    window: float = 0.2,
+    handled: threading.Semaphore | None = None,
+    gate: threading.Event | None = None,
+) -> threading.Thread:
+    """Serve max_batches batches in a thread, recording each handled request.
+
+    Every handled request releases handled, then waits for gate to be set.
+    """
+
+    def handler(argv: list[str], cwd: str) -> SyncReply:
+        calls.append(argv)
+        if handled is not None:
+            handled.release()
+        if gate is not None:
+            _ = gate.wait()
+        return SyncReply(code=len(argv), out=f"{cwd}\n", err="warn\n")
+
+    thread = threading.Thread(
+        target=serve,
+        args=(socket_path, handler),
+        kwargs={"window": window, "max_batches": max_batches},
+    )
+    thread.start()
+    while not socket_path.exists():
+        time.sleep(0.01)
+    return thread
+
+
+def _send_raw(socket_path: Path, payload: bytes) -> socket.socket:
+    """Connect to the server and send payload, returning the open client."""
+    client = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    client.connect(str(socket_path))
+    client.sendall(payload)
+    return client
+
+
+def _reply(client: socket.socket) -> dict[str, object]:
+    """Read the server's reply on client and close it."""
+    with client, client.makefile("rb") as f:
+        return cast("dict[str, object]", json.loads(f.readline()))
+
+
+@pytest.fixture
+def socket_path(tmp_path: Path) -> Iterator[Path]:
+    """Return a socket path inside a fresh parent directory."""
+    path = tmp_path / "run" / "s.sock"
+    yield path
+    assert not path.exists()
+
+
+def test_default_socket_path(monkeypatch: pytest.MonkeyPatch, tmp_path: Path) -> None:
+    """Test the socket lives in XDG_RUNTIME_DIR, or the cache directory."""
+    monkeypatch.setenv("XDG_RUNTIME_DIR", str(tmp_path))
+    assert default_socket_path() == tmp_path / "nix-spotlight" / "serve.sock"
+
+    monkeypatch.delenv("XDG_RUNTIME_DIR")
+    monkeypatch.setenv("HOME", str(tmp_path))
+    assert default_socket_path() == tmp_path / ".cache" / "nix-spotlight" / "serve.sock"
+
+
+def test_serve_answers_lone_request_at_once(socket_path: Path) -> None:
+    """Test a request nothing queued behind is not held for the batch window."""
+    calls: list[list[str]] = []
+    thread = _start(socket_path, calls, window=30)
+
+    with deadline(5):
+        assert request_sync(socket_path, ["a"], "/") is not None
+    thread.join()
+
+    assert calls == [["a"]]
+
+
+def test_serve_coalesces_identical_requests(socket_path: Path) -> None:
+    """Test requests queued together are answered with one run each."""
+    calls: list[list[str]] = []
+    handled = threading.Semaphore(0)
+    gate = threading.Event()
+    thread = _start(socket_path, calls, max_batches=2, handled=handled, gate=gate)
+
+    first = _send_raw(socket_path, b'{"argv": ["first"], "cwd": "/"}\n')
+    assert handled.acquire(timeout=5)
+    queued = [
+        _send_raw(socket_path, json.dumps({"argv": argv, "cwd": "/work"}).encode() + b"\n")
+        for argv in (["a"], ["a"], ["b", "c"])
+    ]
+    gate.set()
+    assert _reply(first)["code"] == 1
+    replies = [_reply(client) for client in queued]
+    thread.join()
+
+    assert calls == [["first"], ["a"], ["b", "c"]]
+    assert [reply["code"] for reply in replies] == [1, 1, 2]
+    assert {reply["out"] for reply in replies} == {"/work\n"}
+
+
+def test_serve_rejects_malformed_requests(socket_path: Path) -> None:
+    """Test malformed requests get an error without running a sync."""
+    calls: list[list[str]] = []
+    thread = _start(socket_path, calls)
+    answers: list[dict[str, object]] = []
+
+    for payload in (
+        b"not json\n",
+        b"[]\n",
+        b'{"argv": "a", "cwd": "/"}\n',
+        b'{"argv": [1], "cwd": "/"}\n',
+    ):
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as client:
+            client.connect(str(socket_path))
+            client.sendall(payload)
+            with client.makefile("rb") as f:
+                answers.append(cast("dict[str, object]", json.loads(f.readline())))
+    owner_only = 0o600
+    assert socket_path.stat().st_mode & 0o777 == owner_only
+    assert request_sync(socket_path, ["x"], "/") == SyncReply(code=1, out="/\n", err="warn\n")
+    thread.join()
+
+    assert calls == [["x"]]
+    assert [answer["code"] for answer in answers] == [2, 2, 2, 2]
+
+
+def test_request_sync_without_server(tmp_path: Path) -> None:
+    """Test the client reports no server when nothing listens."""
+    assert request_sync(tmp_path / "missing.sock", ["a"], "/") is None
+
+
+def test_request_sync_gives_up_on_silent_server(tmp_path: Path) -> None:
+    """Test the client stops waiting at the deadline, or the default timeout without one."""
+    path = tmp_path / "s.sock"
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as server:
+        server.bind(str(path))
+        server.listen()
+
+        with deadline(0.1):
+            assert request_sync(path, ["a"], "/") is None
+        with deadline(0):
+            assert request_sync(path, ["a"], "/") is None
+        with patch("nix_spotlight.serve.DEFAULT_REPLY_TIMEOUT", 0.1):
+            assert request_sync(path, ["a"], "/") is None
+
+
+@pytest.mark.parametrize("answer", [b"[]\n", b'{"code": "0", "out": "", "err": ""}\n', b"oops\n"])
+def test_request_sync_malformed_reply(tmp_path: Path, answer: bytes) -> None:
+    """Test a malformed reply counts as no answer."""
+    path = tmp_path / "s.sock"
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as server:
+        server.bind(str(path))
+        server.listen()
+
+        def reply() -> None:
+            conn = server.accept()[0]
+            with conn:
+                _ = conn.recv(1024)
+                conn.sendall(answer)
+
+        thread = threading.Thread(target=reply)
+        thread.start()
+        assert request_sync(path, ["a"], "/") is None
+        thread.join()
+
+
+def test_serve_ignores_departed_clients(socket_path: Path) -> None:
+    """Test clients hanging up or sending garbage do not stop the server."""
+    calls: list[list[str]] = []
+    handled = threading.Semaphore(0)
+    thread = _start(socket_path, calls, max_batches=2, handled=handled)
+
+    malformed = 2
+    assert _reply(_send_raw(socket_path, b"garbage\n"))["code"] == malformed
+
+    with _send_raw(socket_path, b'{"argv": ["gone"], "cwd": "/"}\n') as client:
+        client.shutdown(socket.SHUT_RDWR)
+    assert handled.acquire(timeout=5)
+    assert request_sync(socket_path, ["here"], "/") is not None
+    thread.join()
+
+    assert calls == [["gone"], ["here"]]
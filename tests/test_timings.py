@@ -0,0 +1,121 @@
+"""Tests for timings module."""
+
+import json
+from collections.abc import Callable
+from pathlib import Path
+from unittest.mock import MagicMock, patch
+
+from nix_spotlight.dock import sync_dock, sync_dock_plist
+from nix_spotlight.timings import Timings, collect, count, phase, timed
+from nix_spotlight.trampoline import (
+    rebuild_trampolines,
+    reconcile_trampolines,
+    swap_trampolines,
+)
+
+
+def test_phase_and_count_without_collector() -> None:
+    """Test instrumentation is a no-op when nothing is collecting."""
+    with phase("discover"):
+        count("apps_scanned")
+
+
+def test_collect_accumulates() -> None:
+    """Test phases accumulate time and counters add up."""
+    with collect() as timings:
+        with phase("discover"):
+            pass
+        with phase("discover"):
+            count("apps_scanned", 2)
+        count("apps_scanned")
+
+    assert list(timings.phases) == ["discover"]
+    assert timings.phases["discover"] >= 0
+    assert timings.counters == {"apps_scanned": 3}
+
+    count("apps_scanned")
+    assert timings.counters == {"apps_scanned": 3}
+
+
+def test_timed_streams() -> None:
+    """Test producing the items of a timed stream is added to its phase."""
+    assert list(timed("discover", [1, 2])) == [1, 2]
+
+    with collect() as timings:
+        items = timed("discover", [1, 2])
+        with phase("trampolines"):
+            assert list(items) == [1, 2]
+
+    assert set(timings.phases) == {"discover", "trampolines"}
+
+
+def test_timings_output_formats() -> None:
+    """Test text and JSON renderings."""
+    timings = Timings(phases={"discover": 0.0015}, counters={"apps_scanned": 12})
+
+    assert json.loads(timings.to_json()) == {
+        "phases": {"discover": 0.0015},
+        "counters": {"apps_scanned": 12},
+    }
+    lines = timings.format().splitlines()
+    assert lines[0].split() == ["discover", "1.50", "ms"]
+    assert lines[1].split() == ["apps_scanned", "12"]
+    assert Timings().format() == ""
+
+
+def test_trampoline_phases(make_app: Callable[..., Path], tmp_path: Path) -> None:
+    """Test trampoline syncs record their phases and counters."""
+    source = tmp_path / "source"
+    _ = make_app("MyApp.app", source)
+    (source / "Broken.app").mkdir()
+    target = tmp_path / "target"
+
+    with collect() as timings:
+        _ = rebuild_trampolines(source, target)
+        _ = reconcile_trampolines(source, target)
+        _ = swap_trampolines(source, target)
+
+    assert {"discover", "clean", "trampolines", "prune", "swap"} <= set(timings.phases)
+    expected_scanned = 6
+    expected_written = 2
+    assert timings.counters == {
+        "apps_scanned": expected_scanned,
+        "invalid_skipped": expected_scanned // 2,
+        "symlinks_written": expected_written,
+    }
+
+
+def test_dock_phases(tmp_path: Path) -> None:
+    """Test Dock syncs record phases and spawned subprocesses."""
+    app = tmp_path / "MyApp.app"
+    app.mkdir()
+
+    def mock_run(cmd: list[str], **_kwargs: object) -> MagicMock:
+        stdout = "MyApp\tfile:///nix/store/abc/MyApp.app/" if "-L" in cmd else ""
+        return MagicMock(returncode=0, stdout=stdout, stderr="")
+
+    with (
+        collect() as timings,
+        patch("shutil.which", return_value="/usr/bin/dockutil"),
+        patch("subprocess.run", side_effect=mock_run),
+    ):
+        _ = sync_dock([app])
+
+    assert {"dock_list", "dock_update"} <= set(timings.phases)
+    expected_spawned = 3
+    assert timings.counters == {"subprocesses_spawned": expected_spawned}
+
+
+def test_dock_plist_phases(
+    tmp_path: Path, make_dock_plist: Callable[[list[tuple[str, str]]], Path]
+) -> None:
+    """Test the plist backend records its read, write and restart."""
+    app = tmp_path / "MyApp.app"
+    app.mkdir()
+    plist = make_dock_plist([("MyApp", "file:///nix/store/abc/MyApp.app/")])
+
+    with collect() as timings, patch("subprocess.run", return_value=MagicMock(returncode=0)):
+        _ = sync_dock_plist([app], plist)
+
+    assert {"dock_read", "dock_write", "dock_restart"} <= set(timings.phases)
+    assert timings.counters == {"subprocesses_spawned": 1}
@@ -1,10 +1,29 @@
 """Tests for trampoline module."""
 
-from collections.abc import Callable
+import os
+import shutil
+from collections import Counter
+from collections.abc import Callable, Generator, Iterator
+from contextlib import ExitStack, contextmanager
 from pathlib import Path
-
-from nix_spotlight.trampoline import create_trampoline, gather_apps, sync_trampolines
-from nix_spotlight.types import App
+from typing import cast
+from unittest.mock import patch
+
+import pytest
+
+from nix_spotlight.timings import collect
+from nix_spotlight.trampoline import (
+    SCAN_SYSCALLS_PER_ENTRY,
+    create_trampoline,
+    gather_apps,
+    iter_apps,
+    rebuild_trampolines,
+    reconcile_trampolines,
+    rollback_trampolines,
+    swap_trampolines,
+    sync_trampolines,
+)
+from nix_spotlight.types import App, SyncEvent
 
 
 def test_app_properties(make_app: Callable[[str], Path]) -> None:
@@ -162,6 +181,225 @@ def test_gather_apps_nested_invalid(tmp_path: Path) -> None:
     assert apps[0].name == "Valid.app"
 
 
+def test_gather_apps_does_not_descend_into_bundles(
+    make_app: Callable[..., Path], tmp_path: Path
+) -> None:
+    """Test gathering apps ignores apps nested inside other bundles."""
+    outer = make_app("Outer.app", tmp_path)
+    _ = make_app("Inner.app", outer)
+
+    apps = gather_apps(tmp_path)
+
+    assert [app.name for app in apps] == ["Outer.app"]
+
+
+def test_gather_apps_depth_limit(make_app: Callable[..., Path], tmp_path: Path) -> None:
+    """Test gathering apps searches one level of nesting unless told otherwise."""
+    deep = make_app("Deep.app", tmp_path / "Vendor" / "Suite")
+
+    assert gather_apps(tmp_path) == []
+    assert gather_apps(tmp_path, max_depth=2) == [App(deep)]
+    assert gather_apps(tmp_path / "Vendor" / "Suite", max_depth=0) == [App(deep)]
+
+
+def test_gather_apps_detects_cycles(make_app: Callable[..., Path], tmp_path: Path) -> None:
+    """Test symlink cycles and shared subtrees are walked once."""
+    source = tmp_path / "source"
+    app = make_app("App.app", source / "Vendor")
+    (source / "Vendor" / "Loop").symlink_to(source)
+    (source / "Vendor Alias").symlink_to(source / "Vendor")
+
+    with collect() as timings:
+        apps = gather_apps(source, max_depth=50)
+
+    assert apps == [App(app)]
+    assert timings.counters["cycles_skipped"] == 1 + 1
+
+
+def test_gather_apps_skips_generations_and_files(
+    make_app: Callable[..., Path], tmp_path: Path
+) -> None:
+    """Test gathering apps keeps hidden apps but skips swap generations and files."""
+    hidden = make_app(".Hidden.app", tmp_path)
+    nested = make_app("X.app", tmp_path / ".Dir")
+    _ = make_app("Staged.app", tmp_path / ".Trampolines.staging")
+    _ = make_app("Old.app", tmp_path / ".Trampolines.previous")
+    (tmp_path / "File.app").touch()
+    (tmp_path / "notes.txt").touch()
+
+    assert gather_apps(tmp_path) == [App(nested), App(hidden)]
+
+
+def test_gather_apps_follows_symlinks(make_app: Callable[..., Path], tmp_path: Path) -> None:
+    """Test gathering apps finds symlinked bundles and directories."""
+    store = tmp_path / "store"
+    _ = make_app("Linked.app", store)
+    _ = make_app("Nested.app", store / "Suite")
+    source = tmp_path / "source"
+    source.mkdir()
+    (source / "Linked.app").symlink_to(store / "Linked.app")
+    (source / "Suite").symlink_to(store / "Suite")
+
+    apps = gather_apps(source)
+
+    assert [app.path for app in apps] == [source / "Linked.app", source / "Suite" / "Nested.app"]
+
+
+def test_gather_apps_syscall_budget(make_app: Callable[..., Path], tmp_path: Path) -> None:
+    """Test discovery stays within its per-entry syscall budget."""
+    app_count = 50
+    for i in range(app_count):
+        _ = make_app(f"App{i}.app", tmp_path)
+        _ = make_app(f"Nested{i}.app", tmp_path / "Nested")
+        (tmp_path / f"file{i}").touch()
+    entries = 3 * app_count + 1
+
+    calls = 0
+    real_stat = os.stat
+    real_scandir = os.scandir
+
+    def counting_stat(*args: object, **kwargs: object) -> os.stat_result:
+        nonlocal calls
+        calls += 1
+        return real_stat(*args, **kwargs)  # pyright: ignore[reportArgumentType]
+
+    def counting_scandir(path: str) -> object:
+        nonlocal calls
+        calls += 1
+        return real_scandir(path)
+
+    with patch("os.stat", counting_stat), patch("os.scandir", counting_scandir):
+        apps = gather_apps(tmp_path)
+
+    assert len(apps) == 2 * app_count
+    assert calls <= SCAN_SYSCALLS_PER_ENTRY * entries
+    # One stat per bundle, plus the stat of tmp_path and two directory reads
+    assert calls <= len(apps) + 3
+
+
+# os primitives the trampoline syncs reach, directly or through pathlib and
+# shutil.rmtree
+_COUNTED_SYSCALLS = (
+    "lstat",
+    "mkdir",
+    "open",
+    "readlink",
+    "rmdir",
+    "scandir",
+    "stat",
+    "symlink",
+    "unlink",
+    "utime",
+)
+
+# Calls of each primitive allowed per app by each kind of sync; anything not
+# listed is only allowed the fixed per-sync calls
+_SYNC_SYSCALL_BUDGETS: dict[str, dict[str, int]] = {
+    # Bundle check, trampoline directory, stale-link unlink, symlink, touch
+    "cold": {"stat": 1, "mkdir": 1, "unlink": 1, "symlink": 1, "utime": 1},
+    # As cold, plus the readlink that finds the old target and the stat
+    # mkdir(exist_ok=True) makes when the directory is already there
+    "warm": {"stat": 2, "mkdir": 1, "readlink": 1, "unlink": 1, "symlink": 1, "utime": 1},
+    # Bundle check and the readlink that proves the trampoline current
+    "noop": {"stat": 1, "readlink": 1},
+    # A no-op for every kept app, plus the rmtree of one stale trampoline
+    # per app: lstat and open the directory, list it, unlink its Contents
+    # link and remove it
+    "prune": {
+        "stat": 1,
+        "readlink": 1,
+        "lstat": 1,
+        "open": 1,
+        "rmdir": 1,
+        "scandir": 1,
+        "unlink": 1,
+    },
+}
+
+# Calls made once per sync: the stat of from_dir, the mkdir and stat of
+# to_dir and one directory read of each
+_SYNC_FIXED_SYSCALLS = 2
+
+
+@contextmanager
+def _count_syscalls() -> Generator[Counter[str]]:
+    """Count calls of each primitive in _COUNTED_SYSCALLS made in the block."""
+    calls: Counter[str] = Counter()
+    with ExitStack() as stack:
+        for name in _COUNTED_SYSCALLS:
+            real = cast("Callable[..., object]", getattr(os, name))
+
+            def counting(
+                *args: object,
+                _name: str = name,
+                _real: Callable[..., object] = real,
+                **kwargs: object,
+            ) -> object:
+                calls[_name] += 1
+                return _real(*args, **kwargs)
+
+            _ = stack.enter_context(patch(f"os.{name}", counting))
+        yield calls
+
+
+def _prepare_sync(
+    make_app: Callable[..., Path], tmp_path: Path, kind: str, app_count: int
+) -> tuple[Path, Path]:
+    """Build a source and a target that make the next sync of the given kind."""
+    source = tmp_path / "source"
+    target = tmp_path / "target"
+    for i in range(app_count):
+        _ = make_app(f"App{i}.app", source)
+    if kind == "noop":
+        _ = sync_trampolines(source, target)
+    elif kind == "warm":
+        # The previous generation of every app lived at another store path
+        previous = tmp_path / "previous"
+        for i in range(app_count):
+            _ = make_app(f"App{i}.app", previous)
+        _ = sync_trampolines(previous, target)
+    elif kind == "prune":
+        # Current trampolines for every app and one retired one per app
+        retired = tmp_path / "retired"
+        for i in range(app_count):
+            _ = create_trampoline(App(source / f"App{i}.app"), target)
+            _ = create_trampoline(App(make_app(f"Old{i}.app", retired)), target)
+    return source, target
+
+
+@pytest.mark.parametrize("kind", sorted(_SYNC_SYSCALL_BUDGETS))
+def test_sync_trampolines_syscall_budget(
+    make_app: Callable[..., Path], tmp_path: Path, kind: str
+) -> None:
+    """Test each kind of sync stays within its per-app budget of every primitive."""
+    app_count = 20
+    source, target = _prepare_sync(make_app, tmp_path, kind, app_count)
+    budget = _SYNC_SYSCALL_BUDGETS[kind]
+
+    with _count_syscalls() as calls:
+        result = sync_trampolines(source, target)
+
+    assert sorted(path.name for path in target.iterdir()) == sorted(path.name for path in result)
+    over = {
+        name: calls[name]
+        for name in _COUNTED_SYSCALLS
+        if calls[name] > budget.get(name, 0) * app_count + _SYNC_FIXED_SYSCALLS
+    }
+    assert over == {}
+
+
+def test_create_trampoline_syscall_budget(make_app: Callable[[str], Path], tmp_path: Path) -> None:
+    """Test creating a trampoline makes one call of each write primitive."""
+    app = App(make_app("Test.app"))
+    target = tmp_path / "target"
+    target.mkdir()
+
+    with _count_syscalls() as calls:
+        _ = create_trampoline(app, target)
+
+    assert calls == Counter({"mkdir": 1, "unlink": 1, "symlink": 1})
+
+
 def test_sync_trampolines(tmp_path: Path) -> None:
     """Test full sync operation."""
     source = tmp_path / "source"
@@ -206,6 +444,33 @@ def test_sync_trampolines_cleans_existing(tmp_path: Path) -> None:
     assert (target / "NewApp.app").exists()
 
 
+def _mtimes(path: Path) -> dict[str, int]:
+    """Return the mtime of path and everything below it, without following links."""
+    return {str(p): p.lstat().st_mtime_ns for p in [path, *path.rglob("*")]}
+
+
+def test_sync_trampolines_keeps_mtimes(make_app: Callable[..., Path], tmp_path: Path) -> None:
+    """Test a no-op sync leaves every mtime alone and a change touches only its trampoline."""
+    source = tmp_path / "source"
+    for name in ("App1.app", "App2.app"):
+        _ = make_app(name, source)
+    target = tmp_path / "target"
+    _ = sync_trampolines(source, target)
+    # Backdate everything so a rewrite within the clock's resolution still shows up
+    for path in _mtimes(target):
+        os.utime(path, ns=(0, 0), follow_symlinks=False)
+    before = _mtimes(target)
+
+    _ = sync_trampolines(source, target)
+    assert _mtimes(target) == before
+
+    _ = make_app("App3.app", source)
+    _ = sync_trampolines(source, target)
+    after = _mtimes(target)
+    changed = {path for path in after if after[path] != before.get(path)}
+    assert changed == {str(target), *(str(target / "App3.app" / p) for p in ("", "Contents"))}
+
+
 def test_sync_trampolines_empty_source(tmp_path: Path) -> None:
     """Test sync with empty source directory."""
     source = tmp_path / "source"
@@ -216,3 +481,297 @@ def test_sync_trampolines_empty_source(tmp_path: Path) -> None:
 
     assert trampolines == []
     assert target.exists()
+
+
+def test_reconcile_trampolines_creates_new(make_app: Callable[..., Path], tmp_path: Path) -> None:
+    """Test reconcile creates trampolines in an empty target."""
+    app_path = make_app("MyApp.app", tmp_path / "source")
+    target = tmp_path / "target"
+
+    result = reconcile_trampolines(tmp_path / "source", target)
+
+    assert result.trampolines == (target / "MyApp.app",)
+    assert result.created == 1
+    assert (result.repointed, result.removed, result.unchanged) == (0, 0, 0)
+    assert (target / "MyApp.app" / "Contents").resolve() == app_path / "Contents"
+
+
+def test_reconcile_trampolines_noop(make_app: Callable[..., Path], tmp_path: Path) -> None:
+    """Test reconcile leaves up-to-date trampolines untouched."""
+    _ = make_app("MyApp.app", tmp_path / "source")
+    target = tmp_path / "target"
+    _ = reconcile_trampolines(tmp_path / "source", target)
+    link_stat = (target / "MyApp.app" / "Contents").lstat()
+
+    result = reconcile_trampolines(tmp_path / "source", target)
+
+    assert result.unchanged == 1
+    assert (result.created, result.repointed, result.removed) == (0, 0, 0)
+    assert (target / "MyApp.app" / "Contents").lstat().st_ino == link_stat.st_ino
+
+
+def test_reconcile_trampolines_repoints_changed(
+    make_app: Callable[..., Path], tmp_path: Path
+) -> None:
+    """Test reconcile repoints trampolines whose target changed."""
+    app_path = make_app("MyApp.app", tmp_path / "source")
+    target = tmp_path / "target"
+    trampoline = target / "MyApp.app"
+    trampoline.mkdir(parents=True)
+    (trampoline / "Contents").symlink_to("/nix/store/old-myapp/MyApp.app/Contents")
+
+    result = reconcile_trampolines(tmp_path / "source", target)
+
+    assert result.repointed == 1
+    assert (result.created, result.removed, result.unchanged) == (0, 0, 0)
+    assert (trampoline / "Contents").resolve() == app_path / "Contents"
+
+
+def test_reconcile_trampolines_repoints_missing_link(
+    make_app: Callable[..., Path], tmp_path: Path
+) -> None:
+    """Test reconcile repairs a trampoline without a Contents symlink."""
+    app_path = make_app("MyApp.app", tmp_path / "source")
+    target = tmp_path / "target"
+    (target / "MyApp.app").mkdir(parents=True)
+
+    result = reconcile_trampolines(tmp_path / "source", target)
+
+    assert result.repointed == 1
+    assert (target / "MyApp.app" / "Contents").resolve() == app_path / "Contents"
+
+
+def test_reconcile_trampolines_removes_stale(make_app: Callable[..., Path], tmp_path: Path) -> None:
+    """Test reconcile removes stale trampolines and stray files."""
+    _ = make_app("MyApp.app", tmp_path / "source")
+    target = tmp_path / "target"
+    stale = target / "OldApp.app"
+    stale.mkdir(parents=True)
+    (stale / "Contents").symlink_to("/nix/store/old-oldapp/OldApp.app/Contents")
+    (target / "stray").touch()
+
+    result = reconcile_trampolines(tmp_path / "source", target)
+
+    expected_removed = 2
+    assert result.removed == expected_removed
+    assert result.created == 1
+    assert sorted(p.name for p in target.iterdir()) == ["MyApp.app"]
+
+
+def test_swap_trampolines_fresh(make_app: Callable[..., Path], tmp_path: Path) -> None:
+    """Test atomic swap into a target that does not exist yet."""
+    app_path = make_app("MyApp.app", tmp_path / "source")
+    target = tmp_path / "target"
+
+    result = swap_trampolines(tmp_path / "source", target)
+
+    assert result.trampolines == (target / "MyApp.app",)
+    assert result.created == 1
+    assert (target / "MyApp.app" / "Contents").resolve() == app_path / "Contents"
+    assert not (tmp_path / ".target.staging").exists()
+    assert not (tmp_path / ".target.previous").exists()
+
+
+def test_swap_trampolines_keeps_previous(make_app: Callable[..., Path], tmp_path: Path) -> None:
+    """Test atomic swap keeps the replaced generation aside."""
+    source = tmp_path / "source"
+    _ = make_app("OldApp.app", source)
+    target = tmp_path / "target"
+    _ = swap_trampolines(source, target)
+
+    shutil.rmtree(source / "OldApp.app")
+    _ = make_app("NewApp.app", source)
+    (tmp_path / ".target.staging" / "leftover").mkdir(parents=True)
+
+    result = swap_trampolines(source, target)
+
+    assert result.trampolines == (target / "NewApp.app",)
+    assert sorted(p.name for p in target.iterdir()) == ["NewApp.app"]
+    assert sorted(p.name for p in (tmp_path / ".target.previous").iterdir()) == ["OldApp.app"]
+    assert not (tmp_path / ".target.staging").exists()
+
+
+def test_rollback_trampolines(make_app: Callable[..., Path], tmp_path: Path) -> None:
+    """Test rollback swaps generations and can be undone."""
+    source = tmp_path / "source"
+    _ = make_app("OldApp.app", source)
+    target = tmp_path / "target"
+    _ = swap_trampolines(source, target)
+    shutil.rmtree(source / "OldApp.app")
+    _ = make_app("NewApp.app", source)
+    _ = swap_trampolines(source, target)
+
+    assert rollback_trampolines(target) is True
+    assert sorted(p.name for p in target.iterdir()) == ["OldApp.app"]
+
+    assert rollback_trampolines(target) is True
+    assert sorted(p.name for p in target.iterdir()) == ["NewApp.app"]
+
+
+def test_rollback_trampolines_without_current(tmp_path: Path) -> None:
+    """Test rollback restores the previous generation when target is gone."""
+    target = tmp_path / "target"
+    (tmp_path / ".target.previous" / "OldApp.app").mkdir(parents=True)
+
+    assert rollback_trampolines(target) is True
+    assert sorted(p.name for p in target.iterdir()) == ["OldApp.app"]
+    assert not (tmp_path / ".target.previous").exists()
+
+
+def test_rollback_trampolines_no_previous(tmp_path: Path) -> None:
+    """Test rollback without a previous generation does nothing."""
+    target = tmp_path / "target"
+    target.mkdir()
+
+    assert rollback_trampolines(target) is False
+    assert target.exists()
+
+
+def test_rebuild_trampolines_parallel(make_app: Callable[..., Path], tmp_path: Path) -> None:
+    """Test parallel rebuild matches the serial result and order."""
+    source = tmp_path / "source"
+    for i in range(20):
+        _ = make_app(f"App{i:02}.app", source)
+
+    serial = rebuild_trampolines(source, tmp_path / "serial")
+    parallel = rebuild_trampolines(source, tmp_path / "parallel", max_workers=4)
+
+    assert [t.name for t in parallel.trampolines] == [t.name for t in serial.trampolines]
+    assert parallel.created == serial.created == len(serial.trampolines)
+    assert parallel.errors == ()
+    for trampoline in parallel.trampolines:
+        assert (trampoline / "Contents").is_symlink()
+
+
+def test_rebuild_trampolines_reports_per_app_errors(
+    make_app: Callable[..., Path], tmp_path: Path
+) -> None:
+    """Test a failing app is reported without aborting the others."""
+    source = tmp_path / "source"
+    for name in ("A.app", "Bad.app", "C.app"):
+        _ = make_app(name, source)
+    target = tmp_path / "target"
+
+    def flaky_create(app: App, to_dir: Path) -> Path:
+        if app.name == "Bad.app":
+            msg = "disk full"
+            raise OSError(msg)
+        return create_trampoline(app, to_dir)
+
+    with patch("nix_spotlight.trampoline.create_trampoline", flaky_create):
+        result = rebuild_trampolines(source, target, max_workers=2)
+        trampolines = sync_trampolines(source, target)
+
+    assert [t.name for t in result.trampolines] == ["A.app", "C.app"]
+    assert result.errors == ("Failed to create trampoline for Bad.app: disk full",)
+    assert trampolines == list(result.trampolines)
+
+
+def test_reconcile_trampolines_reports_errors(
+    make_app: Callable[..., Path], tmp_path: Path
+) -> None:
+    """Test reconcile reports failed updates and removals per entry."""
+    source = tmp_path / "source"
+    _ = make_app("MyApp.app", source)
+    target = tmp_path / "target"
+    (target / "MyApp.app" / "Contents" / "Resources").mkdir(parents=True)
+    (target / "Stale.app").mkdir()
+
+    with patch("nix_spotlight.trampoline.remove_entry", side_effect=OSError("busy")):
+        result = reconcile_trampolines(source, target, max_workers=2)
+
+    assert result.trampolines == ()
+    assert result.removed == 0
+    assert result.errors[0] == "Failed to remove Stale.app: busy"
+    assert result.errors[1].startswith("Failed to create trampoline for MyApp.app:")
+
+
+def test_sync_trampolines_reports_events(make_app: Callable[..., Path], tmp_path: Path) -> None:
+    """Test every app and stale entry is reported as it is handled."""
+    source = tmp_path / "source"
+    for name in ("Kept.app", "Moved.app", "New.app"):
+        _ = make_app(name, source)
+    _ = make_app("New.app", source / "Vendor")
+    target = tmp_path / "target"
+    _ = sync_trampolines(source, target)
+    _ = (target / "New.app").rename(target / "Stale.app")
+    (target / "Moved.app" / "Contents").unlink()
+    (target / "Moved.app" / "Contents").symlink_to(tmp_path)
+    events: list[SyncEvent] = []
+
+    trampolines = sync_trampolines(source, target, on_event=events.append)
+
+    assert events == [
+        SyncEvent("unchanged", "Kept.app"),
+        SyncEvent("repointed", "Moved.app"),
+        SyncEvent("created", "New.app"),
+        SyncEvent("removed", "Stale.app"),
+    ]
+    assert [t.name for t in trampolines] == ["Kept.app", "Moved.app", "New.app"]
+    assert (target / "New.app" / "Contents").readlink() == source / "New.app" / "Contents"
+
+
+def test_sync_trampolines_reports_failure_events(
+    make_app: Callable[..., Path], tmp_path: Path
+) -> None:
+    """Test failed apps and removals are reported with their errors, also from threads."""
+    source = tmp_path / "source"
+    _ = make_app("MyApp.app", source)
+    target = tmp_path / "target"
+    (target / "MyApp.app" / "Contents" / "Resources").mkdir(parents=True)
+    (target / "Stale.app").mkdir()
+    events: list[SyncEvent] = []
+
+    with patch("nix_spotlight.trampoline.remove_entry", side_effect=OSError("busy")):
+        _ = rebuild_trampolines(source, target, max_workers=2, on_event=events.append)
+        (target / "MyApp.app" / "Contents").unlink()
+        (target / "MyApp.app" / "Contents").mkdir()
+        (target / "Stale.app").mkdir()
+        _ = reconcile_trampolines(source, target, max_workers=2, on_event=events.append)
+
+    assert [(event.kind, event.name) for event in events] == [
+        ("created", "MyApp.app"),
+        ("failed", "MyApp.app"),
+        ("failed", "Stale.app"),
+    ]
+    assert events[2].error == "busy"
+
+
+def test_sync_trampolines_streams_apps(make_app: Callable[..., Path], tmp_path: Path) -> None:
+    """Test trampolines are created while discovery is still running."""
+    source = tmp_path / "source"
+    for name in ("A.app", "B.app"):
+        _ = make_app(name, source)
+    target = tmp_path / "target"
+    created_before_b: list[bool] = []
+    real_iter_apps = iter_apps
+
+    def watching_iter_apps(from_dir: Path, *, max_depth: int) -> Iterator[App]:
+        for app in real_iter_apps(from_dir, max_depth=max_depth):
+            if app.name == "B.app":
+                created_before_b.append((target / "A.app" / "Contents").is_symlink())
+            yield app
+
+    with patch("nix_spotlight.trampoline.iter_apps", watching_iter_apps):
+        _ = sync_trampolines(source, target)
+
+    assert created_before_b == [True]
+
+
+def test_sync_modes_take_listed_apps(make_app: Callable[..., Path], tmp_path: Path) -> None:
+    """Test every mode syncs a given app list without scanning the source."""
+    source = tmp_path / "source"
+    listed = make_app("Listed.app", source)
+    _ = make_app("Unlisted.app", source)
+    apps = (App(listed),)
+    events: list[SyncEvent] = []
+
+    with patch("nix_spotlight.trampoline.iter_apps") as mock_scan:
+        rebuilt = rebuild_trampolines(source, tmp_path / "rebuilt", apps=apps)
+        swapped = swap_trampolines(source, tmp_path / "swapped", apps=apps, on_event=events.append)
+        reconciled = reconcile_trampolines(source, tmp_path / "reconciled", apps=apps)
+
+    mock_scan.assert_not_called()
+    for result in (rebuilt, swapped, reconciled):
+        assert [t.name for t in result.trampolines] == ["Listed.app"]
+    assert events == [SyncEvent("created", "Listed.app")]
@@ -0,0 +1,216 @@
+"""Tests for watch module."""
+
+import shutil
+import threading
+import time
+from collections.abc import Callable
+from pathlib import Path
+from unittest.mock import patch
+
+from nix_spotlight.manifest import read_manifest, source_digest
+from nix_spotlight.plan import plan
+from nix_spotlight.trampoline import create_trampoline
+from nix_spotlight.types import App, TrampolineSyncResult
+from nix_spotlight.watch import (
+    PollingWatcher,
+    apply_changes,
+    make_watcher,
+    snapshot,
+    watch,
+)
+
+
+class ScriptedWatcher:
+    """Watcher replaying a fixed sequence of wait results and side effects."""
+
+    def __init__(self, steps: list[tuple[bool, Callable[[], object] | None]]) -> None:
+        """Replay steps, one per wait call."""
+        self.steps: list[tuple[bool, Callable[[], object] | None]] = steps
+        self.timeouts: list[float | None] = []
+        self.closed: bool = False
+
+    def wait(self, timeout: float | None) -> bool:
+        """Run the next step's side effect and return its result."""
+        self.timeouts.append(timeout)
+        changed, effect = self.steps.pop(0)
+        if effect is not None:
+            _ = effect()
+        return changed
+
+    def close(self) -> None:
+        """Record that the watcher was closed."""
+        self.closed = True
+
+
+def test_apply_changes(make_app: Callable[..., Path], tmp_path: Path) -> None:
+    """Test only added, replaced and removed apps are touched."""
+    source = tmp_path / "source"
+    _ = make_app("Keep.app", source)
+    _ = make_app("Replace.app", source)
+    _ = make_app("Remove.app", source)
+    target = tmp_path / "target"
+    old = snapshot(source)
+    assert apply_changes({}, old, target).created == len(old)
+    keep_stat = (target / "Keep.app" / "Contents").lstat()
+
+    shutil.rmtree(source / "Replace.app")
+    shutil.rmtree(source / "Remove.app")
+    store = tmp_path / "store"
+    _ = make_app("Replace.app", store)
+    (source / "Replace.app").symlink_to(store / "Replace.app")
+    _ = make_app("Add.app", source)
+
+    result = apply_changes(old, snapshot(source), target)
+
+    assert result.trampolines == (target / "Add.app", target / "Replace.app")
+    assert (result.created, result.repointed, result.removed, result.unchanged) == (1, 1, 1, 1)
+    assert sorted(p.name for p in target.iterdir()) == ["Add.app", "Keep.app", "Replace.app"]
+    assert (target / "Keep.app" / "Contents").lstat().st_ino == keep_stat.st_ino
+
+
+def test_apply_changes_reports_errors(make_app: Callable[..., Path], tmp_path: Path) -> None:
+    """Test failures are reported per app without stopping the batch."""
+    source = tmp_path / "source"
+    _ = make_app("New.app", source)
+    target = tmp_path / "target"
+    old = snapshot(source)
+    _ = apply_changes({}, old, target)
+    gone = {"Gone.app": old["New.app"]}
+
+    with patch("nix_spotlight.watch.create_trampoline", side_effect=OSError("full")):
+        result = apply_changes(gone, snapshot(source), target)
+
+    # The filename is rendered differently across Python versions
+    removal, creation = result.errors
+    assert removal.startswith("Failed to remove Gone.app: [Errno 2] No such file or directory")
+    assert creation == "Failed to create trampoline for New.app: full"
+
+
+def test_snapshot_skips_vanished_apps(tmp_path: Path) -> None:
+    """Test apps that disappear while being snapshotted are skipped."""
+    vanished = App(tmp_path / "Vanished.app")
+
+    with patch("nix_spotlight.watch.iter_apps", return_value=[vanished]):
+        assert snapshot(tmp_path) == {}
+
+
+def test_snapshot_keeps_first_duplicate(make_app: Callable[..., Path], tmp_path: Path) -> None:
+    """Test the first of two apps sharing a name wins, so watch agrees with plan and sync."""
+    source = tmp_path / "source"
+    first = make_app("Foo.app", source)
+    _ = make_app("Foo.app", source / "KDE")
+    target = tmp_path / "target"
+    watcher = ScriptedWatcher([(True, lambda: make_app("Bar.app", source)), (False, None)])
+
+    watch(source, target, watcher=watcher, max_batches=1)
+
+    assert snapshot(source)["Foo.app"][0] == App(first)
+    assert (target / "Foo.app" / "Contents").readlink() == first / "Contents"
+    assert plan(source, target).actions == ()
+
+
+def test_watch_coalesces_bursts(make_app: Callable[..., Path], tmp_path: Path) -> None:
+    """Test a burst of events is synced as one incremental batch."""
+    source = tmp_path / "source"
+    _ = make_app("First.app", source)
+    target = tmp_path / "target"
+
+    watcher = ScriptedWatcher(
+        [
+            (False, None),
+            (True, lambda: make_app("Second.app", source)),
+            (True, lambda: make_app("Third.app", source / "Suite")),
+            (False, None),
+        ]
+    )
+    batches: list[TrampolineSyncResult] = []
+
+    watch(source, target, on_batch=batches.append, debounce=0.25, watcher=watcher, max_batches=1)
+
+    assert [b.created for b in batches] == [2]
+    assert watcher.timeouts == [None, None, 0.25, 0.25]
+    assert watcher.closed
+    assert sorted(p.name for p in target.iterdir() if not p.name.startswith(".")) == [
+        "First.app",
+        "Second.app",
+        "Third.app",
+    ]
+    manifest = read_manifest(target)
+    assert manifest is not None
+    assert manifest.digest == source_digest(source)
+
+
+def test_watch_skips_manifest_after_errors(make_app: Callable[..., Path], tmp_path: Path) -> None:
+    """Test a batch with errors does not record a manifest."""
+    source = tmp_path / "source"
+    source.mkdir()
+    target = tmp_path / "target"
+    watcher = ScriptedWatcher([(True, lambda: make_app("New.app", source)), (False, None)])
+
+    with patch("nix_spotlight.watch.create_trampoline", side_effect=OSError("full")):
+        watch(source, target, watcher=watcher, max_batches=1)
+
+    assert read_manifest(target) is None
+
+
+def test_watch_retries_failed_apps(make_app: Callable[..., Path], tmp_path: Path) -> None:
+    """Test an app that failed in one batch is synced again by the next."""
+    source = tmp_path / "source"
+    source.mkdir()
+    target = tmp_path / "target"
+    watcher = ScriptedWatcher(
+        [(True, lambda: make_app("New.app", source)), (False, None), (True, None), (False, None)]
+    )
+    batches: list[TrampolineSyncResult] = []
+    outcomes: list[Exception | None] = [OSError("full"), None]
+
+    def flaky(app: App, to_dir: Path) -> Path:
+        error = outcomes.pop(0)
+        if error is not None:
+            raise error
+        return create_trampoline(app, to_dir)
+
+    with patch("nix_spotlight.watch.create_trampoline", flaky):
+        watch(source, target, on_batch=batches.append, watcher=watcher, max_batches=2)
+
+    assert [(b.created, len(b.errors)) for b in batches] == [(0, 1), (1, 0)]
+    assert (target / "New.app" / "Contents").is_symlink()
+
+
+def test_polling_watcher_detects_changes(make_app: Callable[..., Path], tmp_path: Path) -> None:
+    """Test the polling watcher sees top-level and nested changes."""
+    (tmp_path / "Suite").mkdir()
+    watcher = PollingWatcher(tmp_path, interval=0.01)
+
+    assert watcher.wait(0.02) is False
+
+    _ = make_app("Top.app", tmp_path)
+    assert watcher.wait(0) is True
+    assert watcher.wait(0) is False
+
+    time.sleep(0.01)
+    _ = make_app("Nested.app", tmp_path / "Suite")
+    assert watcher.wait(0) is True
+
+    shutil.rmtree(tmp_path)
+    assert watcher.wait(0) is True
+    watcher.close()
+
+
+def test_polling_watcher_blocks_until_change(make_app: Callable[..., Path], tmp_path: Path) -> None:
+    """Test waiting without a timeout returns once something changes."""
+    watcher = PollingWatcher(tmp_path, interval=0.01)
+    timer = threading.Timer(0.05, lambda: make_app("Late.app", tmp_path))
+    timer.start()
+
+    assert watcher.wait(None) is True
+    timer.join()
+
+
+def test_make_watcher_polls_on_linux(tmp_path: Path) -> None:
+    """Test the polling fallback is used where kqueue is unavailable."""
+    with patch("sys.platform", "linux"):
+        watcher = make_watcher(tmp_path, interval=0.5)
+
+    assert isinstance(watcher, PollingWatcher)
+    assert watcher.interval == 0.5  # noqa: PLR2004